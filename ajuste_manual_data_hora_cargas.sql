@@ -37,3 +37,8 @@ hora_execucao
 FROM [dbo].[fundamentus_historico]
 ORDER BY 1 DESC 
 
+
+
+-- No historico local do ETL (data/history/history.sqlite), o mesmo ajuste altera apenas o catalogo:
+-- HistoryStore().redate_snapshot('2025-08-23', new_data_execucao='2025-08-22')
+-- HistoryStore().redate_snapshot('2025-09-18', new_hora_execucao='21:15:54')
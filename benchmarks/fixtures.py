@@ -0,0 +1,190 @@
+import json
+import os
+import random
+import time
+
+# --- Fixtures das páginas do Fundamentus ---
+# Um conjunto de fixtures é uma pasta com:
+#   manifest.json          -> origem ('recorded' ou 'synthetic'), data, tickers e Content-Type servido
+#   resultado.html         -> página resultado.php (bytes exatamente como recebidos)
+#   detalhes/<TICKER>.html -> página detalhes.php?papel=<TICKER>
+# As gravadas (--record) vêm do site real; as sintéticas só imitam a estrutura das páginas e servem
+# quando não há gravação disponível. Os resultados dos benchmarks sempre informam a origem.
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CONTENT_TYPE = "text/html; charset=ISO-8859-1"
+ENCODING = "ISO-8859-1"
+SYNTHETIC_MARKER = "<!-- FIXTURE SINTETICA: gerada por benchmarks/fixtures.py, nao e uma pagina real do Fundamentus -->"
+
+
+def load_manifest(fixtures_dir: str) -> dict:
+    with open(os.path.join(fixtures_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(fixtures_dir: str, source: str, tickers: list) -> dict:
+    manifest = {
+        "source": source,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "content_type": CONTENT_TYPE,
+        "tickers": tickers,
+    }
+    with open(os.path.join(fixtures_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+# --- Gravação a partir do site real ---
+def record_fixtures(fixtures_dir: str, base_url: str, headers: dict, limit: int = None, delay: float = 0.3) -> dict:
+    """
+    Baixa resultado.php e as páginas detalhes.php (até 'limit' tickers) e grava os bytes recebidos.
+    As requisições são sequenciais, com 'delay' segundos entre elas, para não sobrecarregar o site.
+    """
+    import requests # Import local: a geração sintética não precisa de rede
+
+    from Fundamentus_WebScraping_Tratamento_CargaSQL import parse_ticker_list
+
+    os.makedirs(os.path.join(fixtures_dir, "detalhes"), exist_ok=True)
+    response = requests.get(f"{base_url}resultado.php", headers=headers, timeout=20)
+    response.raise_for_status()
+    with open(os.path.join(fixtures_dir, "resultado.html"), "wb") as f:
+        f.write(response.content)
+
+    tickers = parse_ticker_list(response.text)[:limit]
+    recorded = []
+    for ticker in tickers:
+        time.sleep(delay)
+        try:
+            page = requests.get(f"{base_url}detalhes.php?papel={ticker}", headers=headers, timeout=10)
+            page.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"  Falha ao gravar {ticker}: {e}")
+            continue
+        with open(os.path.join(fixtures_dir, "detalhes", f"{ticker}.html"), "wb") as f:
+            f.write(page.content)
+        recorded.append(ticker)
+    return _write_manifest(fixtures_dir, "recorded", recorded)
+
+
+# --- Geração sintética ---
+SECTORS = {
+    "Petróleo, Gás e Biocombustíveis": ["Exploração, Refino e Distribuição", "Equipamentos e Serviços"],
+    "Materiais Básicos": ["Siderurgia e Metalurgia", "Mineração", "Químicos"],
+    "Bens Industriais": ["Máquinas e Equipamentos", "Transporte", "Construção Pesada"],
+    "Consumo Cíclico": ["Comércio", "Tecidos, Vestuário e Calçados", "Incorporações"],
+    "Financeiro": ["Bancos", "Seguradoras", "Serviços Financeiros Diversos"],
+    "Utilidade Pública": ["Energia Elétrica", "Água e Saneamento", "Gás"],
+}
+RESULT_HEADERS = [
+    "Papel", "Cotação", "P/L", "P/VP", "PSR", "Div.Yield", "P/Ativo", "P/Cap.Giro", "P/EBIT", "P/Ativ Circ.Liq",
+    "EV/EBIT", "EV/EBITDA", "Mrg Ebit", "Mrg. Líq.", "Liq. Corr.", "ROIC", "ROE", "Liq.2meses", "Patrim. Líq",
+    "Dív.Brut/ Patrim.", "Cresc. Rec.5a",
+]
+
+
+def _br_number(value: float, decimals: int = 2) -> str:
+    """Formata como no site: milhar com '.', decimal com ','."""
+    text = f"{value:,.{decimals}f}"
+    return text.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _synthetic_tickers(count: int, rng: random.Random) -> list:
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    tickers = set()
+    while len(tickers) < count:
+        tickers.add("".join(rng.choice(letters) for _ in range(4)) + rng.choice(["3", "4", "11"]))
+    return sorted(tickers)
+
+
+def _label(text: str) -> str:
+    return f'<td class="label"><span class="help tips" title="">?</span><span class="txt">{text}</span></td>'
+
+
+def _data(text: str) -> str:
+    return f'<td class="data"><span class="txt">{text}</span></td>'
+
+
+def _synthetic_detail_page(ticker: str, rng: random.Random, year: int) -> str:
+    sector = rng.choice(list(SECTORS))
+    subsector = rng.choice(SECTORS[sector])
+    price = rng.uniform(1, 120)
+
+    def pct():
+        return _br_number(rng.uniform(-40, 60), 1) + "%"
+
+    def num(low, high, decimals=2):
+        return _br_number(rng.uniform(low, high), decimals)
+
+    def money(low, high):
+        return _br_number(rng.uniform(low, high), 0)
+
+    def row(*cells):
+        return "<tr>" + "".join(cells) + "</tr>"
+
+    header = [
+        row(_label("Papel"), _data(ticker), _label("Cotação"), _data(_br_number(price))),
+        row(_label("Tipo"), _data(rng.choice(["ON", "PN", "UNT"])), _label("Data últ cot"), _data(f"{rng.randint(1, 28):02d}/09/{year}")),
+        row(_label("Empresa"), _data(f"EMPRESA {ticker} S.A."), _label("Min 52 sem"), _data(_br_number(price * 0.7))),
+        row(_label("Setor"), _data(f'<a href="resultado.php?setor=1">{sector}</a>'), _label("Max 52 sem"), _data(_br_number(price * 1.3))),
+        row(_label("Subsetor"), _data(f'<a href="resultado.php?segmento=1">{subsector}</a>'), _label("Vol $ méd (2m)"), _data(money(1e5, 5e8))),
+    ]
+    market = [
+        row(_label("Valor de mercado"), _data(money(1e8, 5e11)), _label("Últ balanço processado"), _data(f"30/06/{year}")),
+        row(_label("Valor da firma"), _data(money(1e8, 6e11)), _label("Nro. Ações"), _data(money(1e6, 1e10))),
+    ]
+    oscillations = ["Dia", "Mês", "30 dias", "12 meses"] + [str(year - offset) for offset in range(6)]
+    indicators = [
+        ("P/L", "LPA"), ("P/VP", "VPA"), ("P/EBIT", "Marg. Bruta"), ("PSR", "Marg. EBIT"), ("P/Ativos", "Marg. Líquida"),
+        ("P/Cap. Giro", "EBIT / Ativo"), ("P/Ativ Circ Liq", "ROIC"), ("Div. Yield", "ROE"), ("EV / EBITDA", "Liquidez Corr"),
+        ("EV / EBIT", "Div Br/ Patrim"), ("Cres. Rec (5a)", "Giro Ativos"),
+    ]
+    fundamentals = ['<tr><td colspan="2" class="nivel1">Oscilações</td><td colspan="4" class="nivel1">Indicadores fundamentalistas</td></tr>']
+    for position, (left, right) in enumerate(indicators):
+        oscillation = oscillations[position] if position < len(oscillations) else None
+        cells = [_label(oscillation), f'<td class="data"><span class="oscil"><font color="#F75D59">{pct()}</font></span></td>'] if oscillation else ['<td class="label"></td><td class="data"></td>']
+        fundamentals.append(row(*cells, _label(left), _data(num(-5, 40)), _label(right), _data(pct() if "Marg" in right or right in ("ROIC", "ROE") else num(-2, 10))))
+    balance = [
+        row(_label("Ativo"), _data(money(1e8, 1e12)), _label("Dív. Bruta"), _data(money(0, 3e11))),
+        row(_label("Disponibilidades"), _data(money(1e6, 1e11)), _label("Dív. Líquida"), _data(money(-1e10, 2e11))),
+        row(_label("Ativo Circulante"), _data(money(1e7, 3e11)), _label("Patrim. Líq"), _data(money(-1e9, 4e11))),
+    ]
+    results = ['<tr><td colspan="2" class="nivel1">Últimos 12 meses</td><td colspan="2" class="nivel1">Últimos 3 meses</td></tr>']
+    for name in ("Receita Líquida", "EBIT", "Lucro Líquido"):
+        results.append(row(_label(name), _data(money(-1e9, 5e11)), _label(name), _data(money(-1e8, 1.2e11))))
+
+    tables = [header, market, fundamentals, balance, results]
+    body = "\n".join('<table class="w728">\n' + "\n".join(rows) + "\n</table>" for rows in tables)
+    return (
+        f"<!DOCTYPE html>\n{SYNTHETIC_MARKER}\n<html><head><meta charset=\"ISO-8859-1\"><title>{ticker} - Fundamentus</title></head>\n"
+        f'<body><div class="conteudo clearfix">\n{body}\n</div></body></html>'
+    )
+
+
+def _synthetic_result_page(tickers: list, rng: random.Random) -> str:
+    header = "".join(f"<th>{title}</th>" for title in RESULT_HEADERS)
+    rows = []
+    for ticker in tickers:
+        values = [_br_number(rng.uniform(1, 120))] + [
+            _br_number(rng.uniform(-20, 60), 2) + ("%" if title in ("Div.Yield", "Mrg Ebit", "Mrg. Líq.", "ROIC", "ROE", "Cresc. Rec.5a") else "")
+            for title in RESULT_HEADERS[2:]
+        ]
+        cells = "".join(f"<td>{value}</td>" for value in values)
+        rows.append(f'<tr><td><span class="tips"><a href="detalhes.php?papel={ticker}">{ticker}</a></span></td>{cells}</tr>')
+    return (
+        f"<!DOCTYPE html>\n{SYNTHETIC_MARKER}\n<html><head><meta charset=\"ISO-8859-1\"></head><body>\n"
+        f'<table id="resultado" class="resultado"><thead><tr>{header}</tr></thead><tbody>\n' + "\n".join(rows) +
+        "\n</tbody></table></body></html>"
+    )
+
+
+def generate_synthetic_fixtures(fixtures_dir: str, count: int = 300, seed: int = 42, year: int = None) -> dict:
+    """Gera 'count' páginas sintéticas determinísticas (mesma semente = mesmas páginas)."""
+    rng = random.Random(seed)
+    year = year or time.localtime().tm_year
+    tickers = _synthetic_tickers(count, rng)
+    os.makedirs(os.path.join(fixtures_dir, "detalhes"), exist_ok=True)
+    with open(os.path.join(fixtures_dir, "resultado.html"), "wb") as f:
+        f.write(_synthetic_result_page(tickers, rng).encode(ENCODING))
+    for ticker in tickers:
+        with open(os.path.join(fixtures_dir, "detalhes", f"{ticker}.html"), "wb") as f:
+            f.write(_synthetic_detail_page(ticker, rng, year).encode(ENCODING))
+    return _write_manifest(fixtures_dir, "synthetic", tickers)
@@ -0,0 +1,466 @@
+"""
+Benchmarks offline do ETL do Fundamentus.
+
+Sobe um servidor local com as páginas gravadas (standin_server.py) e mede cada estágio separadamente:
+- get_all_tickers (resultado.php);
+- coleta das páginas detalhes.php: motor assíncrono, revalidação condicional (304) e motor 'threads'
+  (scrape_company_data);
+- parsing (parser rápido x BeautifulSoup, com verificação de paridade);
+- transformação (fundamentus_transform);
+- carga (save_to_sql_sqlserver_pyodbc) em um SQLite local no lugar do SQL Server;
+- cópia analítica local (fundamentus_sinks.EmbeddedMirrorSink): gravação e uma consulta de agregação;
+- modo de perfilamento (fundamentus_profiling): custo por estágio desligado e lentidão da transformação ligado;
+- importação do arquivo da DAG (tempo e módulos carregados), como o scheduler faz a cada ciclo de parse.
+
+Os resultados são gravados em JSON (benchmarks/results/) e comparados com uma linha de base:
+    python benchmarks/run_benchmarks.py                       # mede e compara com benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline       # mede e grava a nova linha de base
+    python benchmarks/run_benchmarks.py --record --limit 200  # grava fixtures a partir do site real
+    python benchmarks/run_benchmarks.py --dag-import-only     # só a verificação da importação da DAG
+O processo termina com código 1 se alguma métrica piorar além da tolerância ou se alguma verificação falhar.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "dags"))
+
+import pandas as pd
+
+import fundamentus_async_fetch
+import fundamentus_metrics
+import fundamentus_parsing
+import fundamentus_profiling
+import fundamentus_sinks
+import fundamentus_transform
+import Fundamentus_WebScraping_Tratamento_CargaSQL as etl
+from fixtures import FIXTURES_DIR, generate_synthetic_fixtures, load_manifest, record_fixtures
+from fundamentus_html_archive import HtmlArchive
+from standin_server import StandInServer
+
+# --- Configuração padrão ---
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+DEFAULT_TOLERANCE = 0.25     # Piora aceita em relação à linha de base (25%), acima disso é regressão
+DEFAULT_REPEAT = 3           # Estágios rápidos são repetidos e vale a mediana
+DEFAULT_THREAD_SAMPLE = 60   # O motor 'threads' tem um atraso fixo por página: mede só uma amostra
+DEFAULT_LOAD_ROWS = 20_000   # O snapshot é replicado até este número de linhas para medir a carga
+SYNTHETIC_TICKERS = 300
+MAX_DAG_IMPORT_SECONDS = 1.0 # Tempo máximo aceito para importar o arquivo da DAG (já com o Airflow carregado)
+PROFILING_OFF_CALLS = 100_000  # Estágios vazios medidos com o perfilamento desligado
+MAX_PROFILING_OFF_OVERHEAD = 0.001 # Custo máximo aceito do modo desligado: 0,1% da transformação por estágio
+
+# Módulos que não podem ser carregados pela importação do arquivo da DAG: só as tarefas precisam deles
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "bs4", "requests", "aiohttp", "pyodbc", "Fundamentus_WebScraping_Tratamento_CargaSQL")
+
+# Executado em um processo novo: importa o Airflow e depois mede só a importação do arquivo da DAG
+DAG_IMPORT_PROBE = """
+import json, sys, time
+import airflow
+from airflow.operators.python import PythonOperator
+before = set(sys.modules)
+start = time.perf_counter()
+import fundamentus_etl_dag
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(set(sys.modules) - before)}))
+"""
+
+
+def _median_seconds(func, repeat: int):
+    """Executa 'func' 'repeat' vezes; devolve (mediana dos tempos em segundos, último resultado)."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def _metric(value: float, unit: str, better: str) -> dict:
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+# --- Estágios ---
+def bench_get_all_tickers(server: StandInServer, repeat: int, results: dict) -> list:
+    server.reset_stats()
+    seconds, tickers = _median_seconds(etl.get_all_tickers, repeat)
+    results["metrics"]["get_all_tickers.seconds"] = _metric(seconds, "s", "lower")
+    results["counts"]["tickers"] = len(tickers)
+    return tickers
+
+
+def bench_scrape_async(server: StandInServer, tickers: list, results: dict) -> list:
+    server.reset_stats()
+    start = time.perf_counter()
+    companies = etl.scrape_companies_async(tickers)
+    seconds = time.perf_counter() - start
+    failed = sum(1 for company in companies if len(company) <= 1)
+    results["metrics"]["scrape_async.pages_per_sec"] = _metric(len(tickers) / seconds, "pages/s", "higher")
+    results["counts"]["scrape_async.failed_pages"] = failed
+    results["server"]["scrape_async"] = dict(server.stats)
+    return companies
+
+
+def bench_scrape_revalidate(server: StandInServer, tickers: list, results: dict) -> None:
+    """Segunda coleta com o arquivo de HTML: o servidor responde 304 e o parse vem do cache."""
+    with tempfile.TemporaryDirectory() as archive_dir:
+        archive = HtmlArchive(archive_dir)
+        try:
+            etl.scrape_companies_async(tickers, archive, "bench-1")
+            archive.commit()
+            server.reset_stats()
+            start = time.perf_counter()
+            etl.scrape_companies_async(tickers, archive, "bench-2")
+            seconds = time.perf_counter() - start
+        finally:
+            archive.close()
+    results["metrics"]["scrape_revalidate.pages_per_sec"] = _metric(len(tickers) / seconds, "pages/s", "higher")
+    results["server"]["scrape_revalidate"] = dict(server.stats)
+
+
+def bench_scrape_threads(server: StandInServer, tickers: list, workers: int, results: dict) -> None:
+    server.reset_stats()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(etl.scrape_company_data, tickers))
+    seconds = time.perf_counter() - start
+    results["metrics"]["scrape_threads.pages_per_sec"] = _metric(len(tickers) / seconds, "pages/s", "higher")
+    results["server"]["scrape_threads"] = dict(server.stats)
+
+
+def bench_parsers(fixtures_dir: str, tickers: list, repeat: int, results: dict) -> None:
+    pages = []
+    for ticker in tickers:
+        path = os.path.join(fixtures_dir, "detalhes", f"{ticker}.html")
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                pages.append((ticker, f.read().decode("ISO-8859-1")))
+    if not pages:
+        return
+
+    for parser in ("fast", "bs4"):
+        seconds, _ = _median_seconds(
+            lambda: [fundamentus_parsing.parse_company_page(ticker, html, parser, False) for ticker, html in pages], repeat
+        )
+        results["metrics"][f"parse_{parser}.ms_per_page"] = _metric(seconds * 1000 / len(pages), "ms", "lower")
+
+    mismatches = [
+        ticker for ticker, html in pages
+        if fundamentus_parsing.parse_company_page_fast(ticker, html) != fundamentus_parsing.parse_company_page_bs4(ticker, html)
+    ]
+    results["checks"]["parser_parity"] = {"ok": not mismatches, "pages": len(pages), "mismatches": mismatches[:20]}
+
+
+def bench_transform(companies: list, repeat: int, results: dict) -> pd.DataFrame:
+    execution_ts = pd.Timestamp.now(tz="America/Sao_Paulo")
+    seconds, df = _median_seconds(lambda: fundamentus_transform.transform_companies(companies, execution_ts), repeat)
+    results["metrics"]["transform.rows_per_sec"] = _metric(len(companies) / seconds, "rows/s", "higher")
+    results["counts"]["transform.columns"] = len(df.columns)
+    return df
+
+
+def _replicate(df: pd.DataFrame, rows: int) -> pd.DataFrame:
+    """Replica o snapshot até 'rows' linhas, com tickers únicos (a chave da tabela)."""
+    copies = max(1, -(-rows // len(df)))
+    frames = []
+    for copy in range(copies):
+        part = df.copy()
+        part["ticker"] = part["ticker"].astype(str) + f"_{copy}"
+        frames.append(part)
+    return fundamentus_transform.concat_snapshots(frames).head(rows).reset_index(drop=True)
+
+
+def bench_load(df: pd.DataFrame, rows: int, repeat: int, results: dict) -> None:
+    """Carga completa (DELETE + INSERT em lotes) em um SQLite temporário com a mesma tabela."""
+    data = _replicate(df, rows)
+    with tempfile.TemporaryDirectory() as db_dir:
+        connection = sqlite3.connect(os.path.join(db_dir, "bench.sqlite"))
+        try:
+            columns = ", ".join(f"[{col}]" for col in data.columns)
+            connection.execute(f"CREATE TABLE carga_fundamentus ({columns})")
+            seconds, _ = _median_seconds(
+                lambda: etl.save_to_sql_sqlserver_pyodbc(
+                    data, "carga_fundamentus", connection=connection, load_strategy="executemany", load_mode="full"
+                ),
+                repeat,
+            )
+            loaded = connection.execute("SELECT COUNT(*) FROM carga_fundamentus").fetchone()[0]
+        finally:
+            connection.close()
+    results["metrics"]["load.rows_per_sec"] = _metric(len(data) / seconds, "rows/s", "higher")
+    results["checks"]["load_row_count"] = {"ok": loaded == len(data), "expected": len(data), "loaded": loaded}
+
+
+def bench_mirror(df: pd.DataFrame, rows: int, repeat: int, results: dict) -> None:
+    """Gravação na cópia local (carga + histórico) e uma agregação por subsetor sobre o histórico."""
+    data = _replicate(df, rows)
+    with tempfile.TemporaryDirectory() as mirror_dir:
+        with fundamentus_sinks.EmbeddedMirrorSink(mirror_dir) as mirror:
+            seconds, _ = _median_seconds(lambda: mirror.write(data, {}), repeat)
+            query_seconds, aggregate = _median_seconds(
+                lambda: mirror.query(
+                    "SELECT subsetor, COUNT(*) AS n, AVG(ev_ebit) AS ev_ebit, AVG(roic) AS roic "
+                    "FROM fundamentus_historico WHERE data_execucao = ? GROUP BY subsetor",
+                    (str(data["data_execucao"].iloc[0]),),
+                ),
+                repeat,
+            )
+            loaded = mirror.query("SELECT COUNT(*) AS n FROM fundamentus_historico")["n"].iloc[0]
+    results["metrics"]["mirror.rows_per_sec"] = _metric(len(data) / seconds, "rows/s", "higher")
+    results["metrics"]["mirror.aggregate_seconds"] = _metric(query_seconds, "s", "lower")
+    results["checks"]["mirror_row_count"] = {
+        "ok": loaded == len(data) and int(aggregate["n"].sum()) == len(data),
+        "expected": len(data),
+        "loaded": int(loaded),
+    }
+
+
+def bench_profiling(companies: list, repeat: int, results: dict) -> None:
+    """
+    Modo de perfilamento. Desligado: custo de entrar e sair de um estágio vazio (RunMetrics.stage com e
+    sem o gancho do perfilador) e do teste feito a cada página parseada. Ligado: quantas vezes a
+    transformação fica mais lenta com o perfil de CPU e de memória.
+    """
+    execution_ts = pd.Timestamp.now(tz="America/Sao_Paulo")
+    transform = lambda: fundamentus_transform.transform_companies(companies, execution_ts)
+    metrics = fundamentus_metrics.RunMetrics("benchmark")
+
+    def empty_stages():
+        for _ in range(PROFILING_OFF_CALLS):
+            with metrics.stage("vazio"):
+                pass
+
+    lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def bare_stage(name): # RunMetrics.stage sem o gancho do perfilador (como antes do modo existir)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with lock:
+                stage = metrics.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                stage["seconds"] += seconds
+                stage["calls"] += 1
+
+    def bare_stages():
+        for _ in range(PROFILING_OFF_CALLS):
+            with bare_stage("vazio"):
+                pass
+
+    def parse_hooks():
+        for _ in range(PROFILING_OFF_CALLS):
+            profiler = fundamentus_metrics.current().profiler
+            if profiler is not None and profiler.sample_parse():
+                pass
+
+    stage_seconds, _ = _median_seconds(empty_stages, repeat)
+    bare_seconds, _ = _median_seconds(bare_stages, repeat)
+    hook_seconds, _ = _median_seconds(parse_hooks, repeat)
+    off_overhead = max(stage_seconds - bare_seconds, 0.0) / PROFILING_OFF_CALLS
+
+    def staged_transform():
+        with metrics.stage("transform"):
+            return transform()
+
+    transform_seconds, _ = _median_seconds(staged_transform, repeat)
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profiler = fundamentus_profiling.StageProfiler("benchmark", "profiling", profile_dir)
+        metrics.profiler = profiler
+        try:
+            profiled_seconds, _ = _median_seconds(staged_transform, repeat)
+        finally:
+            metrics.profiler = None
+            profiler.close()
+        written = sorted(os.listdir(profiler.path))
+
+    results["metrics"]["profiling.off_stage_overhead_us"] = _metric(off_overhead * 1e6, "us", "lower")
+    results["metrics"]["profiling.off_parse_hook_us"] = _metric(hook_seconds * 1e6 / PROFILING_OFF_CALLS, "us", "lower")
+    results["metrics"]["profiling.on_transform_slowdown"] = _metric(profiled_seconds / transform_seconds, "x", "lower")
+    results["checks"]["profiling_off_overhead"] = {
+        "ok": off_overhead <= MAX_PROFILING_OFF_OVERHEAD * transform_seconds and "transform.prof" in written,
+        "stage_overhead_us": round(off_overhead * 1e6, 3),
+        "transform_seconds": round(transform_seconds, 6),
+        "artifacts": written,
+    }
+
+
+# --- Linha de base ---
+def bench_dag_import(results: dict) -> None:
+    """
+    Importa fundamentus_etl_dag em um processo novo (com o Airflow já importado) e verifica que nenhum
+    módulo pesado do ETL foi carregado. Sem o Airflow instalado, a verificação é pulada com um aviso.
+    """
+    dags_dir = os.path.join(os.path.dirname(BENCHMARKS_DIR), "dags")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [dags_dir, os.environ.get("PYTHONPATH")])))
+    probe = subprocess.run([sys.executable, "-c", DAG_IMPORT_PROBE], cwd=dags_dir, env=env, capture_output=True, text=True)
+    if probe.returncode != 0:
+        if "No module named 'airflow'" in probe.stderr:
+            print("AVISO: Airflow não instalado; verificação da importação da DAG pulada.")
+            return
+        results["checks"]["dag_import"] = {"ok": False, "error": probe.stderr.strip().splitlines()[-1:]}
+        return
+    measured = json.loads(probe.stdout.strip().splitlines()[-1])
+    heavy = [name for name in measured["modules"] if name.split(".")[0] in HEAVY_MODULES
+             or (name.startswith("fundamentus_") and name != "fundamentus_etl_dag")]
+    results["metrics"]["dag_import.seconds"] = _metric(measured["seconds"], "s", "lower")
+    results["counts"]["dag_import.modules"] = len(measured["modules"])
+    results["checks"]["dag_import"] = {
+        "ok": not heavy and measured["seconds"] <= MAX_DAG_IMPORT_SECONDS,
+        "seconds": round(measured["seconds"], 6),
+        "modules": len(measured["modules"]),
+        "heavy_modules": heavy[:20],
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Lista as métricas que pioraram mais que 'tolerance' em relação à linha de base."""
+    regressions = []
+    for name, current in results["metrics"].items():
+        reference = baseline.get("metrics", {}).get(name)
+        if not reference or not reference["value"]:
+            continue
+        change = (current["value"] - reference["value"]) / reference["value"]
+        worse = -change if current["better"] == "higher" else change
+        current["baseline"] = reference["value"]
+        current["change"] = round(change, 4)
+        if worse > tolerance:
+            regressions.append(f"{name}: {reference['value']:.4g} -> {current['value']:.4g} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks offline do ETL do Fundamentus.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Pasta de fixtures (padrão: benchmarks/fixtures)")
+    parser.add_argument("--record", action="store_true", help="Grava as fixtures a partir do site real e sai")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de páginas detalhes.php a gravar com --record")
+    parser.add_argument("--synthetic-tickers", type=int, default=SYNTHETIC_TICKERS,
+                        help="Páginas sintéticas geradas quando não há fixtures na pasta")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latência média do servidor local")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Variação (+/-) da latência")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 503 (ex: 0.02)")
+    parser.add_argument("--seed", type=int, default=0, help="Semente da latência e dos erros do servidor")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="Requisições/s do motor assíncrono (o ETL usa 15; o padrão aqui mede o código, não o limite)")
+    parser.add_argument("--thread-workers", type=int, default=8, help="Threads do motor 'threads'")
+    parser.add_argument("--thread-sample", type=int, default=DEFAULT_THREAD_SAMPLE, help="Páginas medidas no motor 'threads'")
+    parser.add_argument("--load-rows", type=int, default=DEFAULT_LOAD_ROWS, help="Linhas gravadas no teste de carga")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Repetições dos estágios rápidos (mediana)")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de resultados (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Linha de base para comparação")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova linha de base")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Piora aceita antes de acusar regressão")
+    parser.add_argument("--dag-import-only", action="store_true", help="Só verifica a importação do arquivo da DAG e sai")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format=etl.LOG_FORMAT) # O log por ticker do ETL atrapalharia a leitura e a medição
+
+    if args.dag_import_only:
+        results = {"metrics": {}, "counts": {}, "checks": {}}
+        bench_dag_import(results)
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0 if all(check["ok"] for check in results["checks"].values()) else 1
+
+    if args.record:
+        manifest = record_fixtures(args.fixtures, etl.BASE_URL, etl.HEADERS, limit=args.limit)
+        print(f"{len(manifest['tickers'])} páginas gravadas em {args.fixtures}")
+        return 0
+
+    if not os.path.isfile(os.path.join(args.fixtures, "manifest.json")):
+        print(f"Sem fixtures em {args.fixtures}: gerando {args.synthetic_tickers} páginas sintéticas.")
+        generate_synthetic_fixtures(args.fixtures, args.synthetic_tickers)
+    manifest = load_manifest(args.fixtures)
+    if manifest["source"] != "recorded":
+        print("AVISO: fixtures sintéticas; para números representativos grave páginas reais com --record.")
+
+    fundamentus_async_fetch.REQUESTS_PER_SECOND = args.rate
+    fundamentus_async_fetch.BURST_SIZE = max(1, int(args.rate))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fixtures_source": manifest["source"],
+            "fixtures_pages": len(manifest["tickers"]),
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "rate": args.rate,
+            "load_rows": args.load_rows,
+            "page_parser": etl.PAGE_PARSER,
+            "parse_workers": etl.PARSE_WORKERS,
+        },
+        "metrics": {},
+        "counts": {},
+        "checks": {},
+        "server": {},
+    }
+
+    server = StandInServer(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    with server:
+        etl.BASE_URL = server.base_url
+        print(f"Servidor local em {server.base_url} ({manifest['source']}, {len(manifest['tickers'])} páginas)")
+
+        tickers = bench_get_all_tickers(server, args.repeat, results)
+        companies = bench_scrape_async(server, tickers, results)
+        bench_scrape_revalidate(server, tickers, results)
+        bench_scrape_threads(server, tickers[:args.thread_sample], args.thread_workers, results)
+
+    bench_parsers(args.fixtures, tickers, args.repeat, results)
+    df = bench_transform(companies, args.repeat, results)
+    bench_load(df, args.load_rows, args.repeat, results)
+    bench_mirror(df, args.load_rows, args.repeat, results)
+    bench_profiling(companies, args.repeat, results)
+    bench_dag_import(results)
+
+    failed_checks = [name for name, check in results["checks"].items() if not check["ok"]]
+    regressions = []
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        different = [key for key in ("fixtures_source", "fixtures_pages", "latency_ms", "jitter_ms", "error_rate", "rate", "load_rows")
+                     if baseline["meta"].get(key) != results["meta"][key]]
+        if different:
+            print(f"AVISO: configuração diferente da linha de base em {different}; comparação apenas indicativa.")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+    results["regressions"] = regressions
+    results["failed_checks"] = failed_checks
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d_%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'Métrica':<36}{'Valor':>14}  {'Linha de base':>14}")
+    for name, metric in results["metrics"].items():
+        reference = f"{metric['baseline']:.4g}" if "baseline" in metric else "-"
+        print(f"{name:<36}{metric['value']:>14.4g}  {reference:>14}  {metric['unit']}")
+    print(f"\nResultados gravados em {output}" + (f" e em {args.baseline}" if args.save_baseline else ""))
+
+    for name in failed_checks:
+        print(f"FALHA na verificação '{name}': {results['checks'][name]}")
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    return 1 if failed_checks or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
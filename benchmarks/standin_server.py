@@ -0,0 +1,136 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import CONTENT_TYPE
+
+# --- Servidor local que imita o Fundamentus ---
+# Serve resultado.php e detalhes.php?papel=X a partir de uma pasta de fixtures (ver fixtures.py),
+# com latência, variação (jitter) e taxa de erros configuráveis, para medir a coleta sem acessar o site.
+# Responde com ETag e 304 a requisições condicionais, como o HtmlArchive espera do servidor real.
+ERROR_STATUS = 503
+
+
+class StandInServer:
+    """
+    Servidor HTTP local (uma thread por conexão, keep-alive) com as páginas gravadas.
+    Uso: with StandInServer(fixtures_dir, latency_ms=80) as server: server.base_url
+    """
+
+    def __init__(self, fixtures_dir: str, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, host: str = "127.0.0.1", port: int = 0):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "errors": 0, "not_found": 0, "bytes": 0}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _page(self, name: str):
+        """Bytes e ETag da fixture 'name' (lidos uma vez e mantidos em memória)."""
+        if name not in self._pages:
+            path = os.path.join(self.fixtures_dir, name)
+            if not os.path.isfile(path):
+                self._pages[name] = None
+            else:
+                with open(path, "rb") as f:
+                    body = f.read()
+                self._pages[name] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        return self._pages[name]
+
+    def _draw(self) -> tuple:
+        """Sorteia (atraso em segundos, se a resposta deve falhar) sob o lock, para ser reprodutível."""
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+            fail = self._rng.random() < self.error_rate
+        return delay, fail
+
+    def _count(self, key: str, size: int = 0) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[key] += 1
+            self.stats["bytes"] += size
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, como o site real
+
+            def _send(self, status: int, body: bytes = b"", etag: str = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.endswith("/resultado.php"):
+                    name = "resultado.html"
+                elif url.path.endswith("/detalhes.php"):
+                    papel = parse_qs(url.query).get("papel", [""])[0]
+                    name = os.path.join("detalhes", os.path.basename(papel) + ".html")
+                else:
+                    name = None
+
+                delay, fail = server._draw()
+                if delay:
+                    time.sleep(delay)
+
+                page = server._page(name) if name else None
+                if fail:
+                    server._count("errors")
+                    self._send(ERROR_STATUS, b"Service Unavailable")
+                elif page is None:
+                    server._count("not_found")
+                    self._send(404, b"Not Found")
+                elif self.headers.get("If-None-Match") == page[1]:
+                    server._count("not_modified")
+                    self._send(304, etag=page[1])
+                else:
+                    server._count("ok", len(page[0]))
+                    self._send(200, page[0], page[1])
+
+            def log_message(self, format, *args):
+                pass # Sem log por requisição: atrapalharia a medição
+
+        return Handler
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {key: 0 for key in self.stats}
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="standin-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
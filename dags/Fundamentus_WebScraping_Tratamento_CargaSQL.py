@@ -1,376 +1,1098 @@
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import time
-import re
-import unicodedata
 import concurrent.futures
+import functools
 import random
 import pyodbc
 import logging
-from airflow.hooks.base import BaseHook # Importação necessária para Airflow
+import os
 import pendulum # Importação necessária para Airflow (e boa prática para datas)
 
-# --- Configuração do Servidor MS SQL ---
-# Estas variáveis serão usadas como fallback ou para referência,
-# mas o Airflow usará as configurações da conexão definida na UI.
-servidor = 'DESKTOP'
-banco_de_dados = 'FundamentosDB'
-driver_obdc_sql = '{ODBC Driver 18 for SQL Server}'
-tabela_sql = 'carga_fundamentus'
-conexao_autenticacao_windows = True # Se você usa autenticação Windows
-nome_de_usuario_sql = None
-senha_usuario_sql = None
+import fundamentus_async_fetch # Motor assíncrono de coleta (mesma pasta dags)
+import fundamentus_bulk_load # Carga em massa (fast_executemany / TVP) com lotes e registros/s
+from fundamentus_checkpoint import ScrapeCheckpoint # Checkpoint das empresas já coletadas (retomada)
+from fundamentus_history import HistoryStore # Histórico local por ticker com catálogo de snapshots
+from fundamentus_html_archive import HtmlArchive # Arquivo de HTML bruto endereçado por conteúdo
+import fundamentus_indicators # Indicadores derivados ao longo do tempo (estado incremental em data/indicators)
+import fundamentus_metrics # Métricas por estágio e por ticker (XCom + arquivo em data/metrics)
+import fundamentus_parsing
+import fundamentus_profiling # Modo de perfilamento: CPU e alocações por estágio (data/profiles)
+import fundamentus_ranking # Ranking da Fórmula Mágica materializado por execução
+import fundamentus_result_table # Tabela completa do resultado.php (modo de execução 'fast')
+import fundamentus_screener # Telas (screens) declarativas avaliadas em lote sobre o snapshot
+import fundamentus_shards # Arquivos intermediários da coleta distribuída em shards
+import fundamentus_sinks # Destinos da carga (interface e cópia analítica local em SQLite)
+import fundamentus_snapshots # Snapshots colunares (Parquet) particionados por data de execução
+import fundamentus_sql # Gerenciador de conexões SQL Server (pool, health check, transação compartilhada)
+import fundamentus_streaming # Pipeline em micro-lotes: coleta e carga sobrepostas
+import fundamentus_transform # Transformação vetorizada com esquema declarado
+from fundamentus_parsing import ( # Limpeza de valores/nomes e extração das páginas detalhes.php
+    STRING_FIELDS,
+    SPECIAL_METRICS,
+    DATE_COLUMNS_TO_CONVERT,
+    normalize_string_for_comparison,
+    clean_and_convert_value,
+    clean_column_name,
+    column_name_for,
+    parse_company_page_bs4,
+    parse_company_page_fast,
+)
+
+# --- Destinos da carga ---
+# 'sqlserver': tabela LOAD_TABLE no SQL Server (servidor, banco, credenciais e driver vêm da conexão do
+#              Airflow), com ranking, indicadores e, opcionalmente, a procedure de histórico na mesma transação;
+# 'mirror':    cópia analítica local em SQLite (data/mirror, ver fundamentus_sinks) com a tabela de carga,
+#              o histórico e as tabelas derivadas; sozinho, permite rodar o ETL de ponta a ponta sem SQL Server.
+# Os destinos são gravados na ordem da lista. Pode ser trocado por execução com o parâmetro 'sinks' da DAG.
+LOAD_SINKS = ("sqlserver",)
+SINK_NAMES = ("sqlserver", "mirror")
+LOAD_TABLE = fundamentus_sinks.LOAD_TABLE
+
+# --- Carga no SQL Server ---
+# Estratégia de inserção: 'fast_executemany' (padrão), 'tvp' ou 'executemany' (ver fundamentus_bulk_load)
+LOAD_STRATEGY = "fast_executemany"
+LOAD_BATCH_SIZE = 5000
+LOAD_TVP_TYPE_NAME = "dbo.carga_fundamentus_tvp" # Tipo de tabela usado apenas pela estratégia 'tvp'
+# Modo de carga: 'full' (DELETE + INSERT de tudo) ou 'incremental' (apenas linhas novas/alteradas,
+# comparando um hash por ticker com o da última carga, gravado em carga_fundamentus_hash; a data/hora
+# de execução é atualizada em todas as linhas). Como o hash inclui a cotação, em execuções diárias quase
+# todas as linhas mudam: o 'incremental' compensa em execuções repetidas no mesmo dia.
+# Pode ser trocado por execução com o parâmetro 'load_mode' da DAG; a carga 'full' também reescreve os hashes,
+# para que uma execução 'incremental' seguinte compare com o que está na tabela.
+LOAD_MODE = "full"
 
 # --- Configuração de Logging ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-logging.info("Iniciando a coleta de dados fundamentalistas do Fundamentus...")
+# Nas tarefas o Airflow já configura o logging; o basicConfig fica só na execução direta do script
+# (bloco __main__). Este módulo não deve ter efeitos colaterais na importação (ver fundamentus_etl_dag).
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
 BASE_URL = "http://www.fundamentus.com.br/"
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
-# --- Função auxiliar para normalizar strings (remove acentos, caracteres diacríticos, espaços extras, etc.) ---
-def normalize_string_for_comparison(s: str) -> str:
-    # REMOVE O CARACTERE '?' INICIAL SE EXISTIR
-    if s.startswith('?'):
-        s = s[1:]
-    # Remove acentos e caracteres diacríticos
-    s = unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('utf-8').strip()
-    # Troca espaços não quebráveis por espaços normais
-    s = s.replace('\xa0', ' ').strip()
-    # Remove múltiplos espaços e garante um único espaço entre as palavras
-    s = ' '.join(s.split())
-    return s
-
-# --- LISTAS RAW: Strings EXATAS como aparecem no site (antes de remover ':') ---
-STRING_FIELDS_RAW = [
-    "Tipo:",
-    "Empresa:",
-    "Setor:",
-    "Subsetor:",
-    "Data últ cot:", 
-    "Últ balanço processado:", 
-]
-
-SPECIAL_METRICS_RAW = [
-    "Receita Líquida:",
-    "EBIT:",
-    "Lucro Líquido:",
-    "Result Int Financ:",
-    "Rec Serviços:",
-]
-
-# --- NORMALIZAÇÃO DAS LISTAS UMA ÚNICA VEZ NO INÍCIO DO SCRIPT ---
-STRING_FIELDS = [normalize_string_for_comparison(s.replace(":", "")) for s in STRING_FIELDS_RAW]
-SPECIAL_METRICS = [normalize_string_for_comparison(s.replace(":", "")) for s in SPECIAL_METRICS_RAW]
-
-# --- Lista de colunas que devem ser convertidas para DATE no SQL Server ---
-# Estes são os nomes das colunas APÓS a limpeza por clean_column_name
-DATE_COLUMNS_TO_CONVERT = [
-    "data_ult_cot",
-    "ult_balanco_processado"
-]
-
-def clean_and_convert_value(value_str):
-    """
-    Limpa e converte uma string para um valor numérico (float),
-    tratando moedas, porcentagens e separadores decimais.
-    """
-    if isinstance(value_str, (int, float)):
-        return value_str
-    
-    value_str = str(value_str).strip() # Garante que é string
-    value_str = value_str.replace("R\$", "").replace("%", "").replace(".", "").replace(",", ".").strip()
-    
-    try:
-        float_val = float(value_str)
-        return float_val
-    except ValueError:
-        return pd.NA
-
-# 1) Alterar os nomes das colunas para retirar os caracteres especiais
-def clean_column_name(col_name: str) -> str:
-    """
-    Limpa o nome de uma coluna, removendo acentos, caracteres especiais,
-    substituindo espaços por underscores e convertendo para minúsculas.
-    """
-    # Normaliza caracteres Unicode (ex: 'ç' -> 'c', 'é' -> 'e')
-    cleaned_name = unicodedata.normalize('NFKD', col_name).encode('ascii', 'ignore').decode('utf-8')
-    # Substitui espaços e hifens por underscores
-    cleaned_name = cleaned_name.replace(' ', '_').replace('-', '_')
-    # Remove qualquer caractere que não seja letra, número ou underscore
-    cleaned_name = re.sub(r'[^a-zA-Z0-9_]', '', cleaned_name)
-    # Remove underscores duplicados ou no início/fim
-    cleaned_name = re.sub(r'_+', '_', cleaned_name).strip('_')
-    # Converte para minúsculas
-    cleaned_name = cleaned_name.lower()
-    return cleaned_name
+# --- Motor de coleta ---
+# 'async': sessão aiohttp keep-alive, token bucket global e concorrência adaptativa (padrão)
+# 'threads': caminho antigo com ThreadPoolExecutor + requests.get por ticker
+SCRAPE_ENGINE = "async"
+
+# --- Arquivo de HTML bruto ---
+# Guarda as páginas baixadas (comprimidas e deduplicadas por hash) em data/html_archive,
+# revalida com requisições condicionais e evita parsear de novo páginas que não mudaram.
+# Com o parâmetro 'offline_run_id' da DAG (ou a variável de ambiente FUNDAMENTUS_OFFLINE_RUN_ID),
+# o DataFrame é reconstruído apenas a partir do arquivo, sem acessar a rede ('latest' = última execução).
+HTML_ARCHIVE_ENABLED = True
+
+# --- Parsing das páginas ---
+# 'fast': extrator de passada única (fundamentus_parsing.parse_company_page_fast), padrão
+# 'bs4': caminho antigo com BeautifulSoup, também usado como fallback se o extrator rápido falhar
+PAGE_PARSER = "fast"
+
+# --- Pipeline coleta → parsing ---
+# O parsing e a limpeza dos valores rodam em um pool de processos (um por núcleo do worker),
+# alimentado por uma fila limitada a PARSE_QUEUE_SIZE páginas baixadas.
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_QUEUE_SIZE = 64
+
+# --- Snapshot da execução ---
+# Cada execução grava um snapshot Parquet (zstd, esquema explícito) em data/snapshots/data_execucao=YYYY-MM-DD/,
+# que pode ser lido por colunas e intervalo de datas com fundamentus_snapshots.read_snapshots.
+# O CSV antigo (data/carga_fundamentus_YYYYMMDD_HHMMSS.csv) só é gerado se WRITE_CSV_SNAPSHOT = True.
+WRITE_CSV_SNAPSHOT = False
+
+# --- Histórico local ---
+# Cada execução também é gravada em data/history/history.sqlite (fundamentus_history.HistoryStore):
+# catálogo de snapshots por data e índice por (ticker, snapshot) para consultas de histórico e "as of".
+HISTORY_STORE_ENABLED = True
+
+# --- Carga em micro-lotes (streaming) ---
+# Com STREAMING_LOAD = True (ou o parâmetro 'streaming_load' da DAG), as empresas coletadas seguem em
+# micro-lotes de STREAM_BATCH_SIZE para a transformação e a carga enquanto a coleta continua, com no
+# máximo STREAM_MAX_PENDING_BATCHES lotes aguardando. A carga inteira é uma única transação, com commit
+# só depois do último lote: o tempo total fica próximo do tempo da coleta.
+STREAMING_LOAD = False
+STREAM_BATCH_SIZE = 250
+STREAM_MAX_PENDING_BATCHES = 4
+
+# --- Ranking da Fórmula Mágica ---
+# Calculado em Python logo após a transformação (filtros e limites em fundamentus_ranking) e gravado
+# na tabela ranking_magic_formula na mesma transação da carga, uma vez por execução.
+MAGIC_FORMULA_RANKING_ENABLED = True
+
+# --- Indicadores derivados ao longo do tempo ---
+# Variação em relação ao snapshot anterior, distância das mínimas/máximas de 52 semanas e z-scores de
+# EV/EBIT e ROIC por subsetor (fundamentus_indicators), atualizados de forma incremental a partir de um
+# estado em data/indicators e gravados na tabela indicadores_fundamentus na mesma transação da carga.
+DERIVED_INDICATORS_ENABLED = True
+
+# --- Screener ---
+# Telas declaradas em fundamentus_screens.json (filtros + expressão de ranking), avaliadas em lote sobre
+# o snapshot com índices montados uma vez por execução (fundamentus_screener). Os resultados de todas as
+# telas vão para a tabela screener_resultados, na mesma transação da carga.
+SCREENER_ENABLED = True
+
+# --- Modo de perfilamento ---
+# Desligado por padrão. Ligado por PROFILING_ENABLED, pelo parâmetro 'profile' da DAG ou pela variável de
+# ambiente FUNDAMENTUS_PROFILE=1: cada estágio das tarefas ganha perfil de CPU (cProfile, para flamegraphs)
+# e de memória (pico e locais que mais alocaram, via tracemalloc), e uma amostra das páginas tem o parsing
+# perfilado individualmente. Os arquivos ficam em data/profiles/<tarefa>_<run_id> (fundamentus_profiling).
+# Com o modo ligado as durações medidas ficam maiores; desligado, o custo é desprezível.
+PROFILING_ENABLED = False
+
+# --- Coleta distribuída (DAG com tarefas mapeadas) ---
+# A tarefa get_ticker_universe divide os tickers em SHARD_COUNT shards (ou no parâmetro 'shard_count'
+# da DAG), cada shard é coletado por uma tarefa mapeada em qualquer worker do Celery e a tarefa final
+# junta os arquivos de data/shards, transforma e carrega. Cada shard tem o próprio limite de taxa;
+# para o site não receber SHARD_COUNT vezes mais requisições, o total fica limitado a
+# SHARD_TOTAL_REQUESTS_PER_SECOND, dividido igualmente entre os shards.
+SHARD_COUNT = 4
+SHARD_TOTAL_REQUESTS_PER_SECOND = 40.0
+THREAD_WORKERS = 8 # Threads do motor 'threads'
+
+# --- Checkpoint e nova tentativa dos tickers que falharam ---
+# As empresas coletadas ficam em data/checkpoints (fundamentus_checkpoint) durante a execução: uma nova
+# tentativa da tarefa retoma de onde parou. Depois da primeira passada, os tickers que falharam são
+# coletados de novo em até RETRY_PASSES passadas, esperando RETRY_BACKOFF_SECONDS (dobrando a cada
+# passada) e com metade da taxa de requisições. Os que ainda faltarem são listados no log e nas métricas.
+CHECKPOINT_ENABLED = True
+RETRY_PASSES = 2
+RETRY_BACKOFF_SECONDS = 5.0
+
+# --- Modo de execução ---
+# 'full': coleta o detalhes.php de todos os tickers (padrão).
+# 'fast': uma requisição ao resultado.php (cotação, múltiplos, margens, ROIC/ROE, liquidez, patrimônio de
+# todos os tickers) e o detalhes.php apenas dos tickers novos, sem setor no histórico ou com novo balanço
+# (fundamentus_result_table). Tipo, setor, subsetor, balanço e DRE dos demais vêm do snapshot anterior do
+# histórico local; campos que dependem da cotação do dia e só existem no detalhes.php ficam vazios.
+# Pensado para atualizações ao longo do dia. Pode ser trocado por execução com o parâmetro 'run_mode' da DAG.
+# Tickers com volume médio (2 meses) abaixo de FAST_MODE_MIN_LIQUIDITY nunca são coletados no modo 'fast'.
+RUN_MODE = "full"
+FAST_MODE_MIN_LIQUIDITY = 0.0
+
+def parse_company_page(ticker: str, html: str) -> dict:
+    """
+    Extrai os dados de uma empresa a partir do HTML da página detalhes.php com o parser
+    configurado em PAGE_PARSER (com fallback para o BeautifulSoup). Os valores ficam como texto;
+    a limpeza numérica é feita depois, por coluna, em fundamentus_transform.
+    """
+    return fundamentus_parsing.parse_company_page(ticker, html, PAGE_PARSER, False)
+
+def timed_parse(ticker: str, html: str):
+    """
+    parse_company_page com o tempo medido: (dados, segundos). No modo de perfilamento, 1 de cada
+    PARSE_SAMPLE_EVERY páginas é parseada sob cProfile (parse/<ticker>.prof, ver fundamentus_profiling).
+    """
+    profiler = fundamentus_metrics.current().profiler
+    if profiler is not None and profiler.sample_parse():
+        return profiler.profile_call(ticker, parse_company_page, ticker, html)
+    return fundamentus_metrics.timed_call(parse_company_page, ticker, html)
+
+def with_profiling(task):
+    """
+    Liga o modo de perfilamento durante a tarefa quando pedido (ver PROFILING_ENABLED). Os perfis
+    são gravados mesmo se a tarefa falhar. Chamada de dentro de outra tarefa já perfilada
+    (ex: a procedure na transação da carga), a função entra no perfil de quem chamou.
+    """
+    @functools.wraps(task)
+    def run(*args, **kwargs):
+        if not (PROFILING_ENABLED or fundamentus_profiling.profiling_requested(kwargs.get('params'))):
+            return task(*args, **kwargs)
+        if fundamentus_metrics.current().profiler is not None:
+            return task(*args, **kwargs)
+        name = task.__name__ if 'shard_index' not in kwargs else f"{task.__name__}_{kwargs['shard_index']:03d}"
+        profiler = fundamentus_profiling.StageProfiler(name, execution_run_id(kwargs))
+        fundamentus_metrics.set_profiler(profiler)
+        try:
+            return task(*args, **kwargs)
+        finally:
+            fundamentus_metrics.set_profiler(None)
+            profiler.close()
+    return run
 
 def scrape_company_data(ticker: str) -> dict:
     """
-    Coleta dados de uma única empresa no Fundamentus.
+    Coleta dados de uma única empresa no Fundamentus (caminho síncrono, usado pelo motor 'threads').
     """
     url = f"{BASE_URL}detalhes.php?papel={ticker}"
-    company_data = {"Ticker": ticker}
+    metrics = fundamentus_metrics.current()
 
+    start = time.perf_counter()
     try:
         response = requests.get(url, headers=HEADERS, timeout=10)
         response.raise_for_status() # Lança exceção para status HTTP de erro
     except requests.exceptions.RequestException as e:
+        status = e.response.status_code if e.response is not None else None # None: sem resposta (timeout, conexão)
+        metrics.record_fetch(ticker, status, time.perf_counter() - start, 0)
+        metrics.increment("fetch_failures")
         logging.warning(f"  Erro ao acessar a página de {ticker}: {e}")
-        return company_data
-
-    soup = BeautifulSoup(response.text, "html.parser")
+        return {"Ticker": ticker}
+    metrics.record_fetch(ticker, response.status_code, time.perf_counter() - start, len(response.content))
 
-    label_tds = soup.find_all("td", class_="label")
-    
-    for label_tag in label_tds:
-        raw_label_from_html = label_tag.text.strip()
-        
-        # Remove o ':' e então normaliza para comparação e uso como chave
-        processed_label_no_colon = raw_label_from_html.replace(":", "")
-        normalized_label = normalize_string_for_comparison(processed_label_no_colon)
-
-        # Este bloco é para SPECIAL_METRICS (Receita Líquida, EBIT, etc.)
-        if normalized_label in SPECIAL_METRICS:
-            parent_row = label_tag.find_parent("tr")
-            if parent_row:
-                data_cells = parent_row.find_all("td", class_="data")
-                if len(data_cells) >= 2:
-                    value_12m = data_cells[0].text.strip()
-                    value_3m = data_cells[1].text.strip()
-
-                    # Adiciona ao dicionário com os nomes normalizados e sufixos
-                    company_data[f"{normalized_label} 12m"] = value_12m
-                    company_data[f"{normalized_label} 3m"] = value_3m
-        else:
-            data_tag = label_tag.find_next_sibling("td", class_="data")
-            if data_tag:
-                value = data_tag.text.strip()
-                company_data[normalized_label] = value # Usa o nome normalizado como chave
-    
-    # Após popular company_data, processa os valores
-    for key, value in company_data.items():
-        # Verifica se a chave (label normalizado) está em STRING_FIELDS
-        # E também não converte colunas que serão tratadas como datas
-        if key != "Ticker" and key not in STRING_FIELDS and clean_column_name(key) not in DATE_COLUMNS_TO_CONVERT:
-            company_data[key] = clean_and_convert_value(value)
+    company_data, parse_seconds = timed_parse(ticker, response.text)
+    metrics.observe("parse_seconds", parse_seconds, ticker)
 
     time.sleep(random.uniform(0.1, 0.5)) # Pequeno delay para evitar sobrecarga no servidor
     return company_data
 
-def get_all_tickers() -> list:
+def parse_archived_page(archive: HtmlArchive, ticker: str, sha256: str, html: str = None) -> dict:
     """
-    Obtém a lista de todos os tickers de empresas disponíveis no Fundamentus.
+    Devolve os dados parseados de uma página arquivada, reaproveitando o cache do arquivo
+    quando o mesmo conteúdo já foi parseado pela versão atual do parser.
+    """
+    company_data = archive.get_parsed(sha256)
+    if company_data is None:
+        company_data, parse_seconds = timed_parse(ticker, html if html is not None else archive.load(sha256))
+        fundamentus_metrics.current().observe("parse_seconds", parse_seconds, ticker)
+        archive.put_parsed(sha256, company_data)
+    company_data["Ticker"] = ticker
+    return company_data
+
+def create_parse_executor() -> concurrent.futures.Executor:
+    """
+    Cria o pool de processos do estágio de parsing. Em ambientes que não permitem criar
+    processos filhos (ex: processo daemônico do worker), cai para uma única thread.
+    """
+    if PARSE_WORKERS > 1:
+        try:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+            executor.submit(int).result() # Garante que o pool realmente consegue subir
+            return executor
+        except Exception as exc:
+            logging.warning(f"  Pool de processos indisponível ({exc}), parsing em uma única thread.")
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+def scrape_companies_async(
+        tickers: list,
+        archive: HtmlArchive = None,
+        run_id: str = None,
+        on_company=None,
+        rate: float = None
+    ) -> list:
+    """
+    Coleta os dados de todas as empresas em dois estágios ligados por uma fila limitada:
+    - I/O: motor assíncrono (fundamentus_async_fetch) com sessão keep-alive comprimida,
+      limite global de taxa (token bucket) e concorrência adaptativa;
+    - CPU: parsing das páginas em um pool de processos com PARSE_WORKERS processos.
+    Se o parsing atrasar, a fila enche e a coleta espera (backpressure), então a memória
+    não cresce com o número de tickers.
+    Se 'archive' for informado, as páginas são revalidadas com requisições condicionais,
+    arquivadas no manifesto de 'run_id' e só são parseadas quando o conteúdo mudou.
+    Se 'on_company' for informado, cada empresa é entregue a ele assim que fica pronta
+    (ex: pipeline em micro-lotes) e a lista devolvida fica vazia. As entregas rodam em uma thread
+    própria, uma por vez e na ordem: se 'on_company' bloquear (ex: fila de micro-lotes cheia), só a
+    entrega espera, sem parar o event loop (requisições em andamento e token bucket). Uma exceção
+    em 'on_company' interrompe a coleta e é relançada.
+    'rate' substitui o limite de requisições/s do motor (ex: um shard da coleta distribuída).
+    """
+    all_companies_data = []
+    processed = {"count": 0}
+    metrics = fundamentus_metrics.current()
+
+    def requests_to_make():
+        # Gerador: as requisições (e consultas ao arquivo) são montadas sob demanda
+        for ticker in tickers:
+            url = f"{BASE_URL}detalhes.php?papel={ticker}"
+            extra_headers = archive.conditional_headers(url) if archive is not None else None
+            yield ticker, url, extra_headers
+
+    async def run_pipeline():
+        loop = asyncio.get_running_loop()
+        parse_queue = asyncio.Queue(maxsize=PARSE_QUEUE_SIZE)
+
+        with create_parse_executor() as executor, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="fundamentus-delivery") as delivery:
+            async def emit(company_data):
+                if on_company is None:
+                    all_companies_data.append(company_data)
+                else:
+                    await loop.run_in_executor(delivery, on_company, company_data)
+
+            async def parse(ticker, html):
+                if metrics.profiler is not None and metrics.profiler.sample_parse():
+                    # Amostra do modo de perfilamento: parseada aqui, o cProfile não enxerga o pool
+                    company_data, parse_seconds = metrics.profiler.profile_call(ticker, parse_company_page, ticker, html)
+                    metrics.observe("parse_seconds", parse_seconds, ticker)
+                    return company_data
+                # O tempo é medido dentro do processo de parsing (sem a espera na fila do pool)
+                company_data, parse_seconds = await loop.run_in_executor(
+                    executor, fundamentus_metrics.timed_call,
+                    fundamentus_parsing.parse_company_page, ticker, html, PAGE_PARSER, False
+                )
+                metrics.observe("parse_seconds", parse_seconds, ticker)
+                return company_data
+
+            async def company_from_result(result):
+                if not result.ok:
+                    metrics.increment("fetch_failures")
+                    logging.warning(f"  Erro ao acessar a página de {result.key}: {result.error}")
+                    return {"Ticker": result.key}
+                if archive is None:
+                    return await parse(result.key, result.text)
+                if result.status == 304:
+                    sha256 = archive.mark_not_modified(result.url)
+                else:
+                    sha256, _ = archive.store(result.url, result.text, result.headers)
+                archive.add_to_manifest(run_id, "detalhes", result.key, result.url, sha256)
+                company_data = archive.get_parsed(sha256)
+                if company_data is None:
+                    html = result.text if result.status != 304 else archive.load(sha256)
+                    company_data = await parse(result.key, html)
+                    archive.put_parsed(sha256, company_data)
+                company_data["Ticker"] = result.key
+                return company_data
+
+            async def parse_stage():
+                while True:
+                    result = await parse_queue.get()
+                    if result is None:
+                        return
+                    metrics.record_fetch(result.key, result.status, result.elapsed, result.size)
+                    try:
+                        company_data = await company_from_result(result)
+                    except Exception as exc:
+                        metrics.increment("parse_failures")
+                        logging.error(f"  Ticker {result.key} gerou uma exceção durante o parsing: {exc}")
+                        company_data = None
+                    if company_data is not None:
+                        await emit(company_data) # Falhas na entrega (ex: carga em micro-lotes) interrompem a coleta
+
+                    processed["count"] += 1
+                    if processed["count"] % 50 == 0 or processed["count"] == len(tickers):
+                        logging.info(f"Progresso de scraping: {processed['count']}/{len(tickers)} empresas processadas.")
+
+            async def fetch_stage():
+                await fundamentus_async_fetch.fetch_all(requests_to_make(), HEADERS, on_result=parse_queue.put, rate=rate)
+                for _ in parsers:
+                    await parse_queue.put(None)
+
+            # Dois despachantes por processo mantêm o pool ocupado sem acumular trabalho
+            parsers = [asyncio.create_task(parse_stage()) for _ in range(PARSE_WORKERS * 2)]
+            tasks = [asyncio.create_task(fetch_stage()), *parsers]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Um despachante falhou (ex: a carga em micro-lotes parou): encerra a coleta em vez de
+                # deixar a fila de parsing encher e a coleta esperar para sempre
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+    asyncio.run(run_pipeline())
+    return all_companies_data
+
+def scrape_companies_threads(tickers: list, on_company) -> None:
+    """
+    Motor 'threads': coleta as páginas com THREAD_WORKERS threads (scrape_company_data) e entrega
+    cada empresa a 'on_company' na thread principal, à medida que ficam prontas.
+    """
+    logging.info(f"\nIniciando coleta de dados para {len(tickers)} empresas usando {THREAD_WORKERS} threads...")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        futures = {executor.submit(scrape_company_data, ticker): ticker for ticker in tickers}
+
+        processed_count = 0
+        for future in concurrent.futures.as_completed(futures):
+            ticker = futures[future]
+            try:
+                data = future.result()
+            except Exception as exc:
+                logging.error(f"  Ticker {ticker} gerou uma exceção durante scraping: {exc}")
+                data = None
+            if data:
+                try:
+                    on_company(data) # Falhas na entrega (ex: carga em micro-lotes) interrompem a coleta
+                except BaseException:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+            processed_count += 1
+            if processed_count % 50 == 0 or processed_count == len(tickers):
+                logging.info(f"Progresso de scraping: {processed_count}/{len(tickers)} empresas processadas.")
+
+def scrape_companies(tickers: list, archive: HtmlArchive, run_id: str, on_company, rate: float = None) -> None:
+    """Coleta as empresas com o motor configurado em SCRAPE_ENGINE, entregando cada uma a 'on_company'."""
+    if SCRAPE_ENGINE == "async":
+        logging.info(f"\nIniciando coleta de dados para {len(tickers)} empresas com o motor assíncrono...")
+        scrape_companies_async(tickers, archive, run_id, on_company, rate)
+    else:
+        scrape_companies_threads(tickers, on_company)
+
+def is_failed_company(company_data: dict) -> bool:
+    """Os motores de coleta entregam só o ticker quando a página não pôde ser obtida."""
+    return len(company_data) <= 1
+
+def scrape_with_retries(
+        tickers: list,
+        archive: HtmlArchive,
+        run_id: str,
+        on_company,
+        checkpoint: ScrapeCheckpoint = None,
+        rate: float = None
+    ) -> list:
+    """
+    Coleta os tickers com checkpoint e nova tentativa dos que falharem:
+    1. as empresas que já estão no checkpoint (tentativa anterior da tarefa) são entregues sem nova coleta;
+    2. os demais tickers são coletados e cada sucesso é gravado no checkpoint;
+    3. os que falharam voltam em até RETRY_PASSES passadas, com espera crescente e metade da taxa.
+    Os tickers que continuam faltando são entregues como antes (só o ticker) e devolvidos na lista.
+    """
+    metrics = fundamentus_metrics.current()
+    succeeded = set()
+    failed = {}
+
+    def collect(company_data):
+        if is_failed_company(company_data):
+            failed[company_data["Ticker"]] = company_data
+            return
+        # Entregue antes de contar como sucesso: se a entrega falhar, o ticker não fica no checkpoint
+        on_company(company_data)
+        succeeded.add(company_data["Ticker"])
+        if checkpoint is not None:
+            checkpoint.add(company_data)
+
+    pending = tickers
+    if checkpoint is not None and len(checkpoint):
+        universe = set(tickers)
+        for company_data in checkpoint.companies():
+            if company_data["Ticker"] in universe:
+                succeeded.add(company_data["Ticker"])
+                on_company(company_data)
+        pending = [ticker for ticker in tickers if ticker not in succeeded]
+        metrics.increment("resumed_tickers", len(succeeded))
+        logging.info(f"  Checkpoint: {len(succeeded)} empresas retomadas da tentativa anterior, {len(pending)} a coletar.")
+
+    scrape_companies(pending, archive, run_id, collect, rate)
+
+    # Tickers sem resultado nenhum (ex: exceção no parsing) também entram na nova tentativa
+    retry = [ticker for ticker in pending if ticker not in succeeded]
+
+    retry_rate = (rate or fundamentus_async_fetch.REQUESTS_PER_SECOND) / 2
+    for attempt in range(1, RETRY_PASSES + 1):
+        if not retry:
+            break
+        backoff = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        logging.info(f"  Nova tentativa {attempt}/{RETRY_PASSES} para {len(retry)} tickers em {backoff:.0f}s...")
+        time.sleep(backoff)
+        metrics.increment("retried_tickers", len(retry))
+        with metrics.stage("retry"):
+            scrape_companies(retry, archive, run_id, collect, retry_rate)
+        retry = [ticker for ticker in retry if ticker not in succeeded]
+
+    missing = sorted(retry)
+    for ticker in missing:
+        on_company(failed.get(ticker, {"Ticker": ticker}))
+    metrics.increment("missing_tickers", len(missing))
+    metrics.note("missing_tickers", missing)
+    if missing:
+        logging.warning(f"  {len(missing)} tickers continuam sem dados após {RETRY_PASSES} novas tentativas: {', '.join(missing)}")
+    return missing
+
+def load_companies_from_archive(archive: HtmlArchive, run_id: str, on_company=None) -> list:
+    """
+    Reconstrói a lista de empresas de uma execução arquivada, sem acessar a rede.
+    As páginas são sempre parseadas de novo pela versão atual do parser (via cache por versão),
+    o que permite reprocessar execuções antigas depois de correções no tratamento.
+    Uma execução 'fast' é refeita como foi montada: a tabela do resultado.php arquivada, as páginas
+    detalhes.php coletadas nela e os campos repetidos do snapshot anterior (arquivados com a execução).
+    Se 'on_company' for informado, cada empresa é entregue a ele e a lista devolvida fica vazia.
+    """
+    all_companies_data = []
+    emit = on_company or all_companies_data.append
+    carried = archive.get_carried(run_id)
+    manifest = archive.manifest(run_id, "detalhes")
+    if carried is None:
+        logging.info(f"  Reconstruindo {len(manifest)} empresas a partir do arquivo da execução '{run_id}'...")
+
+    pages = {}
+    for ticker, sha256 in manifest:
+        try:
+            pages[ticker] = parse_archived_page(archive, ticker, sha256)
+        except Exception as exc:
+            fundamentus_metrics.current().increment("parse_failures")
+            logging.error(f"  Ticker {ticker} gerou uma exceção durante o parsing do arquivo: {exc}")
+            continue
+        if carried is None:
+            emit(pages.pop(ticker)) # Execução completa: cada página é uma empresa
+
+    if carried is not None:
+        result_page = archive.manifest(run_id, "resultado")
+        if not result_page:
+            raise ValueError(f"Execução 'fast' '{run_id}' sem a página resultado.php no arquivo de HTML.")
+        rows = fundamentus_result_table.parse_result_table(archive.load(result_page[0][1]))
+        logging.info(
+            f"  Reconstruindo {len(rows)} empresas da execução 'fast' '{run_id}' "
+            f"({len(pages)} páginas detalhes.php, {len(carried)} com campos repetidos)..."
+        )
+        for row in rows:
+            emit(fundamentus_result_table.merge_company(row, pages.get(row["Ticker"]), carried.get(row["Ticker"])))
+    return all_companies_data
+
+def parse_ticker_list(html: str) -> list:
+    """
+    Extrai a lista de tickers da tabela de resultados (resultado.php).
     """
-    logging.info("Obtendo lista de todos os tickers do Fundamentus...")
     tickers = []
+    soup = BeautifulSoup(html, "html.parser")
+    
+    table = soup.find("table", class_="resultado")
+    
+    if table:
+        rows = table.find_all("tr")
+        for row in rows[1:]: # Ignora a linha de cabeçalho
+            cols = row.find_all("td")
+            if cols and cols[0].find('a'): # Verifica se a primeira coluna contém um link (um ticker)
+                ticker = cols[0].text.strip()
+                tickers.append(ticker)
+    else:
+        logging.warning("    AVISO: Tabela de resultados não encontrada na página de tickers.")
+    return tickers
+
+def fetch_result_page(archive: HtmlArchive = None, run_id: str = None) -> str:
+    """
+    Baixa a página resultado.php (tabela com todos os tickers). Devolve o HTML ou '' em caso de erro.
+    Se 'archive' for informado, a página também é arquivada no manifesto de 'run_id'.
+    """
+    url = f"{BASE_URL}resultado.php"
+    metrics = fundamentus_metrics.current()
+    start = time.perf_counter()
     try:
-        response = requests.get(f"{BASE_URL}resultado.php", headers=HEADERS, timeout=20)
+        response = requests.get(url, headers=HEADERS, timeout=20)
+        metrics.record_fetch("resultado", response.status_code, time.perf_counter() - start, len(response.content))
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        table = soup.find("table", class_="resultado")
-        
-        if table:
-            rows = table.find_all("tr")
-            for row in rows[1:]: # Ignora a linha de cabeçalho
-                cols = row.find_all("td")
-                if cols and cols[0].find('a'): # Verifica se a primeira coluna contém um link (um ticker)
-                    ticker = cols[0].text.strip()
-                    tickers.append(ticker)
-        else:
-            logging.warning("    AVISO: Tabela de resultados não encontrada na página de tickers.")
+        if archive is not None:
+            sha256, _ = archive.store(url, response.text, response.headers)
+            archive.add_to_manifest(run_id, "resultado", "resultado", url, sha256)
+        return response.text
     except requests.exceptions.RequestException as e:
+        if e.response is None: # Sem resposta; as respostas de erro já foram registradas acima
+            metrics.record_fetch("resultado", None, time.perf_counter() - start, 0)
+        metrics.increment("fetch_failures")
         logging.error(f"  Erro ao acessar a página de resultados para obter tickers: {e}")
-    
+        return ""
+
+def get_all_tickers(archive: HtmlArchive = None, run_id: str = None) -> list:
+    """
+    Obtém a lista de todos os tickers de empresas disponíveis no Fundamentus.
+    Se 'archive' for informado, a página resultado.php também é arquivada no manifesto de 'run_id'.
+    """
+    logging.info("Obtendo lista de todos os tickers do Fundamentus...")
+    tickers = []
+    metrics = fundamentus_metrics.current()
+    with metrics.stage("get_all_tickers"):
+        html = fetch_result_page(archive, run_id)
+        if html:
+            tickers = parse_ticker_list(html)
+
+    metrics.increment("tickers", len(tickers))
     logging.info(f"  {len(tickers)} tickers encontrados.")
     return tickers
 
+def scrape_fast_snapshot(archive: HtmlArchive, run_id: str, on_company, checkpoint: ScrapeCheckpoint = None) -> int:
+    """
+    Modo de execução 'fast': monta o snapshot a partir da tabela completa do resultado.php (uma única
+    requisição) e coleta o detalhes.php só dos tickers escolhidos por fundamentus_result_table.select_deep_scrape
+    (novos, sem setor ou com novo balanço, acima de FAST_MODE_MIN_LIQUIDITY). Os demais repetem tipo, empresa,
+    setor, subsetor, balanço e DRE do snapshot anterior do histórico local. Devolve o número de empresas entregues.
+    """
+    metrics = fundamentus_metrics.current()
+    logging.info("Modo 'fast': obtendo a tabela completa do resultado.php...")
+    with metrics.stage("result_table"):
+        html = fetch_result_page(archive, run_id)
+        rows = fundamentus_result_table.parse_result_table(html) if html else []
+    metrics.increment("tickers", len(rows))
+    if not rows:
+        logging.error("Nenhum ticker encontrado na tabela de resultados.")
+        return 0
+
+    previous = pd.DataFrame()
+    if HISTORY_STORE_ENABLED:
+        history = HistoryStore()
+        try:
+            previous = history.snapshot()
+        finally:
+            history.close()
+
+    deep_tickers, reasons = fundamentus_result_table.select_deep_scrape(rows, previous, FAST_MODE_MIN_LIQUIDITY)
+    metrics.increment("deep_scraped_tickers", len(deep_tickers))
+    metrics.note("deep_scrape_reasons", reasons)
+    logging.info(f"  {len(rows)} tickers na tabela; {len(deep_tickers)} a coletar no detalhes.php {reasons}.")
+
+    carried = fundamentus_result_table.carried_fields(previous)
+    if archive is not None:
+        # Arquivados (antes da coleta) para o reprocessamento offline da execução (ver HtmlArchive.put_carried)
+        archive.put_carried(run_id, {row["Ticker"]: carried[row["Ticker"]] for row in rows if row["Ticker"] in carried})
+
+    deep_pages = []
+    if deep_tickers:
+        scrape_with_retries(deep_tickers, archive, run_id, deep_pages.append, checkpoint)
+    deep_companies = {company_data["Ticker"]: company_data for company_data in deep_pages}
+
+    metrics.increment("carried_forward_tickers", sum(1 for row in rows if row["Ticker"] not in deep_companies and row["Ticker"] in carried))
+    for row in rows:
+        on_company(fundamentus_result_table.merge_company(row, deep_companies.get(row["Ticker"]), carried.get(row["Ticker"])))
+    return len(rows)
+
 def save_to_sql_sqlserver_pyodbc(
         df: pd.DataFrame,
         table_name: str,
-        server: str, # Parâmetros agora são obrigatórios para a função
-        db_name: str,
+        server: str = None,
+        db_name: str = None,
         driver: str = '{ODBC Driver 18 for SQL Server}', # Driver padrão
         trusted_connection: bool = False, # Padrão para False, Airflow geralmente usa user/pass
         username: str = None,
-        password: str = None
-    ) -> None:
+        password: str = None,
+        load_strategy: str = None,
+        batch_size: int = None,
+        connection = None,
+        load_mode: str = None,
+        conn_id: str = None
+    ) -> dict:
     """
     Salva o DataFrame em um banco de dados SQL Server usando pyodbc diretamente.
-    Esta função está otimizada para autenticação Windows (trusted_connection=True).
+    A conexão vem do gerenciador compartilhado (fundamentus_sql): pela conexão do Airflow 'conn_id'
+    ou, sem ela, pelos parâmetros explícitos (server, db_name, credenciais). DELETE e INSERT
+    rodam na mesma transação, então uma falha na inserção não deixa a tabela vazia; se já houver
+    uma transação aberta na thread (ex: carga + procedure juntas), a carga participa dela.
+    A inserção usa fundamentus_bulk_load com a estratégia 'load_strategy' (padrão LOAD_STRATEGY)
+    em lotes de 'batch_size' linhas. Se 'connection' for informada (qualquer conexão DB-API,
+    ex: sqlite3 como substituto local nos testes), ela é usada no lugar do pool e não é fechada ao final.
+    Com 'load_mode' = 'incremental' (padrão LOAD_MODE), grava apenas as linhas novas ou alteradas; a carga
+    completa reescreve os hashes por ticker usados por ela (exceto com 'connection').
+    Retorna as estatísticas da carga (registros, lotes, segundos, registros/s) ou, no modo
+    incremental, o resumo de inseridos/atualizados/inalterados/removidos.
     """
     logging.info(f"\nIniciando a integração com o SQL Server na tabela '{table_name}' usando pyodbc direto...")
 
     if df.empty:
         logging.warning("DataFrame vazio, nada para salvar no banco de dados.")
-        return
-
-    # --- Construção da string de conexão para pyodbc ---
-    conn_str_parts = []
-    conn_str_parts.append(f'DRIVER={driver}')
-    conn_str_parts.append(f'SERVER={server}')
-    conn_str_parts.append(f'DATABASE={db_name}')
+        return {}
 
-    if trusted_connection:
-        conn_str_parts.append('Trusted_Connection=yes')
+    if connection is not None:
+        transaction = fundamentus_sql.external_transaction(connection)
+    elif conn_id:
+        transaction = fundamentus_sql.get_connection_manager(conn_id).transaction()
     else:
-        if username and password:
-            conn_str_parts.append(f'UID={username}')
-            conn_str_parts.append(f'PWD={password}')
-        else:
-            logging.error("Para trusted_connection=False, 'username' e 'password' devem ser fornecidos.")
-            raise ValueError("Credenciais de usuário/senha SQL Server ausentes.")
-    
-    # Adicionar parâmetros de criptografia e confiança para o ODBC Driver 18
-    conn_str_parts.append('Encrypt=yes')
-    conn_str_parts.append('TrustServerCertificate=yes')
-
-    pyodbc_conn_str = ';'.join(conn_str_parts)
-
-    conn = None
+        transaction = fundamentus_sql.get_connection_manager_for(
+            server=server,
+            database=db_name,
+            username=username,
+            password=password,
+            driver=driver,
+            trusted_connection=trusted_connection,
+        ).transaction()
+
+    metrics = fundamentus_metrics.current()
     cursor = None
     try:
-        conn = pyodbc.connect(pyodbc_conn_str)
-        cursor = conn.cursor()
-
-        # 1. Limpar a tabela (DELETE)
-        logging.info(f"  Limpando dados existentes na tabela '{table_name}'...")
-        cursor.execute(f"DELETE FROM {table_name}")
-        conn.commit() # Commit explícito para o DELETE
-        logging.info(f"  Tabela '{table_name}' limpa com sucesso.")
-
-        # 2. Inserir os novos dados (INSERT)
-        logging.info(f"  Iniciando inserção de {len(df)} registros na tabela '{table_name}'...\n")
-
-        # Preparar a instrução INSERT
-        # IMPORTANTE: Delimitar os nomes das colunas com colchetes [] para SQL Server
-        # Isso resolve o erro de sintaxe para nomes como '30_dias'
-        quoted_columns = [f"[{col}]" for col in df.columns]
-        columns = ', '.join(quoted_columns)
-        placeholders = ', '.join(['?' for _ in df.columns]) # '?' é o placeholder para pyodbc
-        insert_sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-
-        # Converter DataFrame para uma lista de tuplas para executemany
-        # Tratar valores NaN/NaT do Pandas para None (NULL no SQL)
-        data_to_insert = []
-        for row in df.itertuples(index=False, name=None):
-            # Converte pd.NA, pd.NaT, e np.nan para None para compatibilidade com o banco de dados
-            cleaned_row = tuple(None if pd.isna(x) else x for x in row)
-            data_to_insert.append(cleaned_row)
-
-        cursor.executemany(insert_sql, data_to_insert)
-        conn.commit() # Commit explícito para o INSERT
+        with metrics.stage("load"), transaction as conn:
+            cursor = conn.cursor()
+
+            if (load_mode or LOAD_MODE) == "incremental":
+                # Apenas linhas novas/alteradas (hash por ticker), via staging e upsert set-based
+                summary = fundamentus_bulk_load.incremental_upsert(
+                    cursor,
+                    table_name,
+                    df,
+                    strategy=load_strategy or LOAD_STRATEGY,
+                    batch_size=batch_size or LOAD_BATCH_SIZE,
+                )
+                metrics.record_load(summary)
+                return summary
+
+            # 1. Limpar a tabela (DELETE) - o commit acontece junto com o INSERT
+            logging.info(f"  Limpando dados existentes na tabela '{table_name}'...")
+            cursor.execute(f"DELETE FROM {table_name}")
+
+            # 2. Inserir os novos dados (INSERT)
+            logging.info(f"  Iniciando inserção de {len(df)} registros na tabela '{table_name}'...\n")
+
+            # Inserção em lotes, com conversão vetorizada de pd.NA / NaN / NaT para None (NULL no SQL)
+            stats = fundamentus_bulk_load.bulk_insert(
+                cursor,
+                table_name,
+                df,
+                strategy=load_strategy or LOAD_STRATEGY,
+                batch_size=batch_size or LOAD_BATCH_SIZE,
+                tvp_type_name=LOAD_TVP_TYPE_NAME,
+            )
+            metrics.record_load(stats)
+
+            # 3. Hashes da carga completa, para uma carga incremental posterior comparar com esta.
+            # A tabela de hashes é criada em T-SQL: com uma conexão externa (ex: SQLite dos benchmarks), fica só a carga.
+            if connection is None:
+                fundamentus_bulk_load.write_row_hashes(cursor, table_name, df, batch_size=batch_size or LOAD_BATCH_SIZE)
         logging.info(f"  Dados inseridos com sucesso na tabela '{table_name}'.")
+        return stats
 
     except pyodbc.Error as e:
+        metrics.increment("load_failures")
         sqlstate = e.args[0]
         logging.error(f"  Erro de banco de dados pyodbc: {e}")
         logging.error(f"  SQLSTATE: {sqlstate}")
-        if conn:
-            conn.rollback() # Faz rollback em caso de erro
-        raise # Re-lança a exceção
+        raise # Re-lança a exceção (o rollback já foi feito pela transação)
     except Exception as e:
+        metrics.increment("load_failures")
         logging.error(f"  Erro inesperado ao salvar dados no SQL Server: {e}")
-        if conn:
-            conn.rollback()
         raise
     finally:
         if cursor:
             cursor.close()
-        if conn:
-            conn.close()
-            logging.info("  Conexão pyodbc fechada.")
 
 
 ###################################################################################################################
 # NOVO BLOCO, VERIFICAR SE FICOU NO LUGAR CORRETO #################################################################
 ###################################################################################################################
 
+@with_profiling
 def execute_sql_procedure(
         procedure_name: str,
         conn_id: str = 'sql_server_fundamentus_conn', # ID da conexão Airflow
-        driver: str = '{ODBC Driver 18 for SQL Server}'
+        driver: str = None,
+        **kwargs
     ) -> None:
     """
     Conecta ao SQL Server e executa uma procedure armazenada.
-    Os detalhes da conexão são obtidos do Airflow Connections.
+    Os detalhes da conexão (incluindo driver e criptografia no campo 'extra') são obtidos do
+    Airflow Connections pelo gerenciador compartilhado (fundamentus_sql). Se já houver uma
+    transação aberta na thread (ex: logo após a carga), a procedure roda dentro dela.
+    Como tarefa própria da DAG (com 'ti'), publica as próprias métricas (XCom e data/metrics);
+    chamada de dentro do ETL, a duração entra nas métricas da execução corrente.
     """
+    params = kwargs.get('params') or {}
+    if params.get('run_procedure_in_load_transaction'):
+        logging.info(f"Procedure '{procedure_name}' já executada na transação da carga, nada a fazer.")
+        return
+    if "sqlserver" not in selected_sinks(params):
+        logging.info(f"Destino 'sqlserver' fora desta execução, procedure '{procedure_name}' não executada.")
+        return
+
     logging.info(f"\nIniciando execução da procedure '{procedure_name}' no SQL Server...")
 
-    conn = None
+    ti = kwargs.get('ti')
+    metrics = fundamentus_metrics.start_run("execute_sql_procedure") if ti is not None else fundamentus_metrics.current()
     cursor = None
     try:
-        # Obter detalhes da conexão do Airflow
-        airflow_conn = BaseHook.get_connection(conn_id)
-
-        server = airflow_conn.host
-        db_name = airflow_conn.schema # No Airflow, 'Schema' é usado para o nome do banco de dados
-        username = airflow_conn.login
-        password = airflow_conn.password
+        manager = fundamentus_sql.get_connection_manager(conn_id, driver=driver)
 
-        # Determinar se deve usar Trusted_Connection ou Autenticação SQL Server
-        trusted_connection = not (username and password)
+        with metrics.stage("procedure"), manager.transaction() as conn:
+            cursor = conn.cursor()
 
-        # Construção da string de conexão para pyodbc
-        conn_str_parts = []
-        conn_str_parts.append(f'DRIVER={driver}')
-        conn_str_parts.append(f'SERVER={server}')
-        conn_str_parts.append(f'DATABASE={db_name}')
-
-        if trusted_connection:
-            conn_str_parts.append('Trusted_Connection=yes')
-        else:
-            conn_str_parts.append(f'UID={username}')
-            conn_str_parts.append(f'PWD={password}')
-        
-        conn_str_parts.append('Encrypt=yes')
-        conn_str_parts.append('TrustServerCertificate=yes')
-
-        pyodbc_conn_str = ';'.join(conn_str_parts)
-
-        conn = pyodbc.connect(pyodbc_conn_str)
-        cursor = conn.cursor()
-
-        # Executar a procedure
-        logging.info(f"  Executando CALL {procedure_name}...")
-        cursor.execute(f"{{CALL {procedure_name}}}") # Sintaxe para chamar procedures em ODBC
-        conn.commit()
+            # Executar a procedure
+            logging.info(f"  Executando CALL {procedure_name}...")
+            cursor.execute(f"{{CALL {procedure_name}}}") # Sintaxe para chamar procedures em ODBC
         logging.info(f"  Procedure '{procedure_name}' executada com sucesso.")
 
     except pyodbc.Error as e:
+        metrics.increment("procedure_failures")
         sqlstate = e.args[0]
         logging.error(f"  Erro de banco de dados pyodbc ao executar procedure: {e}")
         logging.error(f"  SQLSTATE: {sqlstate}")
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
+        metrics.increment("procedure_failures")
         logging.error(f"  Erro inesperado ao executar procedure '{procedure_name}': {e}")
-        if conn:
-            conn.rollback()
         raise
     finally:
         if cursor:
             cursor.close()
-        if conn:
-            conn.close()
-            logging.info("  Conexão pyodbc para procedure fechada.")
+        if ti is not None:
+            metrics.export(execution_run_id(kwargs), ti=ti)
+
+
+
+def execution_timestamp(context: dict):
+    """Data/hora da execução da DAG em BRT (ou a hora atual, fora do Airflow)."""
+    execution_date_utc = context.get('data_interval_start') or context.get('execution_date')
+    if execution_date_utc:
+        return execution_date_utc.in_timezone('America/Sao_Paulo')
+    return pendulum.now('America/Sao_Paulo')
+
+def execution_run_id(context: dict) -> str:
+    """
+    Identificador da execução (data/hora em BRT, como no arquivo de HTML), igual em todas as tarefas
+    de uma mesma execução da DAG: nomeia os arquivos de métricas e a pasta dos shards.
+    """
+    return execution_timestamp(context).strftime('%Y%m%d_%H%M%S')
+
+def compute_derived_tables(df: pd.DataFrame) -> tuple:
+    """
+    Tabelas derivadas do snapshot, calculadas uma vez e gravadas por todos os destinos:
+    {tabela: DataFrame} com o ranking da Fórmula Mágica, os indicadores ao longo do tempo e os resultados do screener.
+    Devolve também o estado atualizado dos indicadores (ou None), que só deve ser gravado com save()
+    depois que todos os destinos fizerem commit: se a carga falhar, a nova tentativa parte do estado anterior.
+    """
+    derived = {}
+    indicator_state = None
+    if df.empty:
+        return derived, indicator_state
+    metrics = fundamentus_metrics.current()
+    if MAGIC_FORMULA_RANKING_ENABLED:
+        with metrics.stage("ranking"):
+            derived[fundamentus_ranking.RANKING_TABLE] = fundamentus_ranking.compute_magic_formula_ranking(df)
+    if DERIVED_INDICATORS_ENABLED:
+        with metrics.stage("indicators"):
+            indicator_state = fundamentus_indicators.IndicatorState()
+            derived[fundamentus_indicators.INDICATORS_TABLE] = indicator_state.update(df)
+    if SCREENER_ENABLED:
+        with metrics.stage("screener"):
+            derived[fundamentus_screener.SCREENER_TABLE] = fundamentus_screener.run_screens(df)
+    return derived, indicator_state
+
+def save_derived_tables(cursor, derived: dict) -> None:
+    """Grava as tabelas derivadas no SQL Server com o cursor da carga (sem commit)."""
+    # O tipo de tabela da estratégia 'tvp' só existe para carga_fundamentus
+    strategy = LOAD_STRATEGY if LOAD_STRATEGY != "tvp" else "fast_executemany"
+    if fundamentus_ranking.RANKING_TABLE in derived:
+        fundamentus_ranking.save_ranking(
+            cursor, derived[fundamentus_ranking.RANKING_TABLE], strategy=strategy, batch_size=LOAD_BATCH_SIZE
+        )
+    if fundamentus_indicators.INDICATORS_TABLE in derived:
+        fundamentus_indicators.save_indicators(
+            cursor, derived[fundamentus_indicators.INDICATORS_TABLE], strategy=strategy, batch_size=LOAD_BATCH_SIZE
+        )
+    if fundamentus_screener.SCREENER_TABLE in derived:
+        fundamentus_screener.save_screen_results(
+            cursor, derived[fundamentus_screener.SCREENER_TABLE], strategy=strategy, batch_size=LOAD_BATCH_SIZE
+        )
+
+class SqlServerSink(fundamentus_sinks.SnapshotSink):
+    """
+    Destino SQL Server: carga (save_to_sql_sqlserver_pyodbc), tabelas derivadas e, se 'procedure_name'
+    for informado, a procedure de histórico, tudo na mesma transação do gerenciador compartilhado.
+    """
+
+    name = "sqlserver"
+
+    def __init__(self, conn_id: str, table_name: str = LOAD_TABLE, load_mode: str = None, procedure_name: str = None):
+        self.conn_id = conn_id
+        self.table_name = table_name
+        self.load_mode = load_mode
+        self.procedure_name = procedure_name
+
+    def write(self, df: pd.DataFrame, derived: dict) -> dict:
+        # Se login e senha forem fornecidos na conexão do Airflow, usa SQL Server Auth.
+        # Caso contrário, tenta Trusted_Connection (Autenticação Windows).
+        # ATENÇÃO: Autenticação Windows (Trusted_Connection) é mais complexa em Docker.
+        # Recomenda-se usar autenticação SQL Server (usuário/senha) para Docker.
+        manager = fundamentus_sql.get_connection_manager(self.conn_id)
+        with manager.transaction() as conn:
+            stats = save_to_sql_sqlserver_pyodbc(
+                df,
+                table_name=self.table_name,
+                conn_id=self.conn_id,
+                load_mode=self.load_mode or LOAD_MODE
+            )
+            cursor = conn.cursor()
+            try:
+                save_derived_tables(cursor, derived)
+            finally:
+                cursor.close()
+            if self.procedure_name:
+                execute_sql_procedure(self.procedure_name, conn_id=self.conn_id)
+        return stats
+
+def selected_sinks(params: dict) -> list:
+    """Nomes dos destinos da execução (parâmetro 'sinks' da DAG ou LOAD_SINKS), validados antes da coleta."""
+    names = list(params.get('sinks') or LOAD_SINKS)
+    unknown = [name for name in names if name not in SINK_NAMES]
+    if unknown:
+        raise ValueError(f"Destinos de carga desconhecidos: {unknown}. Use {SINK_NAMES}.")
+    return names
+
+def create_sink(name: str, conn_id: str, load_mode: str = None, procedure_name: str = None) -> fundamentus_sinks.SnapshotSink:
+    """Destino 'name' (um de SINK_NAMES); a cópia local só abre o arquivo SQLite aqui, na hora da carga."""
+    if name == "mirror":
+        return fundamentus_sinks.EmbeddedMirrorSink(load_table=LOAD_TABLE)
+    return SqlServerSink(conn_id, LOAD_TABLE, load_mode=load_mode, procedure_name=procedure_name)
+
+def stream_load_companies(
+        batches,
+        execution_ts,
+        table_name: str,
+        conn_id: str,
+        load_mode: str = None,
+        procedure_name: str = None
+    ) -> tuple:
+    """
+    Consumidor do pipeline em micro-lotes (roda na thread de carga): transforma cada micro-lote
+    e o grava na tabela enquanto a coleta continua. Tudo acontece em uma única transação do
+    gerenciador compartilhado, com commit só depois do último lote (e da procedure, se
+    'procedure_name' for informado), então a tabela nunca expõe uma execução pela metade.
+    A limpeza da tabela (modo 'full') só acontece quando o primeiro lote chega.
+    O ranking da Fórmula Mágica e os indicadores derivados são calculados sobre a execução completa, antes do commit.
+    Devolve o DataFrame final da execução (lotes transformados e concatenados), as tabelas derivadas,
+    que os demais destinos da carga gravam depois, e o estado dos indicadores ainda não gravado.
+    """
+    incremental = (load_mode or LOAD_MODE) == "incremental"
+    hash_table_name = f"{table_name}_hash"
+    manager = fundamentus_sql.get_connection_manager(conn_id)
+    metrics = fundamentus_metrics.current()
+    frames = []
+    previous_hashes = None
+    loaded_tickers = set()
+
+    with manager.transaction() as conn:
+        cursor = conn.cursor()
+        try:
+            for batch in batches:
+                with metrics.stage("transform"):
+                    df_batch = fundamentus_transform.transform_companies(batch, execution_ts)
+                del batch
+
+                with metrics.stage("load"):
+                    first_batch = not frames
+                    if first_batch:
+                        if incremental:
+                            previous_hashes = fundamentus_bulk_load.read_row_hashes(cursor, hash_table_name)
+                        else:
+                            logging.info(f"  Limpando dados existentes na tabela '{table_name}'...")
+                            cursor.execute(f"DELETE FROM {table_name}")
+                    frames.append(df_batch)
+
+                    if incremental:
+                        stats = fundamentus_bulk_load.incremental_upsert(
+                            cursor,
+                            table_name,
+                            df_batch,
+                            hash_table_name=hash_table_name,
+                            strategy=LOAD_STRATEGY,
+                            batch_size=LOAD_BATCH_SIZE,
+                            previous_hashes=previous_hashes,
+                            remove_missing=False,
+                        )
+                        loaded_tickers.update(df_batch['ticker'])
+                    else:
+                        stats = fundamentus_bulk_load.bulk_insert(
+                            cursor,
+                            table_name,
+                            df_batch,
+                            strategy=LOAD_STRATEGY,
+                            batch_size=LOAD_BATCH_SIZE,
+                            tvp_type_name=LOAD_TVP_TYPE_NAME,
+                        )
+                        # Hashes reescritos a partir do primeiro lote, para uma carga incremental posterior
+                        fundamentus_bulk_load.write_row_hashes(
+                            cursor, table_name, df_batch, hash_table_name=hash_table_name,
+                            clear=first_batch, batch_size=LOAD_BATCH_SIZE,
+                        )
+                    metrics.record_load(stats)
+
+            if previous_hashes is not None:
+                # Tickers que não vieram nesta execução só podem ser removidos depois do último lote
+                removed = sorted(set(previous_hashes) - loaded_tickers)
+                fundamentus_bulk_load.delete_keys(cursor, table_name, hash_table_name, removed)
+                logging.info(f"  {len(removed)} tickers ausentes nesta execução removidos de '{table_name}'.")
+
+            df = fundamentus_transform.concat_snapshots(frames)
+            if previous_hashes is not None:
+                fundamentus_bulk_load.stamp_execution(cursor, table_name, df) # Inclusive os tickers inalterados
+            derived, indicator_state = compute_derived_tables(df)
+            save_derived_tables(cursor, derived)
+
+            if frames and procedure_name:
+                execute_sql_procedure(procedure_name, conn_id=conn_id)
+        finally:
+            cursor.close()
+
+    logging.info(f"  Carga em micro-lotes na tabela '{table_name}' concluída com um único commit.")
+    return df, derived, indicator_state
+
+
+# --- Coleta distribuída: universo de tickers e shards (tarefas da DAG) ---
+@with_profiling
+def get_ticker_universe(**kwargs) -> list:
+    """
+    Primeira tarefa da DAG: obtém os tickers e os divide em shards. Devolve a lista de op_kwargs das
+    tarefas mapeadas scrape_shard ({'shard_index', 'shard_count', 'tickers'}); o XCom leva só os tickers.
+    Sempre devolve pelo menos um shard (vazio no modo offline ou sem tickers), para que a tarefa
+    final rode e trate esses casos.
+    """
+    params = kwargs.get('params') or {}
+    if params.get('offline_run_id') or os.environ.get('FUNDAMENTUS_OFFLINE_RUN_ID'):
+        logging.info("Modo offline: nada a coletar, a tarefa final reprocessa o arquivo de HTML.")
+        return [{'shard_index': 0, 'shard_count': 1, 'tickers': []}]
+    if (params.get('run_mode') or RUN_MODE) == 'fast':
+        logging.info("Modo 'fast': a tarefa final lê o resultado.php e coleta só os tickers necessários.")
+        return [{'shard_index': 0, 'shard_count': 1, 'tickers': []}]
+
+    run_id = execution_run_id(kwargs)
+    archive = HtmlArchive(shared=True) if HTML_ARCHIVE_ENABLED else None
+    try:
+        if archive is not None:
+            archive.register_run(run_id, execution_timestamp(kwargs).isoformat())
+        tickers = get_all_tickers(archive, run_id)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    shards = fundamentus_shards.split_into_shards(tickers, int(params.get('shard_count') or SHARD_COUNT)) or [[]]
+    logging.info(f"  {len(tickers)} tickers divididos em {len(shards)} shards.")
+    return [
+        {'shard_index': index, 'shard_count': len(shards), 'tickers': shard_tickers}
+        for index, shard_tickers in enumerate(shards)
+    ]
+
+@with_profiling
+def scrape_shard(shard_index: int, shard_count: int, tickers: list, **kwargs) -> str:
+    """
+    Tarefa mapeada da DAG: coleta um shard de tickers e grava as empresas em um arquivo
+    intermediário (fundamentus_shards). Devolve apenas o caminho do arquivo (None se o shard
+    estiver vazio). As páginas vão para o arquivo de HTML compartilhado no manifesto da execução.
+    """
+    if not tickers:
+        return None
+
+    run_id = execution_run_id(kwargs)
+    metrics = fundamentus_metrics.start_run(f"scrape_shard_{shard_index:03d}")
+    rate = min(fundamentus_async_fetch.REQUESTS_PER_SECOND, SHARD_TOTAL_REQUESTS_PER_SECOND / shard_count)
+    logging.info(f"Shard {shard_index + 1}/{shard_count}: {len(tickers)} tickers, até {rate:.1f} requisições/s.")
+
+    archive = HtmlArchive(shared=True) if HTML_ARCHIVE_ENABLED else None
+    checkpoint = ScrapeCheckpoint(f"{run_id}_shard_{shard_index:03d}") if CHECKPOINT_ENABLED else None
+    writer = fundamentus_shards.ShardWriter(fundamentus_shards.shard_path(run_id, shard_index))
+    try:
+        with metrics.stage("scrape"):
+            scrape_with_retries(tickers, archive, run_id, writer.add, checkpoint, rate)
+        path = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if archive is not None:
+            archive.log_stats()
+            archive.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        metrics.increment("companies", writer.records)
+        metrics.log_summary()
+        metrics.export(run_id, ti=kwargs.get('ti')) # Também quando a coleta do shard falha
 
+    if checkpoint is not None:
+        checkpoint.remove() # O arquivo do shard já guarda o resultado
+    return path
 
 
 # --- Função principal para ETL (compatível com Apache Airflow) ---
+@with_profiling
 def etl_fundamentus_data(**kwargs): # <--- ESSENCIAL para Airflow
     """
     Função principal que orquestra o processo de ETL (Extração, Transformação, Carga)
     dos dados fundamentalistas do Fundamentus.
     Projetada para ser chamada por um PythonOperator no Apache Airflow.
+    Ao final (também se a execução falhar), as métricas da execução (duração por estágio, latências por ticker,
+    status HTTP, falhas, registros gravados) vão para o XCom 'metrics' e para data/metrics (ver fundamentus_metrics).
+    Com 'shard_files' (caminhos devolvidos pelas tarefas mapeadas scrape_shard), não coleta nada:
+    junta os shards já coletados, transforma e carrega, e apaga os arquivos depois da carga.
+    No modo 'fast' (RUN_MODE ou parâmetro 'run_mode'), a coleta acontece aqui (ver scrape_fast_snapshot).
+    A carga vai para os destinos de LOAD_SINKS (ou do parâmetro 'sinks'): SQL Server e/ou a cópia local.
+    Com o parâmetro 'profile' (ou FUNDAMENTUS_PROFILE=1), os estágios são perfilados (ver with_profiling).
     """
-    start_time = time.time()
+    metrics = fundamentus_metrics.start_run()
+    logging.info("Iniciando a coleta de dados fundamentalistas do Fundamentus...")
 
     # --- Obter e ajustar o timestamp de execução para o fuso horário de Brasília ---
     # Airflow passa 'data_interval_start' ou 'execution_date'
@@ -392,123 +1114,147 @@ def etl_fundamentus_data(**kwargs): # <--- ESSENCIAL para Airflow
     # Use timestamp_brt para o nome do arquivo CSV e para a coluna 'Data_Execucao'
     # String ISO formatada com fuso horário (removido, pois o replace(tzinfo=None) já faz isso)
 
-    # --- Extração ---
-    all_tickers = get_all_tickers() 
-    if not all_tickers:
-        logging.error("Nenhum ticker encontrado. Encerrando o processo ETL.")
-        return pd.DataFrame() 
+    try:
+        return run_etl(timestamp_brt, **kwargs)
+    finally:
+        # Também em falhas e encerramentos antecipados (ex: nenhum ticker): as métricas mostram até onde
+        # a execução chegou. No modo offline o arquivo leva a data/hora desta execução, não a da reprocessada.
+        metrics.log_summary()
+        metrics.export(timestamp_brt.strftime('%Y%m%d_%H%M%S'), ti=kwargs.get('ti'))
 
-    all_companies_data = []
-    MAX_WORKERS = 8 
-    
-    logging.info(f"\nIniciando coleta de dados para {len(all_tickers)} empresas usando {MAX_WORKERS} threads...")
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(scrape_company_data, ticker): ticker for ticker in all_tickers}
-        
-        processed_count = 0
-        for future in concurrent.futures.as_completed(futures):
-            ticker = futures[future]
-            try:
-                data = future.result()
-                if data:
-                    # Adiciona o timestamp de execução a cada registro
-                    # O timestamp_brt é um objeto pendulum, que pd.to_datetime pode converter
-                    data['Data_Execucao'] = timestamp_brt.replace(tzinfo=None) # Passa o objeto datetime sem tzinfo
-                    all_companies_data.append(data)
-            except Exception as exc:
-                logging.error(f"  Ticker {ticker} gerou uma exceção durante scraping: {exc}")
-            processed_count += 1
-            if processed_count % 50 == 0 or processed_count == len(all_tickers):
-                logging.info(f"Progresso de scraping: {processed_count}/{len(all_tickers)} empresas processadas.")
+def run_etl(timestamp_brt, **kwargs) -> pd.DataFrame:
+    """Corpo de etl_fundamentus_data (as métricas da execução já foram iniciadas por ela)."""
+    start_time = time.time()
+    metrics = fundamentus_metrics.current()
+
+    # --- Modo offline: reconstrói a execução a partir do arquivo de HTML bruto ---
+    params = kwargs.get('params') or {}
+    offline_run_id = params.get('offline_run_id') or os.environ.get('FUNDAMENTUS_OFFLINE_RUN_ID')
+    sink_names = selected_sinks(params) # Falha antes da coleta se houver um destino inválido
+    streaming = bool(params.get('streaming_load', STREAMING_LOAD))
+    if streaming and "sqlserver" not in sink_names:
+        logging.warning("Carga em micro-lotes só existe para o destino 'sqlserver'; usando a carga única.")
+        streaming = False
+    fast_mode = not offline_run_id and (params.get('run_mode') or RUN_MODE) == 'fast'
+    shard_files = kwargs.get('shard_files') if not fast_mode else None # No modo 'fast' não há shards
+    if shard_files is not None:
+        shard_files = [path for path in shard_files if path] # Shards sem tickers não geram arquivo
+
+    # O ID da conexão que você criou na UI do Airflow
+    conn_id = 'sql_server_fundamentus_conn' # Certifique-se que este ID existe na sua UI do Airflow
+    # Com 'run_procedure_in_load_transaction', carga e procedure rodam na mesma transação
+    # (a tarefa execute_sql_procedure da DAG então não faz nada).
+    procedure_name = 'carga_fundamentus_historico'
+
+    # Na junção dos shards as páginas já foram arquivadas pelas tarefas de coleta
+    archive = HtmlArchive() if offline_run_id or (HTML_ARCHIVE_ENABLED and shard_files is None) else None
+    builder = None
+    all_tickers = None
+    pipeline = None
+    checkpoint = None
 
-    logging.info("\nColeta de dados concluída. Criando DataFrame...")
-    df = pd.DataFrame(all_companies_data)
-    
-    # --- Transformação ---
-
-    # 1) Alterar os nomes das colunas
-    original_columns = df.columns.tolist()
-    df.columns = [clean_column_name(col) for col in df.columns]
-    logging.info(f"Nomes das colunas alterados. Exemplo original: {original_columns[:3]} -> Limpos: {df.columns.tolist()[:3]}")
-
-    # --- NOVO PASSO: Conversão de colunas de data para formato 'YYYY-MM-DD' ---
-    for col_name in DATE_COLUMNS_TO_CONVERT:
-        if col_name in df.columns:
-            # Explicitamente substitui '-' (e outros valores que podem indicar nulo) por pd.NA
-            # Isso garante que esses valores sejam tratados como ausentes antes da conversão de data.
-            # Você pode adicionar outros valores aqui se necessário, como 'N/A', '', etc.
-            df[col_name] = df[col_name].replace(['-', ''], pd.NA) # Adicionado '' para strings vazias
-            
-            # Converte para objetos datetime. Datas inválidas se tornam NaT (Not a Time).
-            # O formato de entrada é DD/MM/YYYY.
-            df[col_name] = pd.to_datetime(df[col_name], format='%d/%m/%Y', errors='coerce')
-            
-            # Formata para 'YYYY-MM-DD' para compatibilidade com o tipo DATE do SQL Server.
-            # Valores NaT (datas inválidas) são convertidos para None.
-            df[col_name] = df[col_name].apply(lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else None)
-            logging.info(f"  Coluna '{col_name}' convertida para formato 'YYYY-MM-DD' ou None.")
+    try:
+        if offline_run_id:
+            if offline_run_id == 'latest':
+                offline_run_id = archive.latest_run_id()
+            archived_ts = archive.run_execution_ts(offline_run_id) if offline_run_id else None
+            if not archived_ts:
+                raise ValueError(f"Execução '{offline_run_id}' não encontrada no arquivo de HTML.")
+            # Mantém a data/hora original da execução reprocessada
+            timestamp_brt = pendulum.parse(archived_ts).in_timezone('America/Sao_Paulo')
+            logging.info(f"Modo offline: reprocessando a execução '{offline_run_id}' ({timestamp_brt.isoformat()}).")
+        elif shard_files is not None:
+            logging.info(f"Juntando {len(shard_files)} shards coletados pelas tarefas mapeadas...")
         else:
-            logging.warning(f"  Coluna de data '{col_name}' não encontrada no DataFrame para conversão.")
-
-    # Remover colunas específicas, agora usando os nomes limpos
-    if 'papel' in df.columns:
-        df.drop(columns=['papel'], inplace=True)
-        logging.info("  Coluna 'papel' removida.")
-    
-    original_cols_count = df.shape[1]
-    df.dropna(axis=1, how='all', inplace=True) # Remove colunas totalmente vazias
-    if df.shape[1] < original_cols_count:
-        logging.info(f"  {original_cols_count - df.shape[1]} colunas totalmente vazias removidas.\n")
-
-    # Colunas numéricas que não são afetadas pela limpeza de nome, mas podem ser removidas se necessário
-    cols_to_drop_by_name = ['1', '2', '3', '4'] 
-    existing_cols_to_drop = [col for col in cols_to_drop_by_name if col in df.columns]
-    if existing_cols_to_drop:
-        df.drop(columns=existing_cols_to_drop, inplace=True)
-        logging.info(f"  Colunas {existing_cols_to_drop} removidas.\n")
-
-    # 2) Dividir 'data_execucao' em 'data_execucao' (apenas data) e 'hora_execucao'
-    if 'data_execucao' in df.columns:
-        df['data_execucao'] = pd.to_datetime(df['data_execucao']) # Garante que é datetime para manipulação
-        df['hora_execucao'] = df['data_execucao'].dt.strftime('%H:%M:%S') # Extrai apenas a hora
-        df['data_execucao'] = df['data_execucao'].dt.strftime('%Y-%m-%d') # Formata 'data_execucao' como 'YYYY-MM-DD'
-        logging.info("  Coluna 'data_execucao' dividida em 'data_execucao' (somente data) e 'hora_execucao'.\n")
-    else:
-        logging.warning("  Coluna 'data_execucao' não encontrada para divisão de data/hora.\n")
-
-    # Reordenar colunas com os novos nomes limpos e a nova coluna 'hora_execucao'
-    current_columns = df.columns.tolist()
-    year_columns = []
-    other_columns = []
-    
-    for col in current_columns:
-        # Regex para anos: Apenas 4 dígitos numéricos (como '2020')
-        if re.fullmatch(r'\d{4}', col) and 1900 <= int(col) <= 2100: 
-            year_columns.append(col)
+            run_id = timestamp_brt.strftime('%Y%m%d_%H%M%S')
+            if archive is not None:
+                archive.register_run(run_id, timestamp_brt.isoformat())
+            if CHECKPOINT_ENABLED:
+                # Mesmo run_id em todas as tentativas da tarefa: uma nova tentativa retoma a coleta
+                checkpoint = ScrapeCheckpoint(run_id)
+
+            # --- Extração ---
+            # No modo 'fast' a lista de tickers vem junto com a tabela completa do resultado.php
+            all_tickers = get_all_tickers(archive, run_id) if not fast_mode else None
+            if not fast_mode and not all_tickers:
+                logging.error("Nenhum ticker encontrado. Encerrando o processo ETL.")
+                return pd.DataFrame() 
+
+        # Destino de cada empresa coletada: as colunas pré-alocadas do ColumnarBuilder (cada dicionário é
+        # descartado assim que é gravado) ou o pipeline em micro-lotes, que transforma e carrega os lotes
+        # em outra thread enquanto a coleta continua.
+        # O timestamp_brt é um objeto pendulum; a data/hora da execução vai sem tzinfo.
+        if streaming:
+            pipeline = fundamentus_streaming.MicroBatchPipeline(
+                functools.partial(
+                    stream_load_companies,
+                    execution_ts=timestamp_brt.replace(tzinfo=None),
+                    table_name=LOAD_TABLE,
+                    conn_id=conn_id,
+                    load_mode=params.get('load_mode') or LOAD_MODE,
+                    procedure_name=procedure_name if params.get('run_procedure_in_load_transaction') else None,
+                ),
+                batch_size=STREAM_BATCH_SIZE,
+                max_pending_batches=STREAM_MAX_PENDING_BATCHES,
+            ).start()
+            on_company = pipeline.add
+            logging.info(f"Carga em micro-lotes de {STREAM_BATCH_SIZE} empresas ativada.")
         else:
-            other_columns.append(col)
-            
-    year_columns.sort(key=int) 
-    
-    final_column_order = []
-    # Posicionar 'ticker', 'data_execucao' e 'hora_execucao' no início
-    if 'ticker' in other_columns:
-        final_column_order.append('ticker')
-        other_columns.remove('ticker')
-    
-    if 'data_execucao' in other_columns:
-        final_column_order.append('data_execucao')
-        other_columns.remove('data_execucao')
-
-    if 'hora_execucao' in other_columns:
-        final_column_order.append('hora_execucao')
-        other_columns.remove('hora_execucao')
-    
-    final_column_order.extend(other_columns) 
-    final_column_order.extend(year_columns)  
-    
-    df = df[final_column_order] 
+            builder = fundamentus_transform.ColumnarBuilder(
+                len(all_tickers) if all_tickers else fundamentus_transform.DEFAULT_BUILDER_CAPACITY
+            )
+            on_company = builder.add
+
+        try:
+            if offline_run_id:
+                with metrics.stage("scrape"):
+                    load_companies_from_archive(archive, offline_run_id, on_company)
+            elif shard_files is not None:
+                with metrics.stage("merge_shards"):
+                    for company_data in fundamentus_shards.read_shards(shard_files):
+                        on_company(company_data)
+            elif fast_mode:
+                with metrics.stage("scrape"):
+                    scrape_fast_snapshot(archive, run_id, on_company, checkpoint)
+            else:
+                with metrics.stage("scrape"):
+                    scrape_with_retries(all_tickers, archive, run_id, on_company, checkpoint)
+        except BaseException:
+            if pipeline is not None:
+                pipeline.abort() # Desfaz os lotes já gravados: nada é commitado
+            raise
+    finally:
+        if archive is not None:
+            archive.log_stats()
+            archive.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    collected = pipeline.records if pipeline is not None else len(builder)
+    metrics.increment("companies", collected)
+    if not collected:
+        if pipeline is not None:
+            pipeline.close()
+        logging.error("Nenhuma empresa coletada. Encerrando o processo ETL.")
+        return pd.DataFrame()
+
+    if pipeline is not None:
+        # Espera o último micro-lote; a carga (e o commit) termina logo depois da coleta
+        logging.info("\nColeta de dados concluída. Aguardando o último micro-lote da carga...")
+        try:
+            df, derived, indicator_state = pipeline.close()
+        except Exception as e:
+            logging.error(f"Falha fatal ao carregar dados para o SQL Server: {e}")
+            raise # Re-lança a exceção para o Airflow marcar a tarefa como falha
+    else:
+        logging.info("\nColeta de dados concluída. Criando DataFrame...")
+
+        # --- Transformação ---
+        # Os valores já estão nas colunas do ColumnarBuilder; aqui só são aplicados os tipos declarados em
+        # fundamentus_schema às colunas de texto e datas e o DataFrame é montado sem cópia dos buffers.
+        with metrics.stage("transform"):
+            df = builder.to_frame(timestamp_brt.replace(tzinfo=None))
+        del builder # Os buffers agora pertencem ao DataFrame
     
     logging.info("\nDataFrame final após transformações. Primeiras 5 linhas:")
     logging.info(f"\n{df.head().to_string()}") 
@@ -516,59 +1262,92 @@ def etl_fundamentus_data(**kwargs): # <--- ESSENCIAL para Airflow
     logging.info("\nInformações do DataFrame final:")
     df.info()
 
-    # 3) Salvar CSV com nome dinâmico
+    # 3) Salvar o snapshot colunar (Parquet particionado por data_execucao)
+    # Gravado aqui em arquivos temporários e publicado só depois do commit de todos os destinos: o serviço
+    # de leitura nunca serve uma execução que não chegou ao banco.
+    staged_snapshot = []
     try:
-        csv_filename = f"carga_fundamentus_{timestamp_brt.strftime('%Y%m%d_%H%M%S')}.csv"
-        csv_filepath = f"data/{csv_filename}" 
-        df.to_csv(csv_filepath, index=False, encoding="utf-8-sig")
-        logging.info(f"\nDados salvos em '{csv_filepath}'")
+        with metrics.stage("snapshot_parquet"):
+            staged_snapshot = fundamentus_snapshots.stage_snapshot(df)
     except Exception as e:
-        logging.error(f"Erro ao salvar o arquivo CSV: {e}")
+        logging.error(f"Erro ao salvar o snapshot Parquet: {e}")
+
+    # Histórico local (catálogo de snapshots + índice por ticker)
+    if HISTORY_STORE_ENABLED:
+        try:
+            with metrics.stage("history"):
+                history = HistoryStore()
+                try:
+                    history.append_snapshot(df)
+                finally:
+                    history.close()
+        except Exception as e:
+            logging.error(f"Erro ao gravar o snapshot no histórico local: {e}")
+
+    # CSV com nome dinâmico (legado, opcional)
+    if WRITE_CSV_SNAPSHOT:
+        try:
+            csv_filename = f"carga_fundamentus_{timestamp_brt.strftime('%Y%m%d_%H%M%S')}.csv"
+            csv_filepath = f"data/{csv_filename}" 
+            with metrics.stage("csv"):
+                df.to_csv(csv_filepath, index=False, encoding="utf-8-sig")
+            logging.info(f"\nDados salvos em '{csv_filepath}'")
+        except Exception as e:
+            logging.error(f"Erro ao salvar o arquivo CSV: {e}")
 
     # --- Carga (Load) ---
+    # Cada destino grava em uma transação própria, na ordem de sink_names; com micro-lotes o SQL Server
+    # já foi carregado junto com a coleta e as tabelas derivadas já estão calculadas.
+    if pipeline is None:
+        derived, indicator_state = compute_derived_tables(df)
+    else:
+        logging.info("Carga de dados para o SQL Server concluída junto com a coleta (micro-lotes).")
+    for sink_name in sink_names:
+        if pipeline is not None and sink_name == "sqlserver":
+            continue
+        try:
+            with create_sink(
+                sink_name,
+                conn_id,
+                load_mode=params.get('load_mode') or LOAD_MODE,
+                procedure_name=procedure_name if params.get('run_procedure_in_load_transaction') else None,
+            ) as sink:
+                if sink_name == "sqlserver":
+                    sink.write(df, derived) # A duração da carga já entra no estágio 'load'
+                else:
+                    with metrics.stage(f"sink_{sink_name}"):
+                        sink.write(df, derived)
+            logging.info(f"Carga de dados no destino '{sink_name}' concluída com sucesso!")
+
+        except Exception as e:
+            logging.error(f"Falha fatal ao carregar dados no destino '{sink_name}': {e}")
+            fundamentus_snapshots.discard_snapshot(staged_snapshot)
+            raise # Re-lança a exceção para o Airflow marcar a tarefa como falha
+
+    # Só depois do commit de todos os destinos
+    if indicator_state is not None:
+        indicator_state.save()
     try:
-        # O ID da conexão que você criou na UI do Airflow
-        conn_id = 'sql_server_fundamentus_conn' # Certifique-se que este ID existe na sua UI do Airflow
-        conn = BaseHook.get_connection(conn_id)
-
-        sql_server_host = conn.host
-        sql_server_db = conn.schema # No Airflow, o campo 'Schema' é usado para o nome do banco de dados
-        sql_server_login = conn.login
-        sql_server_password = conn.password
-
-        # Determinar se deve usar Trusted_Connection ou Autenticação SQL Server
-        # Se login e senha forem fornecidos na conexão do Airflow, usa SQL Server Auth.
-        # Caso contrário, tenta Trusted_Connection (Autenticação Windows).
-        # ATENÇÃO: Autenticação Windows (Trusted_Connection) é mais complexa em Docker.
-        # Recomenda-se usar autenticação SQL Server (usuário/senha) para Docker.
-        use_trusted_connection = not (sql_server_login and sql_server_password)
-
-        # --- Chamar a função save_to_sql_sqlserver_pyodbc com os parâmetros obtidos ---
-        save_to_sql_sqlserver_pyodbc(
-            df,
-            table_name=tabela_sql,
-            server=sql_server_host,
-            db_name=sql_server_db,
-            trusted_connection=use_trusted_connection,
-            username=sql_server_login,
-            password=sql_server_password
-        )
-        logging.info("Carga de dados para o SQL Server concluída com sucesso!")
-
+        fundamentus_snapshots.publish_snapshot(staged_snapshot)
     except Exception as e:
-        logging.error(f"Falha fatal ao carregar dados para o SQL Server: {e}")
-        raise # Re-lança a exceção para o Airflow marcar a tarefa como falha
+        logging.error(f"Erro ao publicar o snapshot Parquet: {e}")
 
     end_time = time.time() 
     total_time = end_time - start_time 
     logging.info(f"\nProcesso ETL finalizado em {total_time:.2f} segundos. ✅") 
 
+    if shard_files:
+        fundamentus_shards.remove_shards(shard_files) # Mantidos até aqui para uma nova tentativa da tarefa
+    if checkpoint is not None:
+        checkpoint.remove() # Execução concluída: a próxima tentativa não deve reaproveitar a coleta
+
     return df 
 
 # --- Bloco de execução principal (para testes locais, fora do Airflow) ---
 # Este bloco NÃO será executado quando o script for carregado como uma DAG pelo Airflow.
 # Ele é útil apenas para testar a função etl_fundamentus_data isoladamente.
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     logging.warning("Executando o script diretamente. Isso não simula o ambiente Airflow completo.")
     # Para testar localmente, você pode chamar a função sem argumentos.
     # A lógica de fallback do timestamp_brt será ativada.
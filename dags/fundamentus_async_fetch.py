@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+import aiohttp
+
+# --- Configuração padrão do motor assíncrono de coleta ---
+# Limite global de requisições por segundo (token bucket) compartilhado por todas as tarefas,
+# substituindo o time.sleep(random.uniform(0.1, 0.5)) feito por cada thread.
+REQUESTS_PER_SECOND = 15.0
+BURST_SIZE = 10
+
+# Concorrência adaptativa (AIMD): começa em INITIAL, sobe de 1 em 1 enquanto o servidor responde bem
+# e cai pela metade quando aparecem 429/5xx ou quando a latência sobe demais.
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 2
+MAX_CONCURRENCY = 32
+LATENCY_TOLERANCE = 2.0      # Latência média acima de 2x a linha de base dispara redução...
+LATENCY_FLOOR_SECONDS = 0.25  # ...desde que também esteja pelo menos 250 ms acima dela (evita ruído)
+BACKOFF_COOLDOWN_SECONDS = 2.0  # Intervalo mínimo entre duas reduções seguidas
+
+# Pool de conexões keep-alive
+MAX_CONNECTIONS = 32
+KEEPALIVE_TIMEOUT_SECONDS = 30
+REQUEST_TIMEOUT_SECONDS = 10
+MAX_RETRIES = 2
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class FetchResult(NamedTuple):
+    """Resultado de uma requisição feita pelo motor assíncrono."""
+    key: str
+    url: str
+    status: Optional[int]
+    text: Optional[str]
+    headers: dict
+    elapsed: float
+    error: Optional[str] = None
+    size: int = 0 # Bytes do corpo recebido, antes da decodificação
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status is not None and 200 <= self.status < 400
+
+
+class TokenBucket:
+    """
+    Limitador global de taxa. Cada requisição consome um token; os tokens são repostos
+    continuamente a 'rate' por segundo até o limite 'capacity'.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limita o número de requisições simultâneas com ajuste AIMD (additive increase,
+    multiplicative decrease) a partir da latência observada e dos códigos de status.
+    """
+
+    def __init__(
+            self,
+            initial: int = INITIAL_CONCURRENCY,
+            minimum: int = MIN_CONCURRENCY,
+            maximum: int = MAX_CONCURRENCY,
+            latency_tolerance: float = LATENCY_TOLERANCE,
+            latency_floor: float = LATENCY_FLOOR_SECONDS,
+            cooldown: float = BACKOFF_COOLDOWN_SECONDS
+        ):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._successes_since_change = 0
+        self._latency_ewma = None
+        self._latency_baseline = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, latency: float, status: Optional[int]) -> None:
+        """Registra o resultado de uma requisição e ajusta o limite de concorrência."""
+        overloaded = status is None or status in RETRYABLE_STATUS
+
+        if not overloaded:
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            if self._latency_baseline is None or self._latency_ewma < self._latency_baseline:
+                self._latency_baseline = self._latency_ewma
+            overloaded = (
+                self._latency_ewma > self._latency_baseline * self.latency_tolerance
+                and self._latency_ewma - self._latency_baseline > self.latency_floor
+            )
+
+        if overloaded:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown and self.limit > self.minimum:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._last_decrease = now
+                self._successes_since_change = 0
+                # Reinicia a média para medir a latência já com a nova concorrência
+                self._latency_ewma = None
+                logging.info(f"  Concorrência reduzida para {self.limit} (status={status}, latência={latency:.2f}s).")
+            return
+
+        self._successes_since_change += 1
+        if self._successes_since_change >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes_since_change = 0
+
+
+def create_session(headers: dict, max_connections: int = MAX_CONNECTIONS) -> aiohttp.ClientSession:
+    """
+    Cria uma sessão aiohttp com pool de conexões keep-alive e transferência comprimida.
+    Deve ser chamada de dentro de um event loop em execução.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=max_connections,
+        limit_per_host=max_connections,
+        keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+        ttl_dns_cache=300,
+    )
+    session_headers = {"Accept-Encoding": "gzip, deflate", **headers}
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=session_headers,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+    )
+
+
+async def fetch_page(
+        session: aiohttp.ClientSession,
+        key: str,
+        url: str,
+        bucket: TokenBucket,
+        limiter: AdaptiveConcurrencyLimiter,
+        max_retries: int = MAX_RETRIES,
+        extra_headers: Optional[dict] = None
+    ) -> FetchResult:
+    """
+    Baixa uma página respeitando o limite global de taxa e a concorrência adaptativa.
+    Respostas 429/5xx e erros de conexão são repetidos com backoff exponencial.
+    'extra_headers' permite requisições condicionais (If-None-Match / If-Modified-Since);
+    uma resposta 304 volta com status 304 e texto vazio.
+    """
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        await limiter.acquire()
+        start = time.monotonic()
+        status = None
+        retry_after = None
+        try:
+            async with session.get(url, headers=extra_headers) as response:
+                status = response.status
+                body = await response.read()
+                elapsed = time.monotonic() - start
+                # Mesmo comportamento do requests: usa o charset do cabeçalho ou ISO-8859-1 para text/html
+                try:
+                    text = body.decode(response.charset or "ISO-8859-1", errors="replace")
+                except LookupError: # Charset desconhecido no cabeçalho
+                    text = body.decode("ISO-8859-1", errors="replace")
+                headers = dict(response.headers)
+                retry_after = response.headers.get("Retry-After")
+            limiter.record(elapsed, status)
+            result = FetchResult(key, url, status, text, headers, elapsed, size=len(body))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            elapsed = time.monotonic() - start
+            limiter.record(elapsed, None)
+            result = FetchResult(key, url, None, None, {}, elapsed, error=repr(e))
+        finally:
+            await limiter.release()
+
+        retryable = result.error is not None or result.status in RETRYABLE_STATUS
+        if not retryable or attempt >= max_retries:
+            if result.error is None and result.status is not None and result.status >= 400:
+                result = result._replace(error=f"HTTP {result.status}")
+            return result
+
+        attempt += 1
+        delay = (2 ** attempt) * 0.5 + random.uniform(0, 0.5)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        await asyncio.sleep(delay)
+
+
+async def fetch_all(
+        requests_to_make: Iterable[tuple],
+        headers: dict,
+        on_result: Optional[Callable[[FetchResult], Awaitable[None]]] = None,
+        rate: float = None,
+        burst: int = None,
+        initial_concurrency: int = None
+    ) -> list:
+    """
+    Baixa todas as URLs de 'requests_to_make' com uma única sessão compartilhada. Cada item é
+    (chave, url) ou (chave, url, cabeçalhos_extras).
+    Se 'on_result' for informado, ele é aguardado a cada página concluída e nada é acumulado;
+    caso contrário, retorna a lista de FetchResult.
+    As requisições são consumidas sob demanda por um número fixo de workers: se 'on_result'
+    demorar (ex: fila de parsing cheia), a coleta desacelera junto (backpressure).
+    Sem 'rate', 'burst' e 'initial_concurrency', valem as constantes do módulo no momento da chamada.
+    """
+    bucket = TokenBucket(rate or REQUESTS_PER_SECOND, burst or BURST_SIZE)
+    limiter = AdaptiveConcurrencyLimiter(initial=initial_concurrency or INITIAL_CONCURRENCY)
+    results = []
+    pending = iter(requests_to_make)
+
+    async with create_session(headers) as session:
+        async def worker():
+            # O iterador é compartilhado; no event loop não há concorrência real no next()
+            for key, url, *extra in pending:
+                extra_headers = extra[0] if extra else None
+                result = await fetch_page(session, key, url, bucket, limiter, extra_headers=extra_headers)
+                if on_result is not None:
+                    await on_result(result)
+                else:
+                    results.append(result)
+
+        await asyncio.gather(*(worker() for _ in range(limiter.maximum)))
+
+    logging.info(f"  Coleta assíncrona finalizada com concorrência final de {limiter.limit}.")
+    return results
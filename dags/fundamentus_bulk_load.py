@@ -0,0 +1,294 @@
+import logging
+import time
+
+import pandas as pd
+
+# --- Estratégias de carga em massa ---
+# 'fast_executemany': INSERT parametrizado com arrays de parâmetros (pyodbc.fast_executemany)
+#                     e tipos explícitos via setinputsizes, enviado em lotes de 'batch_size' linhas
+# 'tvp':              cada lote vai em um único parâmetro do tipo tabela (table-valued parameter);
+#                     exige um tipo de tabela no SQL Server com as mesmas colunas, na mesma ordem:
+#                     CREATE TYPE dbo.carga_fundamentus_tvp AS TABLE (...)
+# 'executemany':      executemany simples em lotes (funciona com qualquer driver DB-API, ex: sqlite3)
+LOAD_STRATEGIES = ("fast_executemany", "tvp", "executemany")
+DEFAULT_BATCH_SIZE = 5000
+
+
+def dataframe_to_rows(df: pd.DataFrame) -> list:
+    """
+    Converte o DataFrame em lista de tuplas trocando pd.NA / NaN / NaT por None (NULL no SQL)
+    coluna a coluna, de forma vetorizada, sem chamar pd.isna célula por célula.
+    """
+    frame = df.astype(object).where(df.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+def _input_sizes(df: pd.DataFrame) -> list:
+    """
+    Tipos explícitos dos parâmetros (pyodbc.setinputsizes) inferidos de cada coluna.
+    Sem eles, o fast_executemany adivinha o tipo pela primeira linha e pode truncar textos.
+    """
+    import pyodbc # Import local: o restante do módulo funciona sem o driver ODBC
+
+    sizes = []
+    for col in df.columns:
+        kind = pd.api.types.infer_dtype(df[col], skipna=True)
+        if kind == "categorical": # tipo/setor/subsetor: tamanho pelo maior valor das categorias
+            categories = df[col].cat.categories
+            kind = pd.api.types.infer_dtype(categories) if len(categories) else "empty"
+            if kind in ("string", "unicode"):
+                sizes.append((pyodbc.SQL_WVARCHAR, int(categories.str.len().max()), 0))
+                continue
+        if kind in ("floating", "integer", "mixed-integer-float", "decimal"):
+            sizes.append((pyodbc.SQL_DOUBLE, 0, 0))
+        elif kind in ("string", "unicode"):
+            max_len = int(df[col].dropna().str.len().max() or 1)
+            sizes.append((pyodbc.SQL_WVARCHAR, max_len, 0))
+        elif kind in ("datetime", "datetime64", "date"):
+            sizes.append((pyodbc.SQL_TYPE_TIMESTAMP, 0, 0))
+        else:
+            sizes.append(None) # Coluna vazia ou mista: o driver decide
+    return sizes
+
+
+def _batches(rows: list, batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def bulk_insert(
+        cursor,
+        table_name: str,
+        df: pd.DataFrame,
+        strategy: str = "fast_executemany",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        tvp_type_name: str = None
+    ) -> dict:
+    """
+    Insere o DataFrame na tabela usando o cursor DB-API informado e a estratégia escolhida.
+    Não faz commit: quem chama controla a transação.
+    Retorna {'rows', 'batches', 'seconds', 'rows_per_sec'}.
+    """
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"Estratégia de carga desconhecida: '{strategy}'. Use uma de {LOAD_STRATEGIES}.")
+
+    # IMPORTANTE: Delimitar os nomes das colunas com colchetes [] para SQL Server
+    # Isso resolve o erro de sintaxe para nomes como '30_dias'
+    quoted_columns = ', '.join(f"[{col}]" for col in df.columns)
+
+    start = time.perf_counter()
+    rows = dataframe_to_rows(df)
+    batches = 0
+
+    if strategy == "tvp":
+        if not tvp_type_name:
+            raise ValueError("A estratégia 'tvp' exige 'tvp_type_name' (ex: 'dbo.carga_fundamentus_tvp').")
+        schema, _, type_name = tvp_type_name.rpartition('.')
+        insert_sql = f"INSERT INTO {table_name} ({quoted_columns}) SELECT * FROM ?"
+        for batch in _batches(rows, batch_size):
+            # pyodbc: os dois primeiros elementos do parâmetro TVP são o nome do tipo e o schema
+            cursor.execute(insert_sql, ([type_name, schema or 'dbo'] + batch,))
+            batches += 1
+    else:
+        placeholders = ', '.join('?' for _ in df.columns) # '?' é o placeholder para pyodbc
+        insert_sql = f"INSERT INTO {table_name} ({quoted_columns}) VALUES ({placeholders})"
+        if strategy == "fast_executemany":
+            cursor.fast_executemany = True
+            cursor.setinputsizes(_input_sizes(df))
+        for batch in _batches(rows, batch_size):
+            cursor.executemany(insert_sql, batch)
+            batches += 1
+
+    seconds = time.perf_counter() - start
+    rows_per_sec = len(rows) / seconds if seconds > 0 else float(len(rows))
+    logging.info(
+        f"  {len(rows)} registros inseridos em '{table_name}' ({strategy}, {batches} lotes de até {batch_size}) "
+        f"em {seconds:.2f}s - {rows_per_sec:,.0f} registros/s."
+    )
+    return {"rows": len(rows), "batches": batches, "seconds": seconds, "rows_per_sec": rows_per_sec}
+
+
+# --- Carga incremental (delta) ---
+# Em vez de DELETE + INSERT de tudo, compara um hash por ticker com o da última carga
+# e grava apenas as linhas novas ou alteradas, via tabela de staging e upsert set-based.
+# A data/hora de execução não entra no hash e é atualizada em todas as linhas ao final (stamp_execution),
+# para que MAX(data_execucao) na procedure e nas views continue sendo o snapshot completo.
+# O hash cobre a cotação e os múltiplos que dependem dela, que mudam a cada pregão: em execuções diárias
+# quase todas as linhas contam como alteradas e o delta economiza pouco. O ganho aparece em execuções
+# repetidas no mesmo dia, fora do pregão ou depois de uma falha.
+# O hash e o UPDATE usam todas as colunas da tabela final, inclusive as que vieram vazias nesta execução
+# (o ColumnarBuilder remove colunas totalmente vazias, por micro-lote): assim o hash não depende de quais
+# colunas sobraram e uma coluna que esvaziou também é atualizada (para NULL).
+# A carga completa reescreve a tabela de hashes na mesma transação, para que uma carga incremental
+# posterior compare com o conteúdo atual da tabela.
+HASH_EXCLUDED_COLUMNS = ("data_execucao", "hora_execucao") # Mudam em toda execução, não entram no hash
+
+
+def table_columns(cursor, table_name: str) -> list:
+    """Colunas da tabela, na ordem da tabela (consulta sem linhas: funciona no SQL Server e no SQLite)."""
+    cursor.execute(f"SELECT * FROM {table_name} WHERE 1 = 0")
+    return [column[0] for column in cursor.description]
+
+
+def align_to_table(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """
+    DataFrame com todas as colunas da tabela, na ordem da tabela: as ausentes (removidas por virem
+    vazias) entram como nulas. Colunas que a tabela não tem ficam no final e falham no INSERT, como na carga completa.
+    """
+    extra = [col for col in df.columns if col not in columns]
+    return df.reindex(columns=list(columns) + extra)
+
+
+def compute_row_hashes(df: pd.DataFrame, key: str = "ticker") -> pd.Series:
+    """
+    Hash de 64 bits (hex) de cada linha, indexado pela chave, ignorando as colunas de data/hora
+    de execução. As colunas são ordenadas pelo nome para que o hash não dependa da ordem, e todos
+    os nulos (pd.NA, NaN, None) contam como o mesmo valor. Passar o DataFrame já alinhado à tabela
+    (align_to_table), para que colunas removidas por virem vazias não mudem o hash.
+    """
+    value_columns = sorted(col for col in df.columns if col not in HASH_EXCLUDED_COLUMNS)
+    values = df[value_columns]
+    hashes = pd.util.hash_pandas_object(values.astype(object).where(values.notna(), None), index=False)
+    return pd.Series(hashes.map('{:016x}'.format).values, index=df[key].values)
+
+
+def _create_hash_table(cursor, hash_table_name: str, key: str) -> None:
+    cursor.execute(
+        f"IF OBJECT_ID(N'{hash_table_name}', N'U') IS NULL "
+        f"CREATE TABLE {hash_table_name} ([{key}] NVARCHAR(32) NOT NULL PRIMARY KEY, [row_hash] CHAR(16) NOT NULL)"
+    )
+
+
+def read_row_hashes(cursor, hash_table_name: str, key: str = "ticker") -> dict:
+    """Hashes da última carga ({ticker: hash}); cria a tabela de hashes se ainda não existir."""
+    _create_hash_table(cursor, hash_table_name, key)
+    return dict(cursor.execute(f"SELECT [{key}], [row_hash] FROM {hash_table_name}").fetchall())
+
+
+def write_row_hashes(
+        cursor,
+        table_name: str,
+        df: pd.DataFrame,
+        hash_table_name: str = None,
+        key: str = "ticker",
+        clear: bool = True,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+    """
+    Carga completa: grava os hashes das linhas do DataFrame (alinhado às colunas de 'table_name') na
+    tabela de hashes, criada se não existir. Com 'clear', apaga antes os hashes da carga anterior
+    (na carga em micro-lotes, só no primeiro lote). Não faz commit: roda na transação da carga.
+    """
+    hash_table_name = hash_table_name or f"{table_name}_hash"
+    row_hashes = compute_row_hashes(align_to_table(df, table_columns(cursor, table_name)), key)
+    _create_hash_table(cursor, hash_table_name, key)
+    if clear:
+        cursor.execute(f"DELETE FROM {hash_table_name}")
+    rows = list(zip(row_hashes.index, row_hashes.values))
+    for batch in _batches(rows, batch_size):
+        cursor.executemany(f"INSERT INTO {hash_table_name} ([{key}], [row_hash]) VALUES (?, ?)", batch)
+
+
+def stamp_execution(cursor, table_name: str, df: pd.DataFrame) -> None:
+    """
+    Grava a data/hora de execução do DataFrame (a mesma em todas as linhas) em todas as linhas da tabela,
+    com um único UPDATE set-based: as linhas inalteradas pelo delta também passam a ser desta execução.
+    Chamar depois de remover os tickers ausentes, quando a tabela só tem os tickers desta execução.
+    """
+    columns = [col for col in HASH_EXCLUDED_COLUMNS if col in df.columns]
+    if not columns or df.empty:
+        return
+    values = dataframe_to_rows(df[columns].head(1))[0]
+    set_clause = ', '.join(f"[{col}] = ?" for col in columns)
+    cursor.execute(f"UPDATE {table_name} SET {set_clause}", values)
+
+
+def delete_keys(cursor, table_name: str, hash_table_name: str, keys: list, key: str = "ticker") -> None:
+    """Remove os tickers informados da tabela final e da tabela de hashes."""
+    if keys:
+        cursor.executemany(f"DELETE FROM {table_name} WHERE [{key}] = ?", [(value,) for value in keys])
+        cursor.executemany(f"DELETE FROM {hash_table_name} WHERE [{key}] = ?", [(value,) for value in keys])
+
+
+def incremental_upsert(
+        cursor,
+        table_name: str,
+        df: pd.DataFrame,
+        key: str = "ticker",
+        hash_table_name: str = None,
+        stage_table_name: str = None,
+        strategy: str = "fast_executemany",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        previous_hashes: dict = None,
+        remove_missing: bool = True
+    ) -> dict:
+    """
+    Carga incremental no SQL Server (T-SQL). Não faz commit: quem chama controla a transação.
+    1. Lê os hashes da última carga em 'hash_table_name' (criada se não existir), a menos que
+       'previous_hashes' já tenha sido informado (ex: carga em micro-lotes, lido uma única vez);
+    2. alinha o DataFrame a todas as colunas da tabela final (as ausentes entram como nulas) e grava só
+       as linhas novas/alteradas em 'stage_table_name' (recriada com essas colunas e o hash);
+    3. faz UPDATE/INSERT set-based da staging para a tabela final e atualiza os hashes;
+    4. com 'remove_missing', remove da tabela final os tickers que não vieram nesta execução e grava a
+       data/hora desta execução em todas as linhas (stamp_execution). Sem 'remove_missing' (ex: um
+       micro-lote), quem chama faz as duas coisas depois do último lote.
+    A staging tem a coluna extra do hash, então nunca usa a estratégia 'tvp' (o tipo de tabela é o da
+    tabela final): nesse caso, vai com 'fast_executemany'.
+    Retorna {'inserted', 'updated', 'unchanged', 'removed'}.
+    """
+    hash_table_name = hash_table_name or f"{table_name}_hash"
+    stage_table_name = stage_table_name or f"{table_name}_stage"
+    stage_strategy = strategy if strategy != "tvp" else "fast_executemany"
+
+    if previous_hashes is None:
+        previous_hashes = read_row_hashes(cursor, hash_table_name, key)
+    df = align_to_table(df, table_columns(cursor, table_name))
+
+    row_hashes = compute_row_hashes(df, key)
+    changed_mask = [previous_hashes.get(ticker) != row_hash for ticker, row_hash in row_hashes.items()]
+    delta = df.loc[changed_mask].copy()
+    delta["row_hash"] = row_hashes.values[changed_mask]
+    removed = sorted(set(previous_hashes) - set(row_hashes.index)) if remove_missing else []
+
+    summary = {"inserted": 0, "updated": 0, "unchanged": len(df) - len(delta), "removed": len(removed)}
+
+    if not delta.empty:
+        value_columns = [col for col in df.columns if col != key]
+        quoted_columns = ', '.join(f"[{col}]" for col in df.columns)
+
+        # Staging recriada a cada execução com as colunas da tabela final
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table_name}")
+        cursor.execute(f"SELECT TOP 0 {quoted_columns} INTO {stage_table_name} FROM {table_name}")
+        cursor.execute(f"ALTER TABLE {stage_table_name} ADD [row_hash] CHAR(16) NULL")
+        bulk_insert(cursor, stage_table_name, delta, stage_strategy, batch_size)
+
+        set_clause = ', '.join(f"t.[{col}] = s.[{col}]" for col in value_columns)
+        cursor.execute(
+            f"UPDATE t SET {set_clause} FROM {table_name} AS t "
+            f"INNER JOIN {stage_table_name} AS s ON t.[{key}] = s.[{key}]"
+        )
+        summary["updated"] = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {table_name} ({quoted_columns}) SELECT {quoted_columns} FROM {stage_table_name} AS s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} AS t WHERE t.[{key}] = s.[{key}])"
+        )
+        summary["inserted"] = cursor.rowcount
+
+        cursor.execute(
+            f"UPDATE h SET h.[row_hash] = s.[row_hash] FROM {hash_table_name} AS h "
+            f"INNER JOIN {stage_table_name} AS s ON h.[{key}] = s.[{key}]"
+        )
+        cursor.execute(
+            f"INSERT INTO {hash_table_name} ([{key}], [row_hash]) SELECT s.[{key}], s.[row_hash] FROM {stage_table_name} AS s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {hash_table_name} AS h WHERE h.[{key}] = s.[{key}])"
+        )
+
+    delete_keys(cursor, table_name, hash_table_name, removed, key)
+    if remove_missing:
+        stamp_execution(cursor, table_name, df)
+
+    logging.info(
+        f"  Carga incremental em '{table_name}': {summary['inserted']} inseridos, {summary['updated']} atualizados, "
+        f"{summary['unchanged']} inalterados, {summary['removed']} removidos."
+    )
+    return summary
@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+# --- Checkpoint da coleta ---
+# Cada empresa coletada com sucesso é gravada (e confirmada) no checkpoint da execução assim que fica
+# pronta. Se a tarefa falhar depois (ex: na carga), a nova tentativa do Airflow usa o mesmo
+# identificador (a data/hora da execução) e só coleta os tickers que ainda não estão no checkpoint.
+# O arquivo é apagado quando a execução termina com sucesso.
+CHECKPOINT_DIR = "data/checkpoints"
+
+
+class ScrapeCheckpoint:
+    """Empresas já coletadas de uma execução (ou de um shard), em um SQLite por checkpoint."""
+
+    def __init__(self, checkpoint_id: str, checkpoint_dir: str = CHECKPOINT_DIR):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, f"{checkpoint_id}.sqlite")
+        # A coleta assíncrona grava pela thread de entrega; as gravações são sempre de uma thread por vez
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL + synchronous=NORMAL: cada empresa é confirmada sem um fsync completo por commit
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS companies (
+                ticker TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                completed_at TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def companies(self):
+        """Gera as empresas já coletadas (os nulos voltam como pd.NA, como no cache do arquivo de HTML)."""
+        for (payload,) in self.conn.execute("SELECT payload FROM companies ORDER BY ticker"):
+            yield {key: (pd.NA if value is None else value) for key, value in json.loads(payload).items()}
+
+    def add(self, company_data: dict) -> None:
+        payload = json.dumps(
+            {key: (None if pd.isna(value) else value) for key, value in company_data.items()}, ensure_ascii=False
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO companies (ticker, payload, completed_at) VALUES (?, ?, datetime('now'))",
+            (company_data["Ticker"], payload),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def remove(self) -> None:
+        """Fecha e apaga o checkpoint (chamado quando a execução termina com sucesso)."""
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        logging.info(f"  Checkpoint '{self.path}' removido.")
@@ -1,12 +1,25 @@
+import importlib
+
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.utils.dates import days_ago
 import pendulum
 
-# Importa a função etl_fundamentus_data e execute_sql_procedure do seu script principal
-# Certifique-se que o caminho está correto para o seu ambiente Docker
-# Se Fundamentus_WebScraping_Tratamento_CargaSQL.py estiver na mesma pasta dags, basta o nome do arquivo.
-from Fundamentus_WebScraping_Tratamento_CargaSQL import etl_fundamentus_data, execute_sql_procedure
+# O scheduler importa este arquivo a cada ciclo de parse das DAGs: aqui só entram o Airflow e o pendulum.
+# O script principal (Fundamentus_WebScraping_Tratamento_CargaSQL.py, na mesma pasta dags) traz pandas,
+# BeautifulSoup, pyodbc, requests etc. e só é importado quando uma tarefa executa (ver etl_task).
+# O .airflowignore da pasta dags evita que o scheduler tente parsear os módulos auxiliares.
+ETL_MODULE = 'Fundamentus_WebScraping_Tratamento_CargaSQL'
+
+
+def etl_task(function_name: str):
+    """Callable de tarefa que importa o script principal só na execução e chama 'function_name' dele."""
+    def run(**kwargs):
+        return getattr(importlib.import_module(ETL_MODULE), function_name)(**kwargs)
+
+    run.__name__ = function_name
+    return run
+
 
 # Definição da DAG
 with DAG(
@@ -15,25 +28,63 @@ with DAG(
     schedule_interval=None, # Defina 'None' para DAGs que são acionadas manualmente ou '@daily', '@hourly' etc.
     catchup=False, # Não executa DAGs para datas passadas
     tags=['etl', 'fundamentus', 'sqlserver'],
+    # Informe o run_id de uma execução arquivada (ex: '20250918_211554' ou 'latest') para reprocessar
+    # a partir do arquivo de HTML bruto em data/html_archive, sem acessar o Fundamentus.
+    # 'load_mode': 'full' (DELETE + INSERT) ou 'incremental' (apenas linhas novas/alteradas por hash de ticker).
+    # 'run_procedure_in_load_transaction': True executa a procedure na mesma transação da carga (tarefa 1),
+    # e a tarefa 2 apenas registra que não há nada a fazer.
+    # 'streaming_load': True transforma e carrega as empresas em micro-lotes enquanto os shards são lidos
+    # (um único commit ao final).
+    # 'shard_count': em quantas tarefas mapeadas (distribuídas entre os workers do Celery) a coleta é dividida.
+    # 'run_mode': 'full' (detalhes.php de todos os tickers) ou 'fast' (tabela completa do resultado.php em uma
+    # requisição + detalhes.php só dos tickers novos ou com novo balanço; sem shards, para rodar ao longo do dia).
+    # 'sinks': destinos da carga, na ordem - 'sqlserver' e/ou 'mirror' (cópia analítica local em SQLite,
+    # em data/mirror). Só com ['mirror'] o ETL roda de ponta a ponta sem SQL Server (a tarefa 4 não faz nada).
+    # 'profile': True liga o modo de perfilamento nas tarefas de coleta e de carga (CPU e memória por estágio,
+    # amostra de parsing por ticker), com os arquivos em data/profiles. Também pode ser ligado por FUNDAMENTUS_PROFILE=1.
+    params={
+        'offline_run_id': '',
+        'load_mode': 'full',
+        'run_procedure_in_load_transaction': False,
+        'streaming_load': False,
+        'shard_count': 4, # Mesmo padrão de SHARD_COUNT no script principal
+        'run_mode': 'full', # Mesmo padrão de RUN_MODE no script principal
+        'sinks': ['sqlserver'], # Mesmo padrão de LOAD_SINKS no script principal
+        'profile': False, # Mesmo padrão de PROFILING_ENABLED no script principal
+    },
     doc_md="""
     ### DAG de ETL para dados fundamentalistas do Fundamentus.
-    Coleta dados, carrega para o SQL Server e executa uma procedure de transformação.
+    Obtém os tickers, coleta os shards em paralelo nos workers, junta, transforma e carrega para o
+    SQL Server e executa uma procedure de transformação.
     """,
 ) as dag:
-    # Tarefa 1: Coleta, Transformação e Carga Inicial
+    # Tarefa 1: Universo de tickers, dividido em shards
+    ticker_universe_task = PythonOperator(
+        task_id='get_ticker_universe',
+        python_callable=etl_task('get_ticker_universe'),
+    )
+
+    # Tarefa 2: Coleta de cada shard (uma tarefa mapeada por shard, em qualquer worker).
+    # Cada tarefa grava as empresas em data/shards e devolve só o caminho do arquivo.
+    scrape_shard_task = PythonOperator.partial(
+        task_id='scrape_ticker_shard',
+        python_callable=etl_task('scrape_shard'),
+    ).expand(op_kwargs=ticker_universe_task.output)
+
+    # Tarefa 3: Junta os shards, Transformação e Carga Inicial
     extract_transform_load_task = PythonOperator(
         task_id='extract_transform_load_fundamentus',
-        python_callable=etl_fundamentus_data,
-        # op_kwargs={'data_interval_start': '{{ ds }}'}, # Exemplo de como passar kwargs se necessário
+        python_callable=etl_task('etl_fundamentus_data'),
+        op_kwargs={'shard_files': scrape_shard_task.output}, # Lista com os caminhos de todos os shards
     )
 
-    # Tarefa 2: Executar a Procedure SQL
+    # Tarefa 4: Executar a Procedure SQL
     # Substitua 'sua_procedure_de_transformacao' pelo nome real da sua procedure no SQL Server
     execute_procedure_task = PythonOperator(
         task_id='execute_sql_procedure',
-        python_callable=execute_sql_procedure,
+        python_callable=etl_task('execute_sql_procedure'),
         op_kwargs={'procedure_name': 'carga_fundamentus_historico'}, # Passe o nome da sua procedure aqui
     )
 
     # Definir a ordem das tarefas
-    extract_transform_load_task >> execute_procedure_task
\ No newline at end of file
+    ticker_universe_task >> scrape_shard_task >> extract_transform_load_task >> execute_procedure_task
\ No newline at end of file
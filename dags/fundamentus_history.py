@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+import pandas as pd
+
+from fundamentus_schema import column_kind
+from fundamentus_transform import order_columns
+
+# --- Histórico local por ticker ---
+# Cada execução vira um snapshot no catálogo (data, hora, quantidade de linhas, colunas) e cada linha
+# fica em 'observations', indexada por (ticker, snapshot_id). Histórico de um ticker e "universo na
+# data D" são buscas por índice, sem varrer tudo. Como em fundamentus_historico, vale um snapshot por
+# data_execucao: uma nova execução no mesmo dia substitui a anterior.
+HISTORY_DIR = "data/history"
+HISTORY_FILENAME = "history.sqlite"
+KEY_COLUMNS = ("ticker", "data_execucao", "hora_execucao")
+
+
+class HistoryStore:
+    """
+    Histórico de snapshots em SQLite. As datas e horas ficam só no catálogo: corrigir a data ou a
+    hora de uma carga (os UPDATEs de ajuste_manual_data_hora_cargas.sql) altera uma única linha.
+    """
+
+    def __init__(self, history_dir: str = HISTORY_DIR):
+        os.makedirs(history_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(history_dir, HISTORY_FILENAME))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data_execucao TEXT NOT NULL UNIQUE,
+                hora_execucao TEXT,
+                row_count INTEGER NOT NULL,
+                columns TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS catalog (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS observations (
+                ticker TEXT NOT NULL,
+                snapshot_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (ticker, snapshot_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_observations_snapshot ON observations (snapshot_id);
+        """)
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    # --- Catálogo ---
+    def _refresh_latest(self) -> None:
+        row = self.conn.execute(
+            "SELECT snapshot_id FROM snapshots ORDER BY data_execucao DESC LIMIT 1"
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO catalog (key, value) VALUES ('latest_snapshot_id', ?)",
+            (str(row[0]) if row else None,),
+        )
+
+    def latest_snapshot_id(self) -> Optional[int]:
+        row = self.conn.execute("SELECT value FROM catalog WHERE key = 'latest_snapshot_id'").fetchone()
+        return int(row[0]) if row and row[0] else None
+
+    def list_snapshots(self) -> pd.DataFrame:
+        """Catálogo: snapshot_id, data_execucao, hora_execucao e row_count, da data mais antiga à mais recente."""
+        return pd.read_sql_query(
+            "SELECT snapshot_id, data_execucao, hora_execucao, row_count, created_at FROM snapshots ORDER BY data_execucao",
+            self.conn,
+        )
+
+    def snapshot_id_for(self, as_of: str = None) -> Optional[int]:
+        """Snapshot vigente na data 'as_of' ('YYYY-MM-DD'): o mais recente com data <= as_of."""
+        if as_of is None:
+            return self.latest_snapshot_id()
+        row = self.conn.execute(
+            "SELECT snapshot_id FROM snapshots WHERE data_execucao <= ? ORDER BY data_execucao DESC LIMIT 1", (as_of,)
+        ).fetchone()
+        return row[0] if row else None
+
+    # --- Escrita ---
+    def append_snapshot(self, df: pd.DataFrame) -> list:
+        """
+        Grava o DataFrame final de uma execução (um snapshot por data_execucao presente).
+        Substitui o snapshot da mesma data, se existir. Retorna os snapshot_id gravados.
+        """
+        snapshot_ids = []
+        value_columns = [col for col in df.columns if col not in KEY_COLUMNS]
+        with self.conn:
+            for execution_date, part in df.groupby("data_execucao", sort=True):
+                hora = str(part["hora_execucao"].iloc[0]) if "hora_execucao" in part else None
+                previous = self.conn.execute(
+                    "SELECT snapshot_id FROM snapshots WHERE data_execucao = ?", (execution_date,)
+                ).fetchone()
+                if previous:
+                    self.conn.execute("DELETE FROM observations WHERE snapshot_id = ?", previous)
+                    self.conn.execute("DELETE FROM snapshots WHERE snapshot_id = ?", previous)
+
+                cursor = self.conn.execute(
+                    "INSERT INTO snapshots (data_execucao, hora_execucao, row_count, columns, created_at) "
+                    "VALUES (?, ?, ?, ?, datetime('now'))",
+                    (execution_date, hora, len(part), json.dumps(value_columns, ensure_ascii=False)),
+                )
+                snapshot_id = cursor.lastrowid
+
+                values = part[value_columns].astype(object).where(part[value_columns].notna(), None)
+                payloads = (json.dumps(record, ensure_ascii=False, default=str) for record in values.to_dict("records"))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO observations (ticker, snapshot_id, payload) VALUES (?, ?, ?)",
+                    ((ticker, snapshot_id, payload) for ticker, payload in zip(part["ticker"], payloads)),
+                )
+                snapshot_ids.append(snapshot_id)
+                logging.info(f"  Histórico: snapshot {snapshot_id} de {execution_date} gravado ({len(part)} registros).")
+            self._refresh_latest()
+        return snapshot_ids
+
+    def redate_snapshot(self, data_execucao: str, new_data_execucao: str = None, new_hora_execucao: str = None) -> None:
+        """
+        Corrige a data e/ou a hora de um snapshot (ex: carga feita depois da meia-noite).
+        Só o catálogo muda; as linhas não são regravadas.
+        """
+        row = self.conn.execute("SELECT snapshot_id FROM snapshots WHERE data_execucao = ?", (data_execucao,)).fetchone()
+        if not row:
+            raise ValueError(f"Snapshot de '{data_execucao}' não encontrado no histórico.")
+        if new_data_execucao and new_data_execucao != data_execucao and self.conn.execute(
+                "SELECT 1 FROM snapshots WHERE data_execucao = ?", (new_data_execucao,)).fetchone():
+            raise ValueError(f"Já existe um snapshot em '{new_data_execucao}'.")
+        with self.conn:
+            if new_data_execucao:
+                self.conn.execute("UPDATE snapshots SET data_execucao = ? WHERE snapshot_id = ?", (new_data_execucao, row[0]))
+            if new_hora_execucao:
+                self.conn.execute("UPDATE snapshots SET hora_execucao = ? WHERE snapshot_id = ?", (new_hora_execucao, row[0]))
+            self._refresh_latest()
+
+    # --- Leitura ---
+    @staticmethod
+    def _to_frame(rows: list, columns: list) -> pd.DataFrame:
+        records = [
+            {"ticker": ticker, "data_execucao": data_execucao, "hora_execucao": hora, **json.loads(payload)}
+            for ticker, data_execucao, hora, payload in rows
+        ]
+        df = pd.DataFrame.from_records(records, columns=list(KEY_COLUMNS) + [col for col in columns if col not in KEY_COLUMNS])
+        for col in df.columns:
+            kind = column_kind(col)
+            if kind == "numeric":
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype("Float64")
+            elif kind == "category":
+                df[col] = df[col].astype("category")
+        return df[order_columns(df.columns.tolist())]
+
+    def snapshot(self, as_of: str = None) -> pd.DataFrame:
+        """Universo completo vigente em 'as_of' (padrão: o snapshot mais recente)."""
+        snapshot_id = self.snapshot_id_for(as_of)
+        if snapshot_id is None:
+            return pd.DataFrame(columns=list(KEY_COLUMNS))
+        columns = json.loads(self.conn.execute(
+            "SELECT columns FROM snapshots WHERE snapshot_id = ?", (snapshot_id,)
+        ).fetchone()[0])
+        rows = self.conn.execute(
+            "SELECT o.ticker, s.data_execucao, s.hora_execucao, o.payload FROM observations AS o "
+            "JOIN snapshots AS s ON s.snapshot_id = o.snapshot_id WHERE o.snapshot_id = ? ORDER BY o.ticker",
+            (snapshot_id,),
+        ).fetchall()
+        return self._to_frame(rows, columns)
+
+    def ticker_history(self, ticker: str, start: str = None, end: str = None) -> pd.DataFrame:
+        """Histórico de um ticker entre 'start' e 'end' (datas 'YYYY-MM-DD', inclusivas), em ordem de data."""
+        rows = self.conn.execute(
+            "SELECT o.ticker, s.data_execucao, s.hora_execucao, o.payload FROM observations AS o "
+            "JOIN snapshots AS s ON s.snapshot_id = o.snapshot_id "
+            "WHERE o.ticker = ? AND s.data_execucao >= ? AND s.data_execucao <= ? ORDER BY s.data_execucao",
+            (ticker, start or "0000-00-00", end or "9999-99-99"),
+        ).fetchall()
+        columns = []
+        for row in rows:
+            columns.extend(col for col in json.loads(row[3]) if col not in columns)
+        return self._to_frame(rows, columns)
+
+
+def rebuild_from_snapshots(store: HistoryStore, base_dir: str = None) -> int:
+    """Preenche o histórico a partir dos snapshots Parquet já gravados (última execução de cada dia)."""
+    import fundamentus_snapshots # Import local: só é necessário para a reconstrução
+
+    df = fundamentus_snapshots.read_snapshots(base_dir=base_dir or fundamentus_snapshots.SNAPSHOT_DIR)
+    count = 0
+    for _, part in df.groupby("data_execucao", sort=True):
+        store.append_snapshot(part.dropna(axis=1, how="all"))
+        count += 1
+    return count
@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+import pandas as pd
+
+# --- Configuração do arquivo de HTML bruto ---
+# Os blobs ficam em data/html_archive/objects/<2 primeiros hex>/<sha256>.html.gz e o índice em SQLite.
+# Como o endereço é o hash do conteúdo, páginas idênticas entre dias são gravadas uma única vez.
+ARCHIVE_DIR = "data/html_archive"
+INDEX_FILENAME = "index.sqlite"
+
+# Versão do parser: mude sempre que parse_company_page mudar de comportamento,
+# para invalidar o cache de páginas já parseadas.
+# 2: valores guardados como texto bruto (a limpeza numérica passou para fundamentus_transform)
+PARSER_VERSION = 2
+
+# Modo compartilhado (coleta em shards): várias tarefas gravam no mesmo índice ao mesmo tempo.
+# Cada comando é confirmado na hora (sem transação longa segurando o lock de escrita) e o SQLite
+# usa WAL, então as leituras não bloqueiam; quem encontrar o índice ocupado espera até o timeout.
+SHARED_LOCK_TIMEOUT_SECONDS = 60
+
+
+class HtmlArchive:
+    """
+    Armazena as páginas brutas (detalhes.php / resultado.php) endereçadas pelo SHA-256 do conteúdo,
+    com metadados para revalidação condicional (ETag / Last-Modified), um manifesto por execução
+    e um cache dos dados já parseados de cada página.
+    Com 'shared=True', pode ser usado por várias tarefas simultâneas (ver SHARED_LOCK_TIMEOUT_SECONDS).
+    """
+
+    def __init__(self, archive_dir: str = ARCHIVE_DIR, shared: bool = False):
+        self.archive_dir = archive_dir
+        self.objects_dir = os.path.join(archive_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        index_path = os.path.join(archive_dir, INDEX_FILENAME)
+        if shared:
+            self.conn = sqlite3.connect(index_path, timeout=SHARED_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        else:
+            self.conn = sqlite3.connect(index_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                execution_ts TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS manifests (
+                run_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (run_id, kind, key)
+            );
+            CREATE TABLE IF NOT EXISTS parsed (
+                sha256 TEXT NOT NULL,
+                parser_version INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (sha256, parser_version)
+            );
+            CREATE TABLE IF NOT EXISTS carried (
+                run_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL
+            );
+        """)
+        self.stats = {"stored": 0, "deduplicated": 0, "not_modified": 0, "parse_cache_hits": 0}
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.html.gz")
+
+    # --- Revalidação condicional ---
+    def conditional_headers(self, url: str) -> dict:
+        """Cabeçalhos If-None-Match / If-Modified-Since para a última versão arquivada da URL."""
+        row = self.conn.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def current_sha(self, url: str) -> Optional[str]:
+        row = self.conn.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    # --- Blobs ---
+    def store(self, url: str, text: str, headers: Optional[dict] = None) -> tuple:
+        """
+        Grava o HTML (comprimido) se o conteúdo ainda não existir e atualiza o índice da URL.
+        Retorna (sha256, changed), onde 'changed' indica se o conteúdo difere da última versão da URL.
+        """
+        # Cabeçalhos podem vir do requests ou do aiohttp: normaliza para minúsculas
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        data = text.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        previous_sha = self.current_sha(url)
+
+        path = self._object_path(sha256)
+        if os.path.exists(path):
+            self.stats["deduplicated"] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp_path, path) # Escrita atômica: nunca deixa blob truncado
+            self.stats["stored"] += 1
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, sha256, etag, last_modified, fetched_at) "
+            "VALUES (?, ?, ?, ?, datetime('now'))",
+            (url, sha256, headers.get("etag"), headers.get("last-modified")),
+        )
+        return sha256, sha256 != previous_sha
+
+    def mark_not_modified(self, url: str) -> Optional[str]:
+        """Registra uma resposta 304 e devolve o hash da versão arquivada."""
+        self.stats["not_modified"] += 1
+        self.conn.execute("UPDATE pages SET fetched_at = datetime('now') WHERE url = ?", (url,))
+        return self.current_sha(url)
+
+    def load(self, sha256: str) -> str:
+        with open(self._object_path(sha256), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+    # --- Manifesto por execução ---
+    def register_run(self, run_id: str, execution_ts: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, execution_ts) VALUES (?, ?)", (run_id, execution_ts)
+        )
+
+    def add_to_manifest(self, run_id: str, kind: str, key: str, url: str, sha256: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO manifests (run_id, kind, key, url, sha256) VALUES (?, ?, ?, ?, ?)",
+            (run_id, kind, key, url, sha256),
+        )
+
+    def manifest(self, run_id: str, kind: str) -> list:
+        """Lista de (chave, sha256) de uma execução arquivada."""
+        return self.conn.execute(
+            "SELECT key, sha256 FROM manifests WHERE run_id = ? AND kind = ? ORDER BY key", (run_id, kind)
+        ).fetchall()
+
+    def run_execution_ts(self, run_id: str) -> Optional[str]:
+        row = self.conn.execute("SELECT execution_ts FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def latest_run_id(self) -> Optional[str]:
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0] if row else None
+
+    # --- Campos repetidos do modo 'fast' ---
+    # Uma execução 'fast' monta as empresas com campos do snapshot anterior do histórico, que não estão em
+    # nenhuma página. Eles são arquivados junto com a execução para que ela possa ser reprocessada offline;
+    # a presença do registro também identifica a execução como 'fast'.
+    def put_carried(self, run_id: str, carried: dict) -> None:
+        """Grava os campos repetidos ({ticker: {coluna: valor}}) de uma execução 'fast'."""
+        payload = json.dumps(
+            {ticker: {col: (None if pd.isna(value) else value) for col, value in fields.items()}
+             for ticker, fields in carried.items()},
+            ensure_ascii=False,
+        )
+        self.conn.execute("INSERT OR REPLACE INTO carried (run_id, payload) VALUES (?, ?)", (run_id, payload))
+
+    def get_carried(self, run_id: str) -> Optional[dict]:
+        """Campos repetidos de uma execução 'fast' ou None se a execução não for 'fast'."""
+        row = self.conn.execute("SELECT payload FROM carried WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- Cache de páginas parseadas ---
+    def get_parsed(self, sha256: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT payload FROM parsed WHERE sha256 = ? AND parser_version = ?", (sha256, PARSER_VERSION)
+        ).fetchone()
+        if not row:
+            return None
+        self.stats["parse_cache_hits"] += 1
+        # O JSON não tem pd.NA: os nulos foram gravados como None e voltam como pd.NA
+        return {key: (pd.NA if value is None else value) for key, value in json.loads(row[0]).items()}
+
+    def put_parsed(self, sha256: str, company_data: dict) -> None:
+        payload = json.dumps(
+            {key: (None if pd.isna(value) else value) for key, value in company_data.items()}, ensure_ascii=False
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parsed (sha256, parser_version, payload) VALUES (?, ?, ?)",
+            (sha256, PARSER_VERSION, payload),
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def log_stats(self) -> None:
+        logging.info(
+            f"  Arquivo HTML: {self.stats['stored']} páginas novas, {self.stats['deduplicated']} deduplicadas, "
+            f"{self.stats['not_modified']} não modificadas (304), {self.stats['parse_cache_hits']} parsings evitados."
+        )
@@ -0,0 +1,220 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import fundamentus_bulk_load
+
+# --- Indicadores derivados ao longo do tempo ---
+# Calculados a cada execução sobre o snapshot recém-transformado e um estado pequeno mantido em
+# INDICATORS_DIR (Parquet), sem reler o histórico inteiro:
+#   - variação em relação ao snapshot anterior de cada ticker (relativa para cotação e múltiplos,
+#     em pontos para indicadores em %);
+#   - distância da cotação à mínima e à máxima de 52 semanas;
+#   - z-score de EV/EBIT e ROIC dentro do subsetor, sobre uma janela com os últimos ZSCORE_WINDOW snapshots.
+# O estado guarda os valores dos dois últimos snapshots (uma nova execução no mesmo dia continua comparando
+# com o dia anterior) e, por snapshot e subsetor, contagem, soma e soma dos quadrados de cada métrica da janela.
+# A tabela INDICATORS_TABLE é gravada na mesma transação da carga, uma vez por execução.
+INDICATORS_DIR = "data/indicators"
+INDICATORS_TABLE = "indicadores_fundamentus"
+VALUES_FILENAME = "state_values.parquet"
+WINDOW_FILENAME = "state_subsector_window.parquet"
+
+RELATIVE_CHANGE_COLUMNS = ("cotacao", "pl", "pvp", "ev_ebit", "ev_ebitda", "vol_med_2m") # var_<col> = (atual - anterior) / |anterior|
+POINT_CHANGE_COLUMNS = ("roic", "roe", "div_yield", "marg_liquida")                      # dif_<col> = atual - anterior
+ZSCORE_COLUMNS = ("ev_ebit", "roic")
+ZSCORE_WINDOW = 20           # Snapshots na janela do z-score (~1 mês de pregões com uma execução por dia)
+ZSCORE_MIN_OBSERVATIONS = 5  # Observações mínimas do subsetor na janela; abaixo disso o z-score fica nulo
+
+TRACKED_COLUMNS = RELATIVE_CHANGE_COLUMNS + tuple(col for col in POINT_CHANGE_COLUMNS if col not in RELATIVE_CHANGE_COLUMNS)
+
+INDICATOR_COLUMNS = (
+    ["ticker", "data_execucao", "hora_execucao", "setor", "subsetor", "data_execucao_anterior"]
+    + [f"var_{col}" for col in RELATIVE_CHANGE_COLUMNS]
+    + [f"dif_{col}" for col in POINT_CHANGE_COLUMNS]
+    + ["dist_min_52_sem", "dist_max_52_sem"]
+    + [f"zscore_{col}_subsetor" for col in ZSCORE_COLUMNS]
+)
+
+INDICATORS_TABLE_DDL = "CREATE TABLE {table_name} (\n" + ",\n".join(
+    [
+        "    [ticker] NVARCHAR(32) NOT NULL",
+        "    [data_execucao] DATE NOT NULL",
+        "    [hora_execucao] NVARCHAR(8) NULL",
+        "    [setor] NVARCHAR(255) NULL",
+        "    [subsetor] NVARCHAR(255) NULL",
+        "    [data_execucao_anterior] DATE NULL",
+    ]
+    + [f"    [{col}] FLOAT NULL" for col in INDICATOR_COLUMNS[6:]]
+    + ["    PRIMARY KEY ([data_execucao], [ticker])"]
+) + "\n)"
+
+
+def _as_float(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Coluna como array float64 (pd.NA -> NaN), ou só NaN se a coluna não existir."""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _as_text(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    values = df[col].astype(object)
+    return values.where(values.notna(), None)
+
+
+class IndicatorState:
+    """
+    Estado incremental dos indicadores (valores dos dois últimos snapshots e janela por subsetor).
+    Com reset=True começa vazio, ignorando o estado gravado.
+    """
+
+    def __init__(self, state_dir: str = INDICATORS_DIR, reset: bool = False):
+        self.state_dir = state_dir
+        values_path = os.path.join(state_dir, VALUES_FILENAME)
+        window_path = os.path.join(state_dir, WINDOW_FILENAME)
+        self.values = (
+            pd.read_parquet(values_path) if os.path.isfile(values_path) and not reset
+            else pd.DataFrame(columns=["ticker", "data_execucao", *TRACKED_COLUMNS])
+        )
+        self.window = (
+            pd.read_parquet(window_path) if os.path.isfile(window_path) and not reset
+            else pd.DataFrame(columns=["data_execucao", "subsetor", "metric", "count", "sum", "sumsq"])
+        )
+
+    def latest_date(self):
+        return self.values["data_execucao"].max() if not self.values.empty else None
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcula os indicadores do DataFrame final de uma execução (um snapshot por data_execucao, em ordem)
+        e atualiza o estado em memória (gravado por save()). Snapshots mais antigos que o último do
+        estado não alteram o estado e não geram indicadores (reconstrua com rebuild_from_history).
+        """
+        frames = []
+        for execution_date, part in df.groupby("data_execucao", sort=True):
+            latest = self.latest_date()
+            if latest is not None and execution_date < latest:
+                logging.warning(
+                    f"  Indicadores: snapshot de {execution_date} é anterior ao estado ({latest}); ignorado."
+                )
+                continue
+            frames.append(self._update_snapshot(str(execution_date), part.reset_index(drop=True)))
+        if not frames:
+            return pd.DataFrame(columns=INDICATOR_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def _update_snapshot(self, execution_date: str, part: pd.DataFrame) -> pd.DataFrame:
+        # 1) Snapshot anterior: o mais recente antes desta data (uma nova execução no mesmo dia é substituída)
+        earlier = self.values[self.values["data_execucao"] < execution_date]
+        base_date = earlier["data_execucao"].max() if not earlier.empty else None
+        base = earlier[earlier["data_execucao"] == base_date].drop_duplicates("ticker", keep="last").set_index("ticker")
+        base = base.reindex(part["ticker"])
+
+        indicators = pd.DataFrame({
+            "ticker": part["ticker"].astype(object),
+            "data_execucao": execution_date,
+            "hora_execucao": _as_text(part, "hora_execucao"),
+            "setor": _as_text(part, "setor"),
+            "subsetor": _as_text(part, "subsetor"),
+            "data_execucao_anterior": base_date,
+        })
+
+        # 2) Variações em relação ao snapshot anterior (vetorizadas por coluna)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for col in RELATIVE_CHANGE_COLUMNS:
+                current, previous = _as_float(part, col), _as_float(base, col)
+                indicators[f"var_{col}"] = np.where(previous != 0, (current - previous) / np.abs(previous), np.nan)
+            for col in POINT_CHANGE_COLUMNS:
+                indicators[f"dif_{col}"] = _as_float(part, col) - _as_float(base, col)
+
+            # 3) Distância da cotação à mínima e à máxima de 52 semanas
+            price = _as_float(part, "cotacao")
+            for col in ("min_52_sem", "max_52_sem"):
+                bound = _as_float(part, col)
+                indicators[f"dist_{col}"] = np.where(bound > 0, price / bound - 1.0, np.nan)
+
+        # 4) Janela por subsetor: agregados deste snapshot substituem os da mesma data
+        subsector = indicators["subsetor"]
+        aggregates = []
+        for col in ZSCORE_COLUMNS:
+            values = _as_float(part, col)
+            valid = np.isfinite(values) & subsector.notna().to_numpy()
+            grouped = pd.DataFrame({"subsetor": subsector.to_numpy()[valid], "value": values[valid], "square": values[valid] ** 2})
+            grouped = grouped.groupby("subsetor", sort=False).agg(count=("value", "size"), sum=("value", "sum"), sumsq=("square", "sum"))
+            aggregates.append(grouped.reset_index().assign(data_execucao=execution_date, metric=col))
+        kept = self.window[self.window["data_execucao"] != execution_date]
+        frames = [frame for frame in [kept] + aggregates if not frame.empty]
+        window = pd.concat(frames, ignore_index=True) if frames else kept
+        dates = np.sort(window["data_execucao"].unique())[-ZSCORE_WINDOW:]
+        window = window[window["data_execucao"].isin(dates)].reset_index(drop=True)
+
+        stats = window.groupby(["metric", "subsetor"])[["count", "sum", "sumsq"]].sum()
+        mean = stats["sum"] / stats["count"]
+        std = np.sqrt((stats["sumsq"] / stats["count"] - mean ** 2).clip(lower=0))
+        usable = (stats["count"] >= ZSCORE_MIN_OBSERVATIONS) & (std > 0)
+        for col in ZSCORE_COLUMNS:
+            keys = pd.MultiIndex.from_arrays([np.full(len(part), col, dtype=object), subsector.to_numpy()])
+            col_mean = mean.where(usable).reindex(keys).to_numpy(dtype="float64", na_value=np.nan)
+            col_std = std.where(usable).reindex(keys).to_numpy(dtype="float64", na_value=np.nan)
+            indicators[f"zscore_{col}_subsetor"] = (_as_float(part, col) - col_mean) / col_std
+
+        # 5) Estado: o snapshot anterior e este (no lugar de uma execução anterior do mesmo dia)
+        current_values = pd.DataFrame({"ticker": part["ticker"].astype(object), "data_execucao": execution_date})
+        for col in TRACKED_COLUMNS:
+            current_values[col] = _as_float(part, col)
+        self.values = pd.concat(
+            [frame for frame in (earlier[earlier["data_execucao"] == base_date], current_values) if not frame.empty],
+            ignore_index=True,
+        )
+        self.window = window
+
+        logging.info(
+            f"  Indicadores de {execution_date}: {len(indicators)} tickers, snapshot anterior {base_date or '-'}, "
+            f"janela do z-score com {len(dates)} snapshots."
+        )
+        return indicators.reindex(columns=INDICATOR_COLUMNS)
+
+    def save(self) -> None:
+        """Grava o estado (arquivos temporários + os.replace: uma falha não deixa o estado pela metade)."""
+        os.makedirs(self.state_dir, exist_ok=True)
+        for frame, filename in ((self.values, VALUES_FILENAME), (self.window, WINDOW_FILENAME)):
+            path = os.path.join(self.state_dir, filename)
+            frame.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+
+
+def save_indicators(
+        cursor,
+        indicators: pd.DataFrame,
+        table_name: str = INDICATORS_TABLE,
+        strategy: str = "fast_executemany",
+        batch_size: int = fundamentus_bulk_load.DEFAULT_BATCH_SIZE
+    ) -> None:
+    """
+    Grava os indicadores no SQL Server (T-SQL), substituindo os das mesmas datas de execução
+    (uma nova execução no mesmo dia prevalece). Não faz commit: quem chama controla a transação.
+    """
+    cursor.execute(
+        f"IF OBJECT_ID(N'{table_name}', N'U') IS NULL " + INDICATORS_TABLE_DDL.format(table_name=table_name)
+    )
+    if indicators.empty:
+        return
+    for execution_date in indicators["data_execucao"].dropna().unique():
+        cursor.execute(f"DELETE FROM {table_name} WHERE [data_execucao] = ?", (str(execution_date),))
+    fundamentus_bulk_load.bulk_insert(cursor, table_name, indicators, strategy=strategy, batch_size=batch_size)
+
+
+def rebuild_from_history(store, state_dir: str = INDICATORS_DIR) -> int:
+    """
+    Recria o estado a partir do histórico local (fundamentus_history.HistoryStore), aplicando os
+    snapshots em ordem de data. Usado na primeira execução ou depois de reprocessar datas antigas.
+    """
+    state = IndicatorState(state_dir, reset=True)
+    catalog = store.list_snapshots()
+    for execution_date in catalog["data_execucao"]:
+        state.update(store.snapshot(as_of=execution_date))
+    state.save()
+    return len(catalog)
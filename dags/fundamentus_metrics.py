@@ -0,0 +1,228 @@
+import bisect
+import contextlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+# --- Métricas da execução do ETL ---
+# Duração de cada estágio, histogramas de latência por ticker (coleta e parsing), bytes baixados,
+# contagem de status HTTP, falhas e registros gravados. Ao final da execução vão para o XCom da
+# tarefa e para um arquivo JSON em METRICS_DIR; uma linha resumida por execução é acrescentada a
+# METRICS_HISTORY_FILE, para comparar execuções e alertar sobre regressões.
+METRICS_DIR = "data/metrics"
+METRICS_HISTORY_FILE = "runs.jsonl"
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Limites superiores (segundos)
+SLOWEST_TICKERS = 10 # Quantos tickers mais lentos guardar por histograma
+
+
+class LatencyHistogram:
+    """Histograma de latências com limites fixos (contagem por faixa, soma, máximo e os mais lentos)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # A última faixa é "acima do maior limite"
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._slowest = [] # Heap de (segundos, ticker) com os SLOWEST_TICKERS maiores
+
+    def observe(self, seconds: float, key: str = None) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if key is not None:
+            if len(self._slowest) < SLOWEST_TICKERS:
+                heapq.heappush(self._slowest, (seconds, key))
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (seconds, key))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimativa do quantil 'q' pelo limite superior da faixa (None sem observações)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.max
+
+    def to_dict(self) -> dict:
+        labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "mean_seconds": round(self.total / self.count, 6) if self.count else None,
+            "max_seconds": round(self.max, 6),
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts)),
+            "slowest": [{"ticker": key, "seconds": round(seconds, 6)} for seconds, key in sorted(self._slowest, reverse=True)],
+        }
+
+
+class RunMetrics:
+    """
+    Métricas de uma execução. Seguro para uso por várias threads (coleta, pipeline de carga);
+    os processos do pool de parsing devolvem o tempo junto com o resultado (ver timed_call).
+    Com 'profiler' (fundamentus_profiling.StageProfiler, modo de perfilamento), cada estágio também
+    tem o perfil de CPU e de memória capturado; o caminho dos perfis vai para os detalhes das métricas.
+    """
+
+    def __init__(self, name: str = "etl_fundamentus", profiler=None):
+        self.name = name
+        self.profiler = profiler
+        self.started_at = time.time()
+        self.stages = {}
+        self.histograms = {}
+        self.counters = {}
+        self.http_status = {}
+        self.details = {} if profiler is None else {"profile_dir": profiler.path}
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        """Mede a duração de um estágio; chamadas repetidas (ex: um por micro-lote) se acumulam."""
+        if self.profiler is None:
+            return self._timed_stage(name)
+        return self._profiled_stage(name)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                stage["seconds"] += seconds
+                stage["calls"] += 1
+
+    @contextlib.contextmanager
+    def _profiled_stage(self, name: str):
+        # Os snapshots de memória do perfilamento ficam fora da duração medida
+        with self.profiler.stage(name), self._timed_stage(name):
+            yield
+
+    def observe(self, histogram: str, seconds: float, key: str = None) -> None:
+        with self._lock:
+            if histogram not in self.histograms:
+                self.histograms[histogram] = LatencyHistogram()
+            self.histograms[histogram].observe(seconds, key)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def note(self, name: str, value) -> None:
+        """Informação pequena e serializável em JSON (ex: lista de tickers que faltaram)."""
+        with self._lock:
+            self.details[name] = value
+
+    def record_fetch(self, ticker: str, status: Optional[int], seconds: float, size: int) -> None:
+        """Uma requisição HTTP: latência, status ('error' quando não houve resposta) e bytes recebidos."""
+        self.observe("fetch_seconds", seconds, ticker)
+        with self._lock:
+            label = str(status) if status is not None else "error"
+            self.http_status[label] = self.http_status.get(label, 0) + 1
+            self.counters["bytes_downloaded"] = self.counters.get("bytes_downloaded", 0) + (size or 0)
+
+    def record_load(self, stats: dict) -> None:
+        """Registros gravados a partir do retorno de bulk_insert ou de incremental_upsert."""
+        if stats:
+            self.increment("rows_written", stats.get("rows", stats.get("inserted", 0) + stats.get("updated", 0)))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "elapsed_seconds": round(time.time() - self.started_at, 3),
+                "stages": {name: {"seconds": round(stage["seconds"], 6), "calls": stage["calls"]} for name, stage in self.stages.items()},
+                "counters": dict(self.counters),
+                "http_status": dict(sorted(self.http_status.items())),
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                "details": dict(self.details),
+            }
+
+    def summary(self) -> dict:
+        """Versão compacta (sem faixas dos histogramas), usada no XCom e no histórico de execuções."""
+        metrics = self.to_dict()
+        metrics["histograms"] = {
+            name: {key: value for key, value in histogram.items() if key not in ("buckets", "slowest")}
+            for name, histogram in metrics["histograms"].items()
+        }
+        return metrics
+
+    def export(self, run_id: str, metrics_dir: str = METRICS_DIR, ti=None) -> Optional[str]:
+        """
+        Grava o arquivo completo '<metrics_dir>/<name>_<run_id>.json', acrescenta o resumo ao histórico
+        de execuções e, se 'ti' (TaskInstance do Airflow) for informado, publica o resumo no XCom 'metrics'.
+        Falhas aqui são só registradas: métricas nunca derrubam a execução. Retorna o caminho do arquivo.
+        """
+        path = None
+        summary = dict(self.summary(), run_id=run_id)
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            path = os.path.join(metrics_dir, f"{self.name}_{run_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(dict(self.to_dict(), run_id=run_id), f, ensure_ascii=False, indent=2)
+            with open(os.path.join(metrics_dir, METRICS_HISTORY_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+            logging.info(f"  Métricas da execução gravadas em '{path}'.")
+        except OSError as e:
+            logging.error(f"  Erro ao gravar as métricas da execução: {e}")
+        if ti is not None:
+            try:
+                ti.xcom_push(key="metrics", value=summary)
+            except Exception as e:
+                logging.error(f"  Erro ao publicar as métricas no XCom: {e}")
+        return path
+
+    def log_summary(self) -> None:
+        stages = ", ".join(f"{name} {stage['seconds']:.2f}s" for name, stage in self.stages.items())
+        logging.info(f"  Métricas por estágio: {stages}")
+        for name, histogram in self.histograms.items():
+            logging.info(
+                f"  {name}: {histogram.count} obs., média {histogram.total / max(histogram.count, 1) * 1000:.0f} ms, "
+                f"p95 <= {(histogram.quantile(0.95) or 0) * 1000:.0f} ms, máx {histogram.max * 1000:.0f} ms"
+            )
+        if self.http_status:
+            logging.info(f"  Status HTTP: {dict(sorted(self.http_status.items()))} - {self.counters.get('bytes_downloaded', 0):,} bytes baixados")
+
+
+# Execução corrente do processo. As funções do ETL registram sempre aqui; start_run() troca a
+# instância no início de cada execução (fora de uma execução, as métricas são só descartadas).
+# O perfilador ativo (set_profiler, usado pelo modo de perfilamento das tarefas) passa para as
+# execuções iniciadas enquanto ele estiver ativo.
+_current = RunMetrics()
+_profiler = None
+
+
+def set_profiler(profiler) -> None:
+    global _profiler
+    _profiler = profiler
+    _current.profiler = profiler
+
+
+def start_run(name: str = "etl_fundamentus") -> RunMetrics:
+    global _current
+    _current = RunMetrics(name, _profiler)
+    return _current
+
+
+def current() -> RunMetrics:
+    return _current
+
+
+def timed_call(func, *args):
+    """Executa func(*args) e devolve (resultado, segundos); usado no pool de processos do parsing."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
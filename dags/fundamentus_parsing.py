@@ -0,0 +1,300 @@
+import functools
+import logging
+import re
+import unicodedata
+from html.parser import HTMLParser
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from fundamentus_schema import DATE_COLUMNS
+
+# --- Função auxiliar para normalizar strings (remove acentos, caracteres diacríticos, espaços extras, etc.) ---
+def normalize_string_for_comparison(s: str) -> str:
+    # REMOVE O CARACTERE '?' INICIAL SE EXISTIR
+    if s.startswith('?'):
+        s = s[1:]
+    # Remove acentos e caracteres diacríticos
+    s = unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('utf-8').strip()
+    # Troca espaços não quebráveis por espaços normais
+    s = s.replace('\xa0', ' ').strip()
+    # Remove múltiplos espaços e garante um único espaço entre as palavras
+    s = ' '.join(s.split())
+    return s
+
+# --- LISTAS RAW: Strings EXATAS como aparecem no site (antes de remover ':') ---
+STRING_FIELDS_RAW = [
+    "Tipo:",
+    "Empresa:",
+    "Setor:",
+    "Subsetor:",
+    "Data últ cot:", 
+    "Últ balanço processado:", 
+]
+
+SPECIAL_METRICS_RAW = [
+    "Receita Líquida:",
+    "EBIT:",
+    "Lucro Líquido:",
+    "Result Int Financ:",
+    "Rec Serviços:",
+]
+
+# --- NORMALIZAÇÃO DAS LISTAS UMA ÚNICA VEZ NO INÍCIO DO SCRIPT ---
+STRING_FIELDS = [normalize_string_for_comparison(s.replace(":", "")) for s in STRING_FIELDS_RAW]
+SPECIAL_METRICS = [normalize_string_for_comparison(s.replace(":", "")) for s in SPECIAL_METRICS_RAW]
+
+# --- Lista de colunas que devem ser convertidas para DATE no SQL Server ---
+# Estes são os nomes das colunas APÓS a limpeza por clean_column_name (declarados em fundamentus_schema)
+DATE_COLUMNS_TO_CONVERT = list(DATE_COLUMNS)
+
+def clean_and_convert_value(value_str):
+    """
+    Limpa e converte uma string para um valor numérico (float),
+    tratando moedas, porcentagens e separadores decimais.
+    """
+    if isinstance(value_str, (int, float)):
+        return value_str
+    
+    value_str = str(value_str).strip() # Garante que é string
+    value_str = value_str.replace("R\$", "").replace("%", "").replace(".", "").replace(",", ".").strip()
+    
+    try:
+        float_val = float(value_str)
+        return float_val
+    except ValueError:
+        return pd.NA
+
+# 1) Alterar os nomes das colunas para retirar os caracteres especiais
+def clean_column_name(col_name: str) -> str:
+    """
+    Limpa o nome de uma coluna, removendo acentos, caracteres especiais,
+    substituindo espaços por underscores e convertendo para minúsculas.
+    """
+    # Normaliza caracteres Unicode (ex: 'ç' -> 'c', 'é' -> 'e')
+    cleaned_name = unicodedata.normalize('NFKD', col_name).encode('ascii', 'ignore').decode('utf-8')
+    # Substitui espaços e hifens por underscores
+    cleaned_name = cleaned_name.replace(' ', '_').replace('-', '_')
+    # Remove qualquer caractere que não seja letra, número ou underscore
+    cleaned_name = re.sub(r'[^a-zA-Z0-9_]', '', cleaned_name)
+    # Remove underscores duplicados ou no início/fim
+    cleaned_name = re.sub(r'_+', '_', cleaned_name).strip('_')
+    # Converte para minúsculas
+    cleaned_name = cleaned_name.lower()
+    return cleaned_name
+
+def parse_company_page_bs4(ticker: str, html: str, convert_values: bool = True) -> dict:
+    """
+    Extrai os dados de uma empresa a partir do HTML da página detalhes.php usando BeautifulSoup.
+    Caminho original, mantido como fallback e referência do extrator rápido.
+    Com convert_values=False os valores ficam como texto (limpos depois por fundamentus_transform).
+    """
+    company_data = {"Ticker": ticker}
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    label_tds = soup.find_all("td", class_="label")
+    
+    for label_tag in label_tds:
+        raw_label_from_html = label_tag.text.strip()
+        
+        # Remove o ':' e então normaliza para comparação e uso como chave
+        processed_label_no_colon = raw_label_from_html.replace(":", "")
+        normalized_label = normalize_string_for_comparison(processed_label_no_colon)
+
+        # Este bloco é para SPECIAL_METRICS (Receita Líquida, EBIT, etc.)
+        if normalized_label in SPECIAL_METRICS:
+            parent_row = label_tag.find_parent("tr")
+            if parent_row:
+                data_cells = parent_row.find_all("td", class_="data")
+                if len(data_cells) >= 2:
+                    value_12m = data_cells[0].text.strip()
+                    value_3m = data_cells[1].text.strip()
+
+                    # Adiciona ao dicionário com os nomes normalizados e sufixos
+                    company_data[f"{normalized_label} 12m"] = value_12m
+                    company_data[f"{normalized_label} 3m"] = value_3m
+        else:
+            data_tag = label_tag.find_next_sibling("td", class_="data")
+            if data_tag:
+                value = data_tag.text.strip()
+                company_data[normalized_label] = value # Usa o nome normalizado como chave
+    
+    if not convert_values:
+        return company_data
+
+    # Após popular company_data, processa os valores
+    for key, value in company_data.items():
+        # Verifica se a chave (label normalizado) está em STRING_FIELDS
+        # E também não converte colunas que serão tratadas como datas
+        if key != "Ticker" and key not in STRING_FIELDS and clean_column_name(key) not in DATE_COLUMNS_TO_CONVERT:
+            company_data[key] = clean_and_convert_value(value)
+
+    return company_data
+
+
+# --- Extrator rápido (passada única) ---
+# O conjunto de rótulos do detalhes.php é praticamente fixo, então a normalização de cada rótulo
+# (NFKD + re-encode) e o nome final da coluna são calculados uma única vez por processo e memorizados.
+
+@functools.lru_cache(maxsize=None)
+def resolve_label(raw_label: str) -> tuple:
+    """
+    Converte o texto bruto de um td.label em (rótulo normalizado, é métrica especial 12m/3m).
+    """
+    normalized_label = normalize_string_for_comparison(raw_label.strip().replace(":", ""))
+    return normalized_label, normalized_label in SPECIAL_METRICS
+
+@functools.lru_cache(maxsize=None)
+def column_name_for(label: str) -> str:
+    """Nome final da coluna (clean_column_name) de um rótulo normalizado, memorizado."""
+    return clean_column_name(label)
+
+@functools.lru_cache(maxsize=None)
+def is_numeric_label(label: str) -> bool:
+    """Indica se o valor do rótulo deve passar por clean_and_convert_value."""
+    return label != "Ticker" and label not in STRING_FIELDS and column_name_for(label) not in DATE_COLUMNS_TO_CONVERT
+
+# Elementos sem tag de fechamento (tratados como vazios, como faz o BeautifulSoup)
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+
+
+class _Cell:
+    __slots__ = ("classes", "parts", "siblings", "index", "row")
+
+    def __init__(self, classes, siblings, row):
+        self.classes = classes
+        self.parts = []
+        self.siblings = siblings # Lista de td filhos diretos do mesmo elemento pai
+        self.index = len(siblings)
+        self.row = row # tr ancestral mais próximo (ou None)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts).strip()
+
+
+class _Row:
+    __slots__ = ("data_cells",)
+
+    def __init__(self):
+        self.data_cells = [] # Todos os td.data descendentes, em ordem de documento
+
+
+class _PageExtractor(HTMLParser):
+    """
+    Percorre o HTML uma única vez registrando apenas as células td e linhas tr, com a mesma
+    semântica usada pelo BeautifulSoup em parse_company_page_bs4 (texto de todos os descendentes,
+    irmãos no mesmo elemento pai e tr ancestral mais próximo).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Pilha de elementos abertos: [tag, nó (_Cell/_Row/None), td filhos diretos]
+        self.stack = [["#document", None, []]]
+        self.open_cells = []
+        self.open_rows = []
+        self.label_cells = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        node = None
+        if tag == "td":
+            classes = ()
+            for name, value in attrs:
+                if name == "class" and value:
+                    classes = value.split()
+            row = self.open_rows[-1] if self.open_rows else None
+            node = _Cell(classes, self.stack[-1][2], row)
+            self.stack[-1][2].append(node)
+            if "data" in classes:
+                for open_row in self.open_rows:
+                    open_row.data_cells.append(node)
+            if "label" in classes:
+                self.label_cells.append(node)
+            self.open_cells.append(node)
+        elif tag == "tr":
+            node = _Row()
+            self.open_rows.append(node)
+        self.stack.append([tag, node, []])
+
+    def handle_startendtag(self, tag, attrs):
+        # <td/> não tem conteúdo, mas continua sendo uma célula
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # Fecha até o elemento aberto mais recente com o mesmo nome; ignora fechamentos órfãos
+        for position in range(len(self.stack) - 1, 0, -1):
+            if self.stack[position][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > position:
+            closed_tag, node, _ = self.stack.pop()
+            if closed_tag == "td":
+                self.open_cells.remove(node)
+            elif closed_tag == "tr":
+                self.open_rows.remove(node)
+
+    def handle_data(self, data):
+        for cell in self.open_cells:
+            cell.parts.append(data)
+
+
+def _next_data_sibling(cell: _Cell):
+    for sibling in cell.siblings[cell.index + 1:]:
+        if "data" in sibling.classes:
+            return sibling
+    return None
+
+def parse_company_page_fast(ticker: str, html: str, convert_values: bool = True) -> dict:
+    """
+    Extrai os dados de uma empresa a partir do HTML da página detalhes.php em uma única
+    passada, sem montar a árvore do BeautifulSoup. Produz o mesmo dicionário de
+    parse_company_page_bs4.
+    """
+    extractor = _PageExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    company_data = {"Ticker": ticker}
+
+    for label_cell in extractor.label_cells:
+        normalized_label, is_special = resolve_label(label_cell.text)
+
+        # Este bloco é para SPECIAL_METRICS (Receita Líquida, EBIT, etc.)
+        if is_special:
+            if label_cell.row is not None and len(label_cell.row.data_cells) >= 2:
+                company_data[f"{normalized_label} 12m"] = label_cell.row.data_cells[0].text
+                company_data[f"{normalized_label} 3m"] = label_cell.row.data_cells[1].text
+        else:
+            data_cell = _next_data_sibling(label_cell)
+            if data_cell is not None:
+                company_data[normalized_label] = data_cell.text
+
+    if not convert_values:
+        return company_data
+
+    for key, value in company_data.items():
+        if is_numeric_label(key):
+            company_data[key] = clean_and_convert_value(value)
+
+    return company_data
+
+def parse_company_page(ticker: str, html: str, parser: str = "fast", convert_values: bool = True) -> dict:
+    """
+    Extrai os dados de uma empresa com o parser escolhido ('fast' ou 'bs4'). O extrator rápido
+    cai para o BeautifulSoup se falhar ou se não encontrar nenhum rótulo na página.
+    Função de nível de módulo para poder ser enviada a um ProcessPoolExecutor.
+    """
+    if parser == "fast":
+        try:
+            company_data = parse_company_page_fast(ticker, html, convert_values)
+            if len(company_data) > 1:
+                return company_data
+        except Exception as exc:
+            logging.warning(f"  Extrator rápido falhou para {ticker} ({exc}), usando BeautifulSoup.")
+    return parse_company_page_bs4(ticker, html, convert_values)
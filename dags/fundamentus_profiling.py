@@ -0,0 +1,240 @@
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+# --- Modo de perfilamento (opcional) ---
+# Ligado pelo parâmetro 'profile' da DAG ou pela variável de ambiente FUNDAMENTUS_PROFILE=1. Cada estágio
+# medido por RunMetrics.stage também é perfilado:
+#   - CPU: um cProfile por estágio (acumulado entre as chamadas, ex: micro-lotes), gravado em <estágio>.prof
+#     (formato pstats: snakeviz, flameprof ou gprof2dot geram o flamegraph) e resumido em <estágio>.cpu.txt;
+#   - memória: pico do tracemalloc durante o estágio e os locais que mais alocaram (memória ainda em uso
+#     ao final das primeiras chamadas, com a linha do projeto que originou cada alocação), em
+#     <estágio>.memory.txt e summary.json;
+#   - parsing: 1 de cada PARSE_SAMPLE_EVERY páginas é parseada no próprio processo sob cProfile
+#     (parse/<ticker>.prof, somadas em parse_samples.prof), já que o pool de processos fica fora do cProfile.
+# Os arquivos vão para data/profiles/<tarefa>_<run_id>/. Desligado, o custo é uma comparação com None
+# por estágio e por página parseada (medido em benchmarks/run_benchmarks.py).
+PROFILE_DIR = "data/profiles"
+PROFILE_ENV_VAR = "FUNDAMENTUS_PROFILE"
+PARSE_SAMPLE_EVERY = 20       # Uma página perfilada a cada N parseadas
+MAX_PARSE_SAMPLES = 50        # Máximo de perfis de parsing gravados por execução
+SNAPSHOT_CALLS_PER_STAGE = 3  # Chamadas de cada estágio com snapshot de alocações
+TRACEMALLOC_FRAMES = 5        # Frames guardados por alocação: mais frames acham a linha do projeto com mais frequência, mas custam mais
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+
+# Alocações atribuídas à linha mais interna deste diretório (dags, benchmarks, service)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profiling_requested(params: dict = None) -> bool:
+    """Modo ligado pelo parâmetro 'profile' da DAG ou por FUNDAMENTUS_PROFILE (1/true/yes/on)."""
+    if (params or {}).get('profile'):
+        return True
+    return os.environ.get(PROFILE_ENV_VAR, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+
+
+def _format_bytes(size: int) -> str:
+    if abs(size) < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / (1024 * 1024):.1f} MiB"
+
+
+class StageProfiler:
+    """
+    Perfis de CPU e memória por estágio de uma tarefa. Os estágios podem rodar em threads diferentes
+    (ex: carga em micro-lotes); um estágio aninhado em outro da mesma thread entra no perfil de CPU do
+    estágio de fora, e as medidas de memória contam tudo o que o processo alocou desde o início do
+    estágio mais externo em andamento.
+    """
+
+    def __init__(self, name: str, run_id: str, profile_dir: str = PROFILE_DIR):
+        self.path = os.path.join(profile_dir, f"{_safe_name(name)}_{run_id}")
+        os.makedirs(self.path, exist_ok=True)
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.stages = {}
+        self._profiles = {}
+        self._allocations = {}
+        self._active = {} # Thread -> cProfile ativo nela
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._parse_calls = 0
+        self._parse_stats = None
+        self.parse_samples = 0
+        self._closed = False
+        logging.info(f"  Modo de perfilamento ativo: arquivos em '{self.path}'.")
+
+    # --- Estágios ---
+    def _record_allocations(self, name: str, snapshot) -> None:
+        """Soma, por local de alocação e linha do projeto de origem, a memória ainda em uso no snapshot."""
+        allocations = self._allocations.setdefault(name, {})
+        for stat in snapshot.statistics("traceback"):
+            frames = stat.traceback # Do frame mais antigo para o mais recente
+            site = frames[-1]
+            # Sem linha do projeto entre os frames guardados, fica o frame mais antigo (o mais perto dela)
+            origin = next((frame for frame in reversed(frames) if frame.filename.startswith(_PROJECT_ROOT)), frames[0])
+            key = (f"{site.filename}:{site.lineno}", f"{origin.filename}:{origin.lineno}")
+            totals = allocations.setdefault(key, [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Perfil de CPU e de memória de um estágio. Nos estágios mais externos, os rastros do tracemalloc
+        são zerados no início: o snapshot do final só tem o que foi alocado no estágio e continua em uso
+        (um snapshot do processo inteiro levaria segundos), e o pico é medido a partir do início do estágio.
+        """
+        thread = threading.get_ident()
+        with self._lock:
+            entry = self.stages.setdefault(name, {"calls": 0, "cpu_profiled_calls": 0, "peak_bytes": 0, "net_bytes": 0})
+            entry["calls"] += 1
+            outermost = self._depth == 0
+            snapshot_call = outermost and entry["calls"] <= SNAPSHOT_CALLS_PER_STAGE
+            if outermost:
+                tracemalloc.clear_traces() # Também zera o pico
+            self._depth += 1
+            profile = None
+            if thread not in self._active: # Aninhado: o tempo de CPU fica no estágio de fora
+                profile = self._profiles.setdefault(name, cProfile.Profile())
+                if profile in self._active.values(): # Mesmo estágio em outra thread agora
+                    profile = None
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        if profile is not None:
+            try:
+                profile.enable()
+                self._active[thread] = profile
+            except ValueError: # Outro perfilador ativo no processo (ex: Python 3.12+, um por vez)
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._active.pop(thread, None)
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot() if snapshot_call else None
+            with self._lock:
+                self._depth -= 1
+                entry["cpu_profiled_calls"] += profile is not None
+                entry["peak_bytes"] = max(entry["peak_bytes"], peak_bytes - start_bytes)
+                entry["net_bytes"] += current_bytes - start_bytes
+                if snapshot is not None:
+                    self._record_allocations(name, snapshot)
+
+    # --- Parsing por ticker (amostrado) ---
+    def sample_parse(self) -> bool:
+        """True para 1 de cada PARSE_SAMPLE_EVERY páginas, até MAX_PARSE_SAMPLES perfis por execução."""
+        with self._lock:
+            self._parse_calls += 1
+            return (self._parse_calls - 1) % PARSE_SAMPLE_EVERY == 0 and self.parse_samples < MAX_PARSE_SAMPLES
+
+    def profile_call(self, label: str, func, *args):
+        """
+        Executa func(*args) sob um cProfile próprio (o do estágio da thread fica pausado) e grava
+        parse/<label>.prof. Devolve (resultado, segundos), como fundamentus_metrics.timed_call.
+        """
+        thread = threading.get_ident()
+        outer = self._active.get(thread)
+        if outer is not None:
+            outer.disable()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None
+            try:
+                result = func(*args)
+            finally:
+                if profile is not None:
+                    profile.disable()
+        finally:
+            seconds = time.perf_counter() - start
+            if outer is not None:
+                outer.enable()
+        if profile is not None:
+            os.makedirs(os.path.join(self.path, "parse"), exist_ok=True)
+            profile.dump_stats(os.path.join(self.path, "parse", f"{_safe_name(label)}.prof"))
+            with self._lock:
+                if self._parse_stats is None:
+                    self._parse_stats = pstats.Stats(profile)
+                else:
+                    self._parse_stats.add(profile)
+                self.parse_samples += 1
+        return result, seconds
+
+    # --- Arquivos ---
+    @staticmethod
+    def _cpu_report(stats: pstats.Stats) -> str:
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return buffer.getvalue()
+
+    def _top_allocations(self, name: str) -> list:
+        sites = sorted(self._allocations.get(name, {}).items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            {"site": site, "origin": origin, "size_bytes": size, "count": count}
+            for (site, origin), (size, count) in sites[:TOP_ALLOCATIONS]
+        ]
+
+    def _write_stage(self, name: str, entry: dict) -> None:
+        base = os.path.join(self.path, _safe_name(name))
+        profile = self._profiles.get(name)
+        if profile is not None and entry["cpu_profiled_calls"]:
+            profile.dump_stats(f"{base}.prof")
+            with open(f"{base}.cpu.txt", "w", encoding="utf-8") as f:
+                f.write(self._cpu_report(pstats.Stats(profile)))
+        top = self._top_allocations(name)
+        entry["top_allocations"] = top
+        with open(f"{base}.memory.txt", "w", encoding="utf-8") as f:
+            f.write(
+                f"Estágio '{name}': {entry['calls']} chamadas, pico {_format_bytes(entry['peak_bytes'])} acima do início, "
+                f"saldo {_format_bytes(entry['net_bytes'])}\n"
+                f"Locais que mais alocaram (memória em uso ao final das primeiras {SNAPSHOT_CALLS_PER_STAGE} chamadas):\n"
+            )
+            for item in top:
+                f.write(f"  {_format_bytes(item['size_bytes']):>10}  {item['count']:>8} blocos  {item['site']}\n")
+                if item["origin"] != item["site"]:
+                    f.write(f"  {'':>10}  {'':>8}        origem: {item['origin']}\n")
+
+    def close(self) -> str:
+        """Grava os perfis de todos os estágios e o summary.json e desliga o tracemalloc (se foi ligado aqui)."""
+        if self._closed:
+            return self.path
+        self._closed = True
+        try:
+            for name, entry in self.stages.items():
+                self._write_stage(name, entry)
+            if self._parse_stats is not None:
+                self._parse_stats.dump_stats(os.path.join(self.path, "parse_samples.prof"))
+                with open(os.path.join(self.path, "parse_samples.cpu.txt"), "w", encoding="utf-8") as f:
+                    f.write(self._cpu_report(self._parse_stats))
+            with open(os.path.join(self.path, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(
+                    {"stages": self.stages, "parse_calls": self._parse_calls, "parse_samples": self.parse_samples},
+                    f, ensure_ascii=False, indent=2,
+                )
+            logging.info(f"  Perfis de CPU e memória gravados em '{self.path}'.")
+        except OSError as e:
+            logging.error(f"  Erro ao gravar os perfis da execução: {e}")
+        finally:
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        return self.path
@@ -0,0 +1,131 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+import fundamentus_bulk_load
+from fundamentus_parsing import normalize_string_for_comparison
+
+# --- Ranking da Fórmula Mágica (Greenblatt) ---
+# Mesma lógica da view vw_ranking_magic_formula (view_sql.sql), calculada uma vez por execução logo
+# após a transformação e gravada em uma tabela pequena (uma linha por ticker elegível e por data_execucao).
+# Assim os dashboards consultam a tabela materializada em vez de varrer todo o fundamentus_historico.
+RANKING_TABLE = "ranking_magic_formula"
+
+# Greenblatt não aplica a fórmula em bancos, seguradoras, empresas do setor público etc.
+EXCLUDED_SUBSECTORS = (
+    'Água e Saneamento', 'Incorporações', 'Construção Pesada', 'Energia Elétrica',
+    'Exploração de Imóveis', 'Gás', 'Holdings Diversificadas',
+    'Soc. Crédito e Financiamento', 'Bancos', 'Outros', 'Corretoras de Seguros',
+    'Seguradoras', 'Gestão de Recursos e Investimentos', 'Serviços Financeiros Diversos',
+    'Telecomunicações', 'Exploração de Rodovias', 'Serv.Méd.Hospit. Análises e Diagnósticos',
+)
+MIN_ROIC = 0.0              # Exclusivo: não aceitamos ROIC zero ou negativo
+MIN_EV_EBIT = 0.0           # Exclusivo: não aceitamos EV/EBIT zero ou negativo
+MIN_VOLUME = 20_000_000     # Volume médio negociado (2 meses), inclusivo
+TOP_N = 1000
+
+RANKING_COLUMNS = [
+    "ticker", "data_execucao", "hora_execucao", "tipo", "empresa", "setor", "subsetor", "data_ult_cot",
+    "cotacao", "vol_med_2m", "ev_ebit", "earnings_yield_clean", "roic_clean",
+    "rank_ey", "rank_roic", "magic_formula_rank",
+]
+
+RANKING_TABLE_DDL = """
+CREATE TABLE {table_name} (
+    [ticker] NVARCHAR(32) NOT NULL,
+    [data_execucao] DATE NOT NULL,
+    [hora_execucao] NVARCHAR(8) NULL,
+    [tipo] NVARCHAR(50) NULL,
+    [empresa] NVARCHAR(255) NULL,
+    [setor] NVARCHAR(255) NULL,
+    [subsetor] NVARCHAR(255) NULL,
+    [data_ult_cot] DATE NULL,
+    [cotacao] FLOAT NULL,
+    [vol_med_2m] FLOAT NULL,
+    [ev_ebit] FLOAT NULL,
+    [earnings_yield_clean] FLOAT NULL,
+    [roic_clean] FLOAT NULL,
+    [rank_ey] INT NOT NULL,
+    [rank_roic] INT NOT NULL,
+    [magic_formula_rank] INT NOT NULL,
+    PRIMARY KEY ([data_execucao], [ticker])
+)
+"""
+
+
+def _as_float(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Coluna como array float64 (pd.NA -> NaN), ou só NaN se a coluna não existir."""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _subsector_key(value) -> str:
+    """Subsetor comparável: sem acentos, espaços extras e maiúsculas (mesma chave do screener)."""
+    return normalize_string_for_comparison(str(value)).lower()
+
+
+def compute_magic_formula_ranking(
+        df: pd.DataFrame,
+        excluded_subsectors=EXCLUDED_SUBSECTORS,
+        min_roic: float = MIN_ROIC,
+        min_ev_ebit: float = MIN_EV_EBIT,
+        min_volume: float = MIN_VOLUME,
+        top_n: int = TOP_N
+    ) -> pd.DataFrame:
+    """
+    Calcula o ranking de um snapshot já transformado (uma execução):
+    filtra ROIC > min_roic, EV/EBIT > min_ev_ebit, volume >= min_volume e subsetores fora da lista,
+    calcula o earnings yield (1 / EV/EBIT), os ranks de ROIC e EY (RANK() decrescente: empates
+    recebem o mesmo rank) e a soma, do menor (melhor) para o maior.
+    """
+    roic = _as_float(df, "roic")
+    ev_ebit = _as_float(df, "ev_ebit")
+    volume = _as_float(df, "vol_med_2m")
+
+    # Comparações com NaN são falsas: nulos ficam de fora, como o IS NOT NULL da view
+    eligible = (roic > min_roic) & (ev_ebit > min_ev_ebit) & (volume >= min_volume)
+    # Como no NOT IN da view, subsetor nulo também fica de fora. A comparação ignora acentos, espaços
+    # e maiúsculas, como a tela magic_formula do screener: variações de grafia do site não escapam da lista
+    if "subsetor" in df.columns:
+        subsector = df["subsetor"].astype(object)
+        excluded = {_subsector_key(value) for value in excluded_subsectors}
+        keys = subsector.map(lambda value: _subsector_key(value) if pd.notna(value) else None)
+        eligible &= (subsector.notna() & ~keys.isin(excluded)).to_numpy(dtype=bool)
+    else:
+        eligible &= False
+
+    ranking = df.loc[eligible, [col for col in RANKING_COLUMNS if col in df.columns]].copy()
+    ranking["roic_clean"] = roic[eligible]
+    ranking["earnings_yield_clean"] = 1.0 / ev_ebit[eligible]
+
+    ranking["rank_roic"] = ranking["roic_clean"].rank(method="min", ascending=False).astype("int64")
+    ranking["rank_ey"] = ranking["earnings_yield_clean"].rank(method="min", ascending=False).astype("int64")
+    ranking["magic_formula_rank"] = ranking["rank_ey"] + ranking["rank_roic"]
+
+    ranking = ranking.sort_values(["magic_formula_rank", "ticker"], kind="stable").head(top_n)
+    ranking = ranking.reindex(columns=RANKING_COLUMNS).reset_index(drop=True)
+    logging.info(f"  Ranking da Fórmula Mágica: {len(ranking)} empresas elegíveis de {len(df)}.")
+    return ranking
+
+
+def save_ranking(
+        cursor,
+        ranking: pd.DataFrame,
+        table_name: str = RANKING_TABLE,
+        strategy: str = "fast_executemany",
+        batch_size: int = fundamentus_bulk_load.DEFAULT_BATCH_SIZE
+    ) -> None:
+    """
+    Grava o ranking no SQL Server (T-SQL), substituindo o das mesmas datas de execução
+    (uma nova execução no mesmo dia prevalece). Não faz commit: quem chama controla a transação.
+    """
+    cursor.execute(
+        f"IF OBJECT_ID(N'{table_name}', N'U') IS NULL " + RANKING_TABLE_DDL.format(table_name=table_name)
+    )
+    if ranking.empty:
+        return
+    for execution_date in ranking["data_execucao"].dropna().unique():
+        cursor.execute(f"DELETE FROM {table_name} WHERE [data_execucao] = ?", (str(execution_date),))
+    fundamentus_bulk_load.bulk_insert(cursor, table_name, ranking, strategy=strategy, batch_size=batch_size)
@@ -0,0 +1,166 @@
+import logging
+import math
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from fundamentus_parsing import clean_and_convert_value, column_name_for, normalize_string_for_comparison
+from fundamentus_schema import DATE_COLUMNS
+
+# --- Tabela completa do resultado.php (modo de execução 'fast') ---
+# A página resultado.php já traz, em uma única tabela, cotação, múltiplos, margens, ROIC/ROE, liquidez e
+# patrimônio de todos os tickers. No modo 'fast' essa tabela vira o snapshot (valores ainda em texto, como
+# os dos parsers do detalhes.php) e só os campos que não existem nela (tipo, empresa, setor, subsetor,
+# balanço e DRE 12m/3m) vêm do detalhes.php - e apenas para os tickers que precisam (ver select_deep_scrape).
+# Para os demais, esses campos são repetidos do snapshot anterior do histórico local.
+
+# Cabeçalho do resultado.php (normalizado por _header_key) -> coluna do snapshot (nomes APÓS clean_column_name)
+RESULT_TABLE_COLUMNS = {
+    "Cotação": "cotacao",
+    "P/L": "pl",
+    "P/VP": "pvp",
+    "PSR": "psr",
+    "Div.Yield": "div_yield",
+    "P/Ativo": "pativos",
+    "P/Cap.Giro": "pcap_giro",
+    "P/EBIT": "pebit",
+    "P/Ativ Circ.Liq": "pativ_circ_liq",
+    "EV/EBIT": "ev_ebit",
+    "EV/EBITDA": "ev_ebitda",
+    "Mrg Ebit": "marg_ebit",
+    "Mrg. Líq.": "marg_liquida",
+    "Liq. Corr.": "liquidez_corr",
+    "ROIC": "roic",
+    "ROE": "roe",
+    "Liq.2meses": "vol_med_2m",
+    "Patrim. Líq": "patrim_liq",
+    "Dív.Brut/ Patrim.": "div_br_patrim",
+    "Cresc. Rec.5a": "cres_rec_5a",
+}
+
+# Campos que só mudam com um novo balanço (ou quase nunca): repetidos do snapshot anterior quando o
+# ticker não é coletado de novo. Campos que dependem da cotação do dia (valor de mercado, oscilações,
+# mínima/máxima de 52 semanas, data da última cotação) não são repetidos: ficam vazios no modo 'fast'.
+CARRIED_COLUMNS = (
+    "tipo", "empresa", "setor", "subsetor", "ult_balanco_processado", "nro_acoes",
+    "ativo", "div_bruta", "disponibilidades", "div_liquida", "ativo_circulante", "depositos", "cart_de_credito",
+    "receita_liquida_12m", "receita_liquida_3m", "ebit_12m", "ebit_3m", "lucro_liquido_12m", "lucro_liquido_3m",
+    "result_int_financ_12m", "result_int_financ_3m", "rec_servicos_12m", "rec_servicos_3m",
+)
+
+# Colunas do resultado.php que mudam quando um novo balanço é processado: se diferirem do snapshot
+# anterior, o ticker é coletado de novo no detalhes.php
+BALANCE_FINGERPRINT_COLUMNS = ("patrim_liq",)
+
+
+def _header_key(text: str) -> str:
+    """Cabeçalho sem acentos, espaços e maiúsculas ('Dív.Brut/ Patrim.' -> 'div.brut/patrim.')."""
+    return normalize_string_for_comparison(text).replace(" ", "").lower()
+
+
+_COLUMNS_BY_HEADER = {_header_key(header): column for header, column in RESULT_TABLE_COLUMNS.items()}
+
+
+def parse_result_table(html: str) -> list:
+    """
+    Extrai todas as linhas da tabela de resultados (resultado.php): uma empresa por ticker, com
+    'Ticker' e as colunas de RESULT_TABLE_COLUMNS ainda em texto (limpas depois por fundamentus_transform).
+    Cabeçalhos desconhecidos são ignorados (e registrados no log).
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", class_="resultado")
+    if not table:
+        logging.warning("    AVISO: Tabela de resultados não encontrada na página de tickers.")
+        return []
+
+    rows = table.find_all("tr")
+    if not rows:
+        return []
+    headers = [_header_key(th.get_text(strip=True)) for th in rows[0].find_all("th")]
+    columns = [_COLUMNS_BY_HEADER.get(header) for header in headers]
+    unknown = [header for header, column in zip(headers[1:], columns[1:]) if column is None]
+    if unknown:
+        logging.warning(f"    AVISO: Colunas do resultado.php sem correspondência no snapshot: {unknown}")
+
+    companies = []
+    for row in rows[1:]: # Ignora a linha de cabeçalho
+        cells = row.find_all("td")
+        if not cells or not cells[0].find('a'): # A primeira coluna tem o link do ticker
+            continue
+        company_data = {"Ticker": cells[0].text.strip()}
+        for column, cell in zip(columns[1:], cells[1:]):
+            if column is not None:
+                company_data[column] = cell.text.strip()
+        companies.append(company_data)
+    return companies
+
+
+def _same_number(current, previous) -> bool:
+    current, previous = clean_and_convert_value(current), clean_and_convert_value(previous)
+    if pd.isna(current) or pd.isna(previous):
+        return pd.isna(current) and pd.isna(previous)
+    return math.isclose(float(current), float(previous), rel_tol=1e-6, abs_tol=1.0) # detalhes.php arredonda para reais inteiros
+
+
+def select_deep_scrape(rows: list, previous: pd.DataFrame, min_liquidity: float = 0.0) -> tuple:
+    """
+    Escolhe os tickers que precisam do detalhes.php: novos (fora do snapshot anterior), sem setor no
+    snapshot anterior, ou com novo balanço (BALANCE_FINGERPRINT_COLUMNS diferentes). Tickers com volume
+    médio (Liq.2meses) abaixo de 'min_liquidity' nunca são coletados.
+    Devolve (tickers, {motivo: quantidade}).
+    """
+    previous_rows = previous.set_index("ticker").to_dict("index") if not previous.empty else {}
+    tickers = []
+    reasons = {"new": 0, "missing_sector": 0, "new_balance": 0, "illiquid": 0}
+    for row in rows:
+        volume = clean_and_convert_value(row.get("vol_med_2m", ""))
+        if min_liquidity and (pd.isna(volume) or volume < min_liquidity):
+            reasons["illiquid"] += 1
+            continue
+        last = previous_rows.get(row["Ticker"])
+        if last is None:
+            reason = "new"
+        elif pd.isna(last.get("setor")):
+            reason = "missing_sector"
+        elif not all(_same_number(row.get(col), last.get(col)) for col in BALANCE_FINGERPRINT_COLUMNS):
+            reason = "new_balance"
+        else:
+            continue
+        reasons[reason] += 1
+        tickers.append(row["Ticker"])
+    return tickers, reasons
+
+
+def carried_fields(previous: pd.DataFrame) -> dict:
+    """
+    Campos de CARRIED_COLUMNS do snapshot anterior, por ticker. Números ficam como float (a transformação
+    aceita colunas mistas) e datas voltam ao formato do site ('DD/MM/YYYY'); nulos são omitidos.
+    """
+    columns = [col for col in CARRIED_COLUMNS if col in previous.columns]
+    if previous.empty or not columns:
+        return {}
+    values = previous[["ticker"] + columns].astype(object)
+    for col in columns:
+        if col in DATE_COLUMNS:
+            values[col] = pd.to_datetime(values[col], format='%Y-%m-%d', errors='coerce').dt.strftime('%d/%m/%Y')
+    carried = {}
+    for record in values.to_dict("records"):
+        ticker = record.pop("ticker")
+        carried[ticker] = {col: value for col, value in record.items() if not pd.isna(value)}
+    return carried
+
+
+def merge_company(row: dict, deep_company: dict = None, carried: dict = None) -> dict:
+    """
+    Empresa final do modo 'fast': campos repetidos do snapshot anterior, sobrescritos pela página
+    detalhes.php (se o ticker foi coletado de novo) e pela linha do resultado.php. Nas colunas que o
+    resultado.php tem, o valor dele prevalece: execuções 'fast' seguidas comparam sempre a mesma fonte
+    em select_deep_scrape. As chaves já são os nomes finais das colunas (o 'Ticker' continua como nos parsers).
+    """
+    company_data = {"Ticker": row["Ticker"]}
+    if carried:
+        company_data.update(carried)
+    if deep_company and len(deep_company) > 1:
+        company_data.update((column_name_for(key), value) for key, value in deep_company.items() if key != "Ticker")
+    company_data.update((key, value) for key, value in row.items() if key != "Ticker")
+    return company_data
@@ -0,0 +1,63 @@
+import re
+
+# --- Esquema declarado das colunas do snapshot (nomes APÓS clean_column_name) ---
+# Qualquer coluna que não seja texto, data ou controle de execução é numérica (float).
+# As colunas de ano das oscilações ('2020', '2021', ...) mudam com o tempo e também são numéricas.
+
+STRING_COLUMNS = (
+    "ticker",
+    "tipo",
+    "empresa",
+    "setor",
+    "subsetor",
+)
+
+# Texto com poucos valores distintos: guardados como categoria (dicionário) na memória e no Parquet
+CATEGORY_COLUMNS = (
+    "tipo",
+    "setor",
+    "subsetor",
+)
+
+DATE_COLUMNS = (
+    "data_ult_cot",
+    "ult_balanco_processado",
+)
+
+EXECUTION_COLUMNS = (
+    "data_execucao",
+    "hora_execucao",
+)
+
+# Colunas numéricas conhecidas da página detalhes.php, na ordem em que aparecem no site
+NUMERIC_COLUMNS = (
+    "cotacao", "min_52_sem", "max_52_sem", "vol_med_2m", "valor_de_mercado", "valor_da_firma", "nro_acoes",
+    "dia", "mes", "30_dias", "12_meses",
+    "pl", "lpa", "pvp", "vpa", "pebit", "marg_bruta", "psr", "marg_ebit", "pativos", "marg_liquida",
+    "pcap_giro", "ebit_ativo", "pativ_circ_liq", "roic", "div_yield", "roe", "ev_ebitda", "liquidez_corr",
+    "ev_ebit", "div_br_patrim", "cres_rec_5a", "giro_ativos",
+    "ativo", "div_bruta", "disponibilidades", "div_liquida", "ativo_circulante", "patrim_liq",
+    "depositos", "cart_de_credito",
+    "receita_liquida_12m", "receita_liquida_3m", "ebit_12m", "ebit_3m", "lucro_liquido_12m", "lucro_liquido_3m",
+    "result_int_financ_12m", "result_int_financ_3m", "rec_servicos_12m", "rec_servicos_3m",
+)
+
+YEAR_COLUMN_PATTERN = re.compile(r'\d{4}')
+
+
+def is_year_column(col: str) -> bool:
+    """Colunas de oscilação anual ('2020', '2021', ...)."""
+    return bool(YEAR_COLUMN_PATTERN.fullmatch(col)) and 1900 <= int(col) <= 2100
+
+
+def column_kind(col: str) -> str:
+    """Tipo declarado da coluna: 'string', 'category', 'date', 'execution' ou 'numeric'."""
+    if col in CATEGORY_COLUMNS:
+        return "category"
+    if col in STRING_COLUMNS:
+        return "string"
+    if col in DATE_COLUMNS:
+        return "date"
+    if col in EXECUTION_COLUMNS:
+        return "execution"
+    return "numeric"
@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import fundamentus_bulk_load
+from fundamentus_parsing import normalize_string_for_comparison
+from fundamentus_schema import column_kind
+
+# --- Screener em lote ---
+# As telas (screens) ficam em um arquivo JSON (SCREENS_FILE), não em views: cada uma tem filtros
+# declarativos e uma expressão de ranking (soma ponderada dos ranks de algumas colunas). Uma vez por
+# snapshot são montados índices sobre as colunas usadas - bitmaps por valor para setor/subsetor/tipo
+# e arrays ordenados para as colunas numéricas - e todas as telas são avaliadas em lote sobre eles;
+# um mesmo filtro usado por várias telas é calculado uma vez só. Os resultados de todas as telas vão
+# juntos para SCREENER_TABLE, na mesma transação da carga (uma linha por tela e ticker aprovado).
+SCREENS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fundamentus_screens.json")
+SCREENER_TABLE = "screener_resultados"
+
+NUMERIC_OPERATORS = (">", ">=", "<", "<=", "==", "!=", "between")
+CATEGORY_OPERATORS = ("in", "not_in", "==", "!=")
+NULL_OPERATORS = ("not_null", "is_null")
+
+SCREEN_RESULT_COLUMNS = [
+    "data_execucao", "hora_execucao", "screen", "posicao", "ticker", "setor", "subsetor", "score",
+]
+
+SCREENER_TABLE_DDL = """
+CREATE TABLE {table_name} (
+    [data_execucao] DATE NOT NULL,
+    [hora_execucao] NVARCHAR(8) NULL,
+    [screen] NVARCHAR(100) NOT NULL,
+    [posicao] INT NOT NULL,
+    [ticker] NVARCHAR(32) NOT NULL,
+    [setor] NVARCHAR(255) NULL,
+    [subsetor] NVARCHAR(255) NULL,
+    [score] FLOAT NULL,
+    PRIMARY KEY ([data_execucao], [screen], [ticker])
+)
+"""
+
+
+def _category_key(value) -> str:
+    """Valor de categoria comparável: sem acentos, espaços extras e maiúsculas."""
+    return normalize_string_for_comparison(str(value)).lower()
+
+
+def _is_category(col: str) -> bool:
+    return column_kind(col) in ("category", "string", "execution")
+
+
+# --- Configuração ---
+def _validate_filter(screen_name: str, rule: dict) -> dict:
+    if not isinstance(rule, dict) or "column" not in rule:
+        raise ValueError(f"Tela '{screen_name}': filtro sem 'column': {rule!r}")
+    op = rule.get("op")
+    if op in NULL_OPERATORS:
+        return rule
+    if _is_category(rule["column"]):
+        if op not in CATEGORY_OPERATORS:
+            raise ValueError(f"Tela '{screen_name}': operador '{op}' inválido para '{rule['column']}' (use {CATEGORY_OPERATORS}).")
+        if op in ("in", "not_in") and not isinstance(rule.get("value"), list):
+            raise ValueError(f"Tela '{screen_name}': '{op}' em '{rule['column']}' exige uma lista em 'value'.")
+    elif op not in NUMERIC_OPERATORS:
+        raise ValueError(f"Tela '{screen_name}': operador '{op}' inválido para '{rule['column']}' (use {NUMERIC_OPERATORS}).")
+    elif op == "between" and not (isinstance(rule.get("value"), list) and len(rule["value"]) == 2):
+        raise ValueError(f"Tela '{screen_name}': 'between' em '{rule['column']}' exige [mínimo, máximo].")
+    elif op != "between" and not isinstance(rule.get("value"), (int, float)):
+        raise ValueError(f"Tela '{screen_name}': '{rule['column']} {op}' exige um número em 'value'.")
+    return rule
+
+
+def load_screens(path: str = SCREENS_FILE) -> list:
+    """
+    Lê e valida as telas do arquivo JSON ({"screens": [...]}). Erros de configuração levantam
+    ValueError já na leitura, com o nome da tela; colunas ausentes no snapshot só são tratadas na avaliação.
+    """
+    with open(path, encoding="utf-8") as f:
+        screens = json.load(f).get("screens", [])
+    names = set()
+    for screen in screens:
+        name = screen.get("name")
+        if not name or name in names:
+            raise ValueError(f"Tela sem nome ou com nome repetido em '{path}': {name!r}")
+        names.add(name)
+        screen["filters"] = [_validate_filter(name, rule) for rule in screen.get("filters", [])]
+        for term in screen.setdefault("rank", []):
+            if "column" not in term:
+                raise ValueError(f"Tela '{name}': termo do ranking sem 'column': {term!r}")
+    return screens
+
+
+# --- Índices do snapshot ---
+class SortedColumnIndex:
+    """Coluna numérica ordenada (nulos de fora): filtros por limite viram buscas binárias."""
+
+    def __init__(self, values: np.ndarray):
+        self.size = len(values)
+        valid = np.flatnonzero(~np.isnan(values))
+        self.order = valid[np.argsort(values[valid], kind="stable")]
+        self.sorted = values[self.order]
+        self.not_null = np.zeros(self.size, dtype=bool)
+        self.not_null[valid] = True
+
+    def _positions(self, op: str, value) -> np.ndarray:
+        if op == "between":
+            low, high = value
+            return self.order[np.searchsorted(self.sorted, low, "left"):np.searchsorted(self.sorted, high, "right")]
+        if op in (">", ">="):
+            return self.order[np.searchsorted(self.sorted, value, "right" if op == ">" else "left"):]
+        if op in ("<", "<="):
+            return self.order[:np.searchsorted(self.sorted, value, "left" if op == "<" else "right")]
+        return self.order[np.searchsorted(self.sorted, value, "left"):np.searchsorted(self.sorted, value, "right")]
+
+    def mask(self, op: str, value) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._positions(op, value)] = True
+        if op == "!=":
+            mask = self.not_null & ~mask # Como no SQL: nulos não passam em nenhuma comparação
+        return mask
+
+
+class CategoryIndex:
+    """Um bitmap (array booleano) por valor da coluna, com os valores normalizados por _category_key."""
+
+    def __init__(self, values: pd.Series):
+        keys = values.astype(object).map(lambda value: _category_key(value) if pd.notna(value) else None)
+        codes, uniques = pd.factorize(keys)
+        self.size = len(values)
+        self.not_null = codes >= 0
+        self.bitmaps = {key: codes == code for code, key in enumerate(uniques)}
+
+    def _any(self, wanted: list) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for value in wanted:
+            bitmap = self.bitmaps.get(_category_key(value))
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def mask(self, op: str, value) -> np.ndarray:
+        wanted = value if isinstance(value, list) else [value]
+        matched = self._any(wanted)
+        if op in ("in", "=="):
+            return matched
+        return self.not_null & ~matched # Como no NOT IN da view: nulos também ficam de fora
+
+
+class ScreenIndex:
+    """
+    Índices de um snapshot, montados sob demanda (uma vez por coluna) e máscaras de filtro em cache,
+    compartilhadas entre as telas avaliadas no mesmo lote.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.size = len(self.df)
+        self._indexes = {}
+        self._masks = {}
+        self._floats = {}
+
+    def has(self, col: str) -> bool:
+        return col in self.df.columns
+
+    def values(self, col: str) -> np.ndarray:
+        if col not in self._floats:
+            self._floats[col] = pd.to_numeric(self.df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        return self._floats[col]
+
+    def index(self, col: str):
+        if col not in self._indexes:
+            self._indexes[col] = CategoryIndex(self.df[col]) if _is_category(col) else SortedColumnIndex(self.values(col))
+        return self._indexes[col]
+
+    def mask(self, rule: dict) -> np.ndarray:
+        value = rule.get("value")
+        key = (rule["column"], rule["op"], json.dumps(value, sort_keys=True, ensure_ascii=False))
+        if key not in self._masks:
+            index = self.index(rule["column"])
+            if rule["op"] == "not_null":
+                self._masks[key] = index.not_null
+            elif rule["op"] == "is_null":
+                self._masks[key] = ~index.not_null
+            else:
+                self._masks[key] = index.mask(rule["op"], value)
+        return self._masks[key]
+
+
+# --- Avaliação ---
+def _evaluate_screen(index: ScreenIndex, screen: dict) -> pd.DataFrame:
+    missing = sorted({rule["column"] for rule in screen["filters"] + screen["rank"] if not index.has(rule["column"])})
+    if missing:
+        logging.warning(f"  Screener: tela '{screen['name']}' ignorada, colunas ausentes no snapshot: {missing}")
+        return None
+
+    selected = np.ones(index.size, dtype=bool)
+    for rule in screen["filters"]:
+        selected &= index.mask(rule)
+    positions = np.flatnonzero(selected)
+
+    tickers = index.df["ticker"].to_numpy(dtype=object)[positions]
+    if screen["rank"]:
+        # Rank de cada termo entre os aprovados (empates com o menor rank, nulos por último), somados com peso
+        score = np.zeros(len(positions))
+        for term in screen["rank"]:
+            values = pd.Series(index.values(term["column"])[positions])
+            ranks = values.rank(method="min", ascending=term.get("ascending", False), na_option="bottom")
+            score += float(term.get("weight", 1.0)) * ranks.to_numpy()
+        order = np.lexsort((tickers, score)) # Score e, no empate, ticker (como no ORDER BY da view)
+    else:
+        score = np.full(len(positions), np.nan)
+        order = np.argsort(tickers, kind="stable")
+    order = order[:screen["top"]] if screen.get("top") else order
+
+    rows = index.df.iloc[positions[order]]
+    result = pd.DataFrame({
+        "data_execucao": rows["data_execucao"].astype(object).to_numpy(),
+        "hora_execucao": rows["hora_execucao"].astype(object).to_numpy() if "hora_execucao" in rows else None,
+        "screen": screen["name"],
+        "posicao": np.arange(1, len(order) + 1, dtype="int64"),
+        "ticker": tickers[order],
+        "setor": rows["setor"].astype(object).to_numpy() if "setor" in rows else None,
+        "subsetor": rows["subsetor"].astype(object).to_numpy() if "subsetor" in rows else None,
+        "score": score[order],
+    })
+    return result
+
+
+def run_screens(df: pd.DataFrame, screens: list = None) -> pd.DataFrame:
+    """
+    Avalia todas as telas (padrão: load_screens()) sobre o DataFrame final de uma execução, um snapshot
+    por data_execucao, com índices montados uma vez por snapshot. Devolve os resultados de todas as
+    telas em um único DataFrame (SCREEN_RESULT_COLUMNS), em ordem de tela e posição.
+    """
+    screens = load_screens() if screens is None else screens
+    frames = []
+    for _, part in df.groupby("data_execucao", sort=True):
+        index = ScreenIndex(part)
+        for screen in screens:
+            result = _evaluate_screen(index, screen)
+            if result is not None:
+                frames.append(result)
+        logging.info(
+            f"  Screener: {len(screens)} telas avaliadas sobre {index.size} tickers "
+            f"({len(index._indexes)} índices, {len(index._masks)} filtros distintos)."
+        )
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=SCREEN_RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[SCREEN_RESULT_COLUMNS]
+
+
+def save_screen_results(
+        cursor,
+        results: pd.DataFrame,
+        table_name: str = SCREENER_TABLE,
+        strategy: str = "fast_executemany",
+        batch_size: int = fundamentus_bulk_load.DEFAULT_BATCH_SIZE
+    ) -> None:
+    """
+    Grava os resultados de todas as telas no SQL Server (T-SQL), substituindo os das mesmas datas de
+    execução (uma nova execução no mesmo dia prevalece). Não faz commit: quem chama controla a transação.
+    """
+    cursor.execute(
+        f"IF OBJECT_ID(N'{table_name}', N'U') IS NULL " + SCREENER_TABLE_DDL.format(table_name=table_name)
+    )
+    if results.empty:
+        return
+    for execution_date in results["data_execucao"].dropna().unique():
+        cursor.execute(f"DELETE FROM {table_name} WHERE [data_execucao] = ?", (str(execution_date),))
+    fundamentus_bulk_load.bulk_insert(cursor, table_name, results, strategy=strategy, batch_size=batch_size)
@@ -0,0 +1,79 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+
+# --- Shards da coleta distribuída ---
+# A DAG divide o universo de tickers em shards, cada tarefa mapeada coleta um shard e grava as
+# empresas (valores ainda em texto, antes da transformação) em um arquivo JSON Lines comprimido;
+# a tarefa final recebe pelo XCom só os caminhos dos arquivos. A pasta data/ precisa ser visível
+# por todos os workers (no docker-compose ela é um volume compartilhado).
+SHARD_DIR = "data/shards"
+
+
+def split_into_shards(tickers: list, shard_count: int) -> list:
+    """
+    Divide os tickers em até 'shard_count' shards intercalados (ticker i vai para o shard i % n),
+    para que cada shard tenha uma mistura parecida de empresas. Nunca devolve shards vazios.
+    """
+    shard_count = max(1, min(shard_count, len(tickers)))
+    return [tickers[index::shard_count] for index in range(shard_count)] if tickers else []
+
+
+def shard_path(run_id: str, shard_index: int, base_dir: str = SHARD_DIR) -> str:
+    return os.path.join(base_dir, run_id, f"shard_{shard_index:03d}.jsonl.gz")
+
+
+class ShardWriter:
+    """
+    Grava as empresas de um shard à medida que chegam (uma linha JSON por empresa), sem acumulá-las
+    em memória. O arquivo só aparece no caminho final em close(), então uma tarefa interrompida
+    nunca deixa um shard pela metade para a tarefa final.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._tmp_path = f"{path}.tmp"
+        self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8", compresslevel=6)
+
+    def add(self, company_data: dict) -> None:
+        # Mesmo formato do cache de páginas parseadas: nulos viram None no JSON e voltam como pd.NA
+        record = {key: (None if pd.isna(value) else value) for key, value in company_data.items()}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.records += 1
+
+    def close(self) -> str:
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        logging.info(f"  Shard gravado em '{self.path}' ({self.records} empresas).")
+        return self.path
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def read_shards(paths: list):
+    """Gera as empresas de todos os shards, um arquivo por vez."""
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield {key: (pd.NA if value is None else value) for key, value in json.loads(line).items()}
+
+
+def remove_shards(paths: list) -> None:
+    """Apaga os arquivos de shard (e a pasta da execução, se ficar vazia) depois da carga."""
+    directories = set()
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        if os.path.isdir(directory) and not os.listdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
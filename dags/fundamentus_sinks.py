@@ -0,0 +1,149 @@
+import logging
+import os
+import sqlite3
+
+import pandas as pd
+
+import fundamentus_bulk_load
+
+# --- Destinos da carga (sinks) ---
+# Cada destino recebe o DataFrame final da execução e as tabelas derivadas ({tabela: DataFrame}, ex: o
+# ranking da Fórmula Mágica e os indicadores) e grava tudo em uma transação própria. Uma execução pode
+# gravar em vários destinos: não existe transação entre bancos diferentes, mas toda gravação substitui
+# os dados da mesma data_execucao, então uma nova tentativa depois de uma falha deixa todos iguais.
+# O SQL Server (SqlServerSink) fica no script principal, junto com a carga e a procedure de histórico.
+LOAD_TABLE = "carga_fundamentus"
+HISTORY_TABLE = "fundamentus_historico"
+
+# Cópia analítica local (SQLite) da tabela de carga, do histórico e das tabelas derivadas: consultas
+# de agregação sem ir ao SQL Server e testes de ponta a ponta sem banco externo.
+MIRROR_DIR = "data/mirror"
+MIRROR_FILENAME = "fundamentus.sqlite"
+MIRROR_BATCH_SIZE = 5000
+
+# Índices da cópia local, por tabela (as tabelas derivadas recebem só o de data_execucao)
+MIRROR_INDEXES = {
+    HISTORY_TABLE: (("data_execucao", "ticker"), ("ticker",), ("subsetor",)),
+}
+DEFAULT_MIRROR_INDEXES = (("data_execucao",),)
+
+
+class SnapshotSink:
+    """Interface dos destinos da carga. Também funciona como gerenciador de contexto (close() ao sair)."""
+
+    name = "sink"
+
+    def write(self, df: pd.DataFrame, derived: dict) -> dict:
+        """
+        Grava o snapshot (tabela de carga) e as tabelas derivadas em uma única transação do destino.
+        Devolve as estatísticas da carga do snapshot (como bulk_insert).
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _sql_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_numeric_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def _sqlite_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Datas (datetime64) como texto 'YYYY-MM-DD', como data_execucao; o restante vai como está."""
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    if not dates:
+        return df
+    df = df.copy(deep=False)
+    for col in dates:
+        df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df
+
+
+class EmbeddedMirrorSink(SnapshotSink):
+    """
+    Cópia local em SQLite: a tabela de carga (só a última execução), o histórico (um snapshot por
+    data_execucao, como fundamentus_historico) e as tabelas derivadas. As tabelas são criadas a partir
+    das colunas do DataFrame e ganham colunas novas com ALTER TABLE quando o site acrescenta campos.
+    """
+
+    name = "mirror"
+
+    def __init__(
+            self,
+            mirror_dir: str = MIRROR_DIR,
+            load_table: str = LOAD_TABLE,
+            history_table: str = HISTORY_TABLE,
+            batch_size: int = MIRROR_BATCH_SIZE
+        ):
+        os.makedirs(mirror_dir, exist_ok=True)
+        self.path = os.path.join(mirror_dir, MIRROR_FILENAME)
+        self.load_table = load_table
+        self.history_table = history_table
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(self.path)
+        # WAL: consultas locais podem ler a cópia enquanto uma carga está em andamento
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def _ensure_table(self, table_name: str, df: pd.DataFrame) -> None:
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info([{table_name}])")}
+        if not existing:
+            columns = ", ".join(f"[{col}] {_sql_type(df[col])}" for col in df.columns)
+            self.conn.execute(f"CREATE TABLE [{table_name}] ({columns})")
+        else:
+            for col in df.columns:
+                if col not in existing:
+                    self.conn.execute(f"ALTER TABLE [{table_name}] ADD COLUMN [{col}] {_sql_type(df[col])}")
+        for columns in MIRROR_INDEXES.get(table_name, DEFAULT_MIRROR_INDEXES):
+            if all(col in df.columns for col in columns):
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS [idx_{table_name}_{'_'.join(columns)}] "
+                    f"ON [{table_name}] ({', '.join(f'[{col}]' for col in columns)})"
+                )
+
+    def _replace_dates(self, cursor, table_name: str, df: pd.DataFrame, dates: list) -> dict:
+        self._ensure_table(table_name, df)
+        cursor.executemany(f"DELETE FROM [{table_name}] WHERE [data_execucao] = ?", [(date,) for date in dates])
+        if df.empty:
+            return {}
+        return fundamentus_bulk_load.bulk_insert(cursor, table_name, df, strategy="executemany", batch_size=self.batch_size)
+
+    def write(self, df: pd.DataFrame, derived: dict) -> dict:
+        """
+        Substitui a tabela de carga e, no histórico e nas tabelas derivadas, as datas de execução do
+        snapshot (uma nova execução no mesmo dia prevalece). Tudo em uma transação do SQLite.
+        """
+        data = _sqlite_frame(df)
+        dates = [str(date) for date in data["data_execucao"].dropna().unique()]
+        with self.conn: # Commit ao final ou rollback em caso de erro
+            cursor = self.conn.cursor()
+            try:
+                self._ensure_table(self.load_table, data)
+                cursor.execute(f"DELETE FROM [{self.load_table}]")
+                stats = fundamentus_bulk_load.bulk_insert(
+                    cursor, self.load_table, data, strategy="executemany", batch_size=self.batch_size
+                )
+                self._replace_dates(cursor, self.history_table, data, dates)
+                for table_name, frame in derived.items():
+                    self._replace_dates(cursor, table_name, _sqlite_frame(frame), dates)
+            finally:
+                cursor.close()
+        logging.info(f"  Cópia local '{self.path}' atualizada ({len(data)} registros, datas {dates}).")
+        return stats
+
+    def query(self, sql: str, params=()) -> pd.DataFrame:
+        """Consulta (SQL do SQLite) sobre a cópia local."""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,174 @@
+import glob
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from fundamentus_schema import column_kind
+
+# --- Snapshots colunares (Parquet) ---
+# Cada execução grava data/snapshots/data_execucao=YYYY-MM-DD/part-HHMMSS.parquet (compressão zstd),
+# com tipos explícitos: texto, categorias (dicionário), datas (date32) e números (float64).
+# O leitor lê apenas as colunas e as partições (datas) pedidas, sem carregar o histórico inteiro.
+SNAPSHOT_DIR = "data/snapshots"
+PARTITION_COLUMN = "data_execucao"
+COMPRESSION = "zstd"
+
+
+def _arrow_type(col: str) -> pa.DataType:
+    kind = column_kind(col)
+    if kind == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if kind in ("string", "execution"):
+        return pa.string()
+    if kind == "date":
+        return pa.date32()
+    return pa.float64()
+
+
+def snapshot_schema(columns) -> pa.Schema:
+    """Esquema Arrow explícito para as colunas do snapshot (sem a coluna de partição)."""
+    return pa.schema([pa.field(col, _arrow_type(col)) for col in columns if col != PARTITION_COLUMN])
+
+
+def _to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Converte o DataFrame final do ETL para uma tabela Arrow no esquema declarado."""
+    schema = snapshot_schema(df.columns)
+    arrays = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_date32(field.type):
+            values = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce').dt.date
+        elif pa.types.is_floating(field.type):
+            values = pd.to_numeric(values, errors='coerce').astype('float64')
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values.astype(object).where(values.notna(), None), type=pa.string()).dictionary_encode())
+            continue
+        else:
+            values = values.astype(object).where(values.notna(), None)
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def stage_snapshot(df: pd.DataFrame, base_dir: str = SNAPSHOT_DIR) -> list:
+    """
+    Grava o snapshot particionado por 'data_execucao' em arquivos temporários ('.parquet.tmp', ignorados
+    pelos leitores), sem publicá-lo. Uma nova execução no mesmo dia gera outro arquivo na mesma partição
+    (identificado pela hora da execução). Retorna a lista de (arquivo temporário, arquivo final) para
+    publish_snapshot ou discard_snapshot.
+    """
+    if df.empty or PARTITION_COLUMN not in df.columns:
+        logging.warning("  Snapshot não gravado: DataFrame vazio ou sem a coluna 'data_execucao'.")
+        return []
+
+    staged = []
+    for partition_value, part in df.groupby(PARTITION_COLUMN, sort=True):
+        partition_dir = os.path.join(base_dir, f"{PARTITION_COLUMN}={partition_value}")
+        os.makedirs(partition_dir, exist_ok=True)
+        run_suffix = str(part['hora_execucao'].iloc[0]).replace(':', '') if 'hora_execucao' in part else 'run'
+        path = os.path.join(partition_dir, f"part-{run_suffix}.parquet")
+        tmp_path = f"{path}.tmp"
+        pq.write_table(_to_arrow_table(part.drop(columns=[PARTITION_COLUMN])), tmp_path, compression=COMPRESSION)
+        staged.append((tmp_path, path))
+    return staged
+
+
+def publish_snapshot(staged: list) -> list:
+    """Publica os arquivos de stage_snapshot (os.replace: leitores nunca veem arquivo pela metade)."""
+    paths = []
+    for tmp_path, path in staged:
+        os.replace(tmp_path, path)
+        paths.append(path)
+        logging.info(f"  Snapshot colunar salvo em '{path}'.")
+    return paths
+
+
+def discard_snapshot(staged: list) -> None:
+    """Apaga os arquivos temporários de um snapshot que não será publicado (ex: a carga falhou)."""
+    for tmp_path, _ in staged:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_snapshot(df: pd.DataFrame, base_dir: str = SNAPSHOT_DIR) -> list:
+    """Grava e publica o snapshot de uma vez (ver stage_snapshot). Retorna a lista de arquivos gravados."""
+    return publish_snapshot(stage_snapshot(df, base_dir))
+
+
+def _dataset(base_dir: str) -> ds.Dataset:
+    files = sorted(glob.glob(os.path.join(base_dir, f"{PARTITION_COLUMN}=*", "*.parquet")))
+    if not files:
+        return None
+    # As colunas variam entre execuções (ex: anos das oscilações); unifica os esquemas pelos rodapés
+    unified = pa.unify_schemas([pq.read_schema(path) for path in files])
+    unified = unified.append(pa.field(PARTITION_COLUMN, pa.string()))
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive")
+    return ds.dataset(files, schema=unified, format="parquet", partitioning=partitioning, partition_base_dir=base_dir)
+
+
+def read_snapshots(
+        columns: list = None,
+        start: str = None,
+        end: str = None,
+        tickers: list = None,
+        latest_run_per_day: bool = True,
+        base_dir: str = SNAPSHOT_DIR
+    ) -> pd.DataFrame:
+    """
+    Lê os snapshots gravados entre 'start' e 'end' (datas 'YYYY-MM-DD', inclusivas), trazendo apenas
+    as colunas pedidas (mais ticker, data_execucao e hora_execucao). Só as partições do intervalo
+    são abertas. Com 'latest_run_per_day', mantém apenas a última execução de cada dia.
+    """
+    dataset = _dataset(base_dir)
+    if dataset is None:
+        return pd.DataFrame(columns=columns or [])
+
+    key_columns = ["ticker", PARTITION_COLUMN, "hora_execucao"]
+    selected = None
+    if columns is not None:
+        selected = key_columns + [col for col in columns if col not in key_columns and col in dataset.schema.names]
+
+    condition = None
+    if start:
+        condition = ds.field(PARTITION_COLUMN) >= start
+    if end:
+        condition = (ds.field(PARTITION_COLUMN) <= end) if condition is None else condition & (ds.field(PARTITION_COLUMN) <= end)
+    if tickers:
+        ticker_condition = ds.field("ticker").isin(list(tickers))
+        condition = ticker_condition if condition is None else condition & ticker_condition
+
+    df = dataset.to_table(columns=selected, filter=condition).to_pandas()
+
+    if latest_run_per_day and not df.empty:
+        last_run = df.groupby(PARTITION_COLUMN)["hora_execucao"].transform("max")
+        df = df[df["hora_execucao"] == last_run]
+    return df.sort_values([PARTITION_COLUMN, "ticker"]).reset_index(drop=True)
+
+
+def list_snapshot_dates(base_dir: str = SNAPSHOT_DIR) -> list:
+    """Datas (partições) disponíveis, em ordem crescente."""
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(
+        entry[len(prefix):] for entry in os.listdir(base_dir) if entry.startswith(prefix)
+    ) if os.path.isdir(base_dir) else []
+
+
+def latest_snapshot_path(base_dir: str = SNAPSHOT_DIR) -> str:
+    """Arquivo da última execução gravada (última partição, maior hora), sem abrir os demais; None se não houver."""
+    # Uma partição pode existir só com o arquivo temporário de uma execução ainda não publicada
+    for date in reversed(list_snapshot_dates(base_dir)):
+        files = sorted(glob.glob(os.path.join(base_dir, f"{PARTITION_COLUMN}={date}", "*.parquet")))
+        if files:
+            return files[-1]
+    return None
+
+
+def read_snapshot_file(path: str) -> pd.DataFrame:
+    """Lê um único arquivo de snapshot, devolvendo a coluna de partição (data_execucao) logo após o ticker."""
+    df = pq.read_table(path).to_pandas()
+    partition = os.path.basename(os.path.dirname(path))
+    df.insert(1 if "ticker" in df.columns else 0, PARTITION_COLUMN, partition.split("=", 1)[-1])
+    return df
@@ -0,0 +1,237 @@
+import contextlib
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+import pyodbc
+
+# --- Padrões da conexão com o SQL Server ---
+# Podem ser sobrescritos pelo campo 'extra' (JSON) da conexão do Airflow, ex:
+# {"driver": "{ODBC Driver 18 for SQL Server}", "encrypt": "yes", "trust_server_certificate": "yes",
+#  "login_timeout": 15, "query_timeout": 0, "pool_size": 2}
+DEFAULT_DRIVER = '{ODBC Driver 18 for SQL Server}'
+DEFAULT_ENCRYPT = 'yes'
+DEFAULT_TRUST_SERVER_CERTIFICATE = 'yes'
+DEFAULT_LOGIN_TIMEOUT = 15 # Segundos para abrir a conexão
+DEFAULT_QUERY_TIMEOUT = 0  # Segundos por comando (0 = sem limite)
+DEFAULT_POOL_SIZE = 2
+HEALTH_CHECK_AFTER_IDLE_SECONDS = 30 # Conexões paradas há mais tempo são testadas com SELECT 1 antes do uso
+
+# Pooling do gerenciador ODBC (entre conexões com a mesma string), além do pool deste módulo
+pyodbc.pooling = True
+
+
+class SqlServerConnectionManager:
+    """
+    Fábrica de conexões pyodbc com pool, health check e timeouts configuráveis.
+    Uma transação aberta com transaction() fica associada à thread atual: chamadas aninhadas
+    (ex: carga + procedure no mesmo processo) reutilizam a mesma conexão e só a transação
+    mais externa faz commit ou rollback.
+    """
+
+    def __init__(
+            self,
+            server: str,
+            database: str,
+            username: str = None,
+            password: str = None,
+            driver: str = DEFAULT_DRIVER,
+            trusted_connection: bool = None,
+            encrypt: str = DEFAULT_ENCRYPT,
+            trust_server_certificate: str = DEFAULT_TRUST_SERVER_CERTIFICATE,
+            login_timeout: int = DEFAULT_LOGIN_TIMEOUT,
+            query_timeout: int = DEFAULT_QUERY_TIMEOUT,
+            pool_size: int = DEFAULT_POOL_SIZE
+        ):
+        # Sem usuário e senha, usa Trusted_Connection (Autenticação Windows)
+        if trusted_connection is None:
+            trusted_connection = not (username and password)
+        if not trusted_connection and not (username and password):
+            logging.error("Para trusted_connection=False, 'username' e 'password' devem ser fornecidos.")
+            raise ValueError("Credenciais de usuário/senha SQL Server ausentes.")
+
+        self.server = server
+        self.database = database
+        self.username = username
+        self.password = password
+        self.driver = driver
+        self.trusted_connection = trusted_connection
+        self.encrypt = encrypt
+        self.trust_server_certificate = trust_server_certificate
+        self.login_timeout = int(login_timeout)
+        self.query_timeout = int(query_timeout)
+        self._pool = queue.LifoQueue(maxsize=int(pool_size))
+        self._local = threading.local()
+
+    @classmethod
+    def from_airflow_connection(cls, conn_id: str, driver: str = None) -> "SqlServerConnectionManager":
+        """
+        Cria o gerenciador a partir de uma conexão do Airflow (host, porta, schema, login, senha e extra).
+        'driver', se informado, substitui o driver do campo 'extra'.
+        """
+        from airflow.hooks.base import BaseHook # Import local: o módulo também funciona fora do Airflow
+
+        airflow_conn = BaseHook.get_connection(conn_id)
+        extra = airflow_conn.extra_dejson or {}
+        server = airflow_conn.host
+        if airflow_conn.port:
+            server = f"{server},{airflow_conn.port}"
+        return cls(
+            server=server,
+            database=airflow_conn.schema, # No Airflow, 'Schema' é usado para o nome do banco de dados
+            username=airflow_conn.login,
+            password=airflow_conn.password,
+            driver=driver or extra.get('driver', DEFAULT_DRIVER),
+            encrypt=extra.get('encrypt', DEFAULT_ENCRYPT),
+            trust_server_certificate=extra.get('trust_server_certificate', DEFAULT_TRUST_SERVER_CERTIFICATE),
+            login_timeout=extra.get('login_timeout', DEFAULT_LOGIN_TIMEOUT),
+            query_timeout=extra.get('query_timeout', DEFAULT_QUERY_TIMEOUT),
+            pool_size=extra.get('pool_size', DEFAULT_POOL_SIZE),
+        )
+
+    def pool_key(self) -> tuple:
+        """Identifica o pool compartilhado destes parâmetros sem guardar a senha em texto (só o seu SHA-256)."""
+        password_digest = hashlib.sha256(self.password.encode()).hexdigest() if self.password else None
+        return (
+            self.driver, self.server, self.database, self.trusted_connection, self.username, password_digest,
+            self.encrypt, self.trust_server_certificate, self.login_timeout, self.query_timeout,
+        )
+
+    def connection_string(self) -> str:
+        conn_str_parts = []
+        conn_str_parts.append(f'DRIVER={self.driver}')
+        conn_str_parts.append(f'SERVER={self.server}')
+        conn_str_parts.append(f'DATABASE={self.database}')
+
+        if self.trusted_connection:
+            conn_str_parts.append('Trusted_Connection=yes')
+        else:
+            conn_str_parts.append(f'UID={self.username}')
+            conn_str_parts.append(f'PWD={self.password}')
+
+        # Parâmetros de criptografia e confiança para o ODBC Driver 18
+        conn_str_parts.append(f'Encrypt={self.encrypt}')
+        conn_str_parts.append(f'TrustServerCertificate={self.trust_server_certificate}')
+        return ';'.join(conn_str_parts)
+
+    # --- Pool ---
+    def _connect(self):
+        start = time.perf_counter()
+        conn = pyodbc.connect(self.connection_string(), timeout=self.login_timeout, autocommit=False)
+        conn.timeout = self.query_timeout
+        logging.info(f"  Nova conexão pyodbc aberta em {time.perf_counter() - start:.2f}s.")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1").fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def acquire(self):
+        """Pega uma conexão do pool (testando-a se ficou parada) ou abre uma nova."""
+        while True:
+            try:
+                conn, released_at = self._pool.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - released_at < HEALTH_CHECK_AFTER_IDLE_SECONDS or self._is_healthy(conn):
+                return conn
+            logging.warning("  Conexão do pool falhou no health check e foi descartada.")
+            self._close_quietly(conn)
+
+    def release(self, conn, discard: bool = False) -> None:
+        """Devolve a conexão ao pool (ou fecha, se 'discard' ou se o pool estiver cheio)."""
+        if discard:
+            self._close_quietly(conn)
+            return
+        try:
+            self._pool.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                conn, _ = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(conn)
+
+    # --- Transações ---
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Abre (ou reaproveita, se já houver uma na thread) uma transação. A mais externa faz
+        commit ao final ou rollback em caso de erro, e devolve a conexão ao pool.
+        """
+        current = getattr(self._local, "conn", None)
+        if current is not None:
+            yield current
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                broken = True
+            raise
+        finally:
+            self._local.conn = None
+            self.release(conn, discard=broken)
+
+    def in_transaction(self) -> bool:
+        return getattr(self._local, "conn", None) is not None
+
+
+_MANAGERS = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_connection_manager(conn_id: str, driver: str = None) -> SqlServerConnectionManager:
+    """
+    Gerenciador compartilhado (um por conn_id e driver, por processo) para a conexão do Airflow.
+    Um driver diferente do configurado na conexão tem pool (e transações) próprios.
+    """
+    key = (conn_id, driver)
+    with _MANAGERS_LOCK:
+        if key not in _MANAGERS:
+            _MANAGERS[key] = SqlServerConnectionManager.from_airflow_connection(conn_id, driver=driver)
+        return _MANAGERS[key]
+
+
+def get_connection_manager_for(**connection_params) -> SqlServerConnectionManager:
+    """Gerenciador compartilhado para parâmetros explícitos (servidor, banco, credenciais...)."""
+    manager = SqlServerConnectionManager(**connection_params)
+    with _MANAGERS_LOCK:
+        return _MANAGERS.setdefault(manager.pool_key(), manager)
+
+
+@contextlib.contextmanager
+def external_transaction(conn):
+    """Transação sobre uma conexão fornecida por quem chama (ex: sqlite3 como substituto local)."""
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,104 @@
+import logging
+import queue
+import threading
+
+# --- Pipeline em micro-lotes ---
+# A coleta entrega cada empresa a add(); a cada 'batch_size' empresas um micro-lote vai para uma fila
+# limitada a 'max_pending_batches' lotes, consumida por uma thread de carga. Se a carga atrasar, a fila
+# enche e a coleta espera (backpressure), então só alguns lotes brutos ficam em memória ao mesmo tempo.
+DEFAULT_BATCH_SIZE = 250
+DEFAULT_MAX_PENDING_BATCHES = 4
+
+_END = object()
+_ABORT = object()
+
+
+class PipelineAborted(RuntimeError):
+    """Levantada dentro do consumidor quando a coleta falha: a transação da carga deve ser desfeita."""
+
+
+class MicroBatchPipeline:
+    """
+    Liga um produtor (a coleta) a um consumidor que roda em uma thread própria.
+    'consume' recebe um iterador de micro-lotes (listas de registros) e devolve o resultado final;
+    toda a carga, inclusive a transação, acontece nessa thread. O iterador termina quando close()
+    é chamado ou levanta PipelineAborted quando abort() é chamado.
+    """
+
+    def __init__(self, consume, batch_size: int = DEFAULT_BATCH_SIZE, max_pending_batches: int = DEFAULT_MAX_PENDING_BATCHES):
+        self.consume = consume
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_pending_batches)
+        self._buffer = []
+        self._result = None
+        self._error = None
+        self._finished = False # O consumidor já recebeu _END ou _ABORT (nada mais chega pela fila)
+        self.records = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="fundamentus-loader", daemon=True)
+
+    def start(self) -> "MicroBatchPipeline":
+        self._thread.start()
+        return self
+
+    def _batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is _END:
+                self._finished = True
+                return
+            if batch is _ABORT:
+                self._finished = True
+                raise PipelineAborted("Coleta interrompida; a carga parcial será desfeita.")
+            yield batch
+
+    def _run(self):
+        try:
+            self._result = self.consume(self._batches())
+        except BaseException as exc:
+            self._error = exc
+            # Esvazia a fila para não travar o produtor enquanto ele não percebe o erro. Se o sinal de
+            # fim ou de interrupção já foi lido (ex: falha na procedure ou no commit depois do último
+            # lote), não há mais nada a esperar.
+            while not self._finished and self._queue.get() not in (_END, _ABORT):
+                pass
+
+    def _put(self, item) -> None:
+        while True:
+            if self._error is not None and item is not _END and item is not _ABORT:
+                raise RuntimeError(f"Carga em micro-lotes falhou: {self._error}") from self._error
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def add(self, record) -> None:
+        """Adiciona um registro; envia um micro-lote quando o buffer atinge 'batch_size'."""
+        self._buffer.append(record)
+        self.records += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            self._put(batch)
+            self.batches += 1
+
+    def close(self):
+        """Envia o último lote, espera a carga terminar e devolve o resultado de 'consume'."""
+        self.flush()
+        self._put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        logging.info(f"  Pipeline em micro-lotes concluído: {self.records} registros em {self.batches} lotes.")
+        return self._result
+
+    def abort(self) -> None:
+        """Interrompe a carga (o consumidor recebe PipelineAborted e desfaz a transação)."""
+        self._buffer = []
+        if self._thread.is_alive():
+            self._put(_ABORT)
+            self._thread.join()
@@ -0,0 +1,249 @@
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from fundamentus_parsing import column_name_for
+from fundamentus_schema import CATEGORY_COLUMNS, DATE_COLUMNS, NUMERIC_COLUMNS, column_kind, is_year_column
+
+# --- Transformação vetorizada ---
+# Os parsers entregam os valores como texto (convert_values=False) e a limpeza roda aqui, coluna a coluna,
+# com os tipos declarados em fundamentus_schema:
+#   numéricos -> Float64 (nulo = pd.NA), tipo/setor/subsetor -> category,
+#   datas -> 'YYYY-MM-DD' (texto, compatível com o tipo DATE do SQL Server) ou None.
+
+# Mesmas substituições de clean_and_convert_value, na mesma ordem (o "R\$" é literal, como no original)
+NUMERIC_REPLACEMENTS = (("R\\$", ""), ("%", ""), (".", ""), (",", "."))
+NULL_DATE_MARKERS = ['-', '']
+DROPPED_COLUMNS = ['papel', '1', '2', '3', '4']
+LEADING_COLUMNS = ['ticker', 'data_execucao', 'hora_execucao']
+DEFAULT_BUILDER_CAPACITY = 1024 # Linhas pré-alocadas quando a quantidade de empresas não é conhecida
+
+
+def clean_numeric_column(values: pd.Series) -> pd.Series:
+    """
+    Versão vetorizada de clean_and_convert_value para uma coluna inteira: remove moeda,
+    porcentagem e separador de milhar, troca a vírgula decimal e converte para Float64.
+    Valores que já chegaram numéricos são mantidos; o que não converte vira pd.NA.
+    """
+    if pd.api.types.infer_dtype(values, skipna=True) in ("floating", "integer", "mixed-integer-float", "decimal", "empty"):
+        return pd.to_numeric(values, errors="coerce").astype("Float64")
+
+    text = values.str.strip() # Não-textos viram NaN aqui e são tratados abaixo
+    for old, new in NUMERIC_REPLACEMENTS:
+        text = text.str.replace(old, new, regex=False)
+    parsed = pd.to_numeric(text.str.strip(), errors="coerce").astype("Float64")
+
+    already_numeric = pd.to_numeric(values.where(text.isna()), errors="coerce").astype("Float64")
+    return parsed.fillna(already_numeric)
+
+
+def format_date_column(values: pd.Series) -> pd.Series:
+    """Converte datas 'DD/MM/YYYY' para 'YYYY-MM-DD'; '-', vazio e datas inválidas viram None."""
+    dates = pd.to_datetime(values.replace(NULL_DATE_MARKERS, pd.NA), format='%d/%m/%Y', errors='coerce')
+    formatted = dates.dt.strftime('%Y-%m-%d')
+    return formatted.astype(object).where(dates.notna(), None)
+
+
+def order_columns(columns) -> list:
+    """'ticker', 'data_execucao' e 'hora_execucao' primeiro, depois as demais e os anos em ordem crescente."""
+    year_columns = sorted((col for col in columns if is_year_column(col)), key=int)
+    leading = [col for col in LEADING_COLUMNS if col in columns]
+    others = [col for col in columns if col not in leading and col not in year_columns]
+    return leading + others + year_columns
+
+
+def parse_number(value) -> float:
+    """
+    clean_numeric_column para um único valor, usado pelo ColumnarBuilder na gravação de cada célula:
+    mesmas substituições, na mesma ordem; o que não converte (ou é nulo) vira NaN.
+    Os métodos .str do pandas também percorrem as células em Python (uma passada por substituição), então
+    converter na gravação custa cerca de metade de clean_numeric_column na mesma coluna e dispensa o
+    buffer de texto.
+    """
+    if value.__class__ is str:
+        text = value.strip()
+        for old, new in NUMERIC_REPLACEMENTS:
+            text = text.replace(old, new)
+        if "_" in text: # float() aceita '1_000', pd.to_numeric não
+            return math.nan
+        try:
+            return float(text)
+        except ValueError:
+            return math.nan
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+class ColumnarBuilder:
+    """
+    Monta o DataFrame de uma execução direto em colunas, sem a lista de dicionários nem o
+    pd.DataFrame(lista de dicionários), que calcula a união das chaves e infere o tipo célula a célula.
+    - Cada rótulo é resolvido uma única vez para a sua coluna (nome final e tipo do esquema declarado).
+    - Colunas numéricas (NUMERIC_COLUMNS e anos) são buffers float64 + máscara de nulos pré-alocados para
+      'capacity' linhas (dobram se faltar espaço); o valor em texto é convertido na gravação.
+    - Texto, categoria e datas ficam em buffers de objetos e passam pelo mesmo tratamento de transform_companies.
+    - Rótulos fora do esquema vão para um canal de overflow esparso ({coluna: {linha: valor}}) e entram no
+      DataFrame como colunas numéricas, como no caminho antigo; são registrados no log.
+    O DataFrame final usa os buffers sem cópia e tem as mesmas colunas, tipos e ordem de transform_companies.
+    Uso: builder = ColumnarBuilder(len(tickers)); builder.add(company_data) ...; df = builder.to_frame(ts)
+    """
+
+    def __init__(self, capacity: int = DEFAULT_BUILDER_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.rows = 0
+        self._slots = {}     # Rótulo do parser -> (coluna, tipo: 'numeric' | 'object' | 'overflow' | None)
+        self._order = []     # Colunas na ordem em que apareceram (mesma ordem do pd.DataFrame(lista))
+        self._numeric = {}   # Coluna -> (valores float64, máscara de nulos)
+        self._objects = {}   # Coluna -> valores (dtype object)
+        self._overflow = {}  # Coluna -> {linha: valor}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _resolve(self, key: str) -> tuple:
+        col = column_name_for(key)
+        kind = column_kind(col)
+        if col in DROPPED_COLUMNS or kind == "execution":
+            slot = (col, None) # Descartada (as colunas de execução são preenchidas em to_frame)
+        elif kind == "numeric":
+            slot = (col, "numeric" if col in NUMERIC_COLUMNS or is_year_column(col) else "overflow")
+        else:
+            slot = (col, "object")
+        if slot[1] is not None:
+            self._allocate(*slot)
+        self._slots[key] = slot
+        return slot
+
+    def _allocate(self, col: str, kind: str) -> None:
+        if col in self._numeric or col in self._objects or col in self._overflow:
+            return # Outro rótulo com o mesmo nome de coluna
+        self._order.append(col)
+        if kind == "numeric":
+            self._numeric[col] = (np.full(self.capacity, np.nan), np.ones(self.capacity, dtype=bool))
+        elif kind == "object":
+            self._objects[col] = np.full(self.capacity, np.nan, dtype=object) # Ausente = NaN, como no pd.DataFrame(lista)
+        else:
+            self._overflow[col] = {}
+
+    def _grow(self) -> None:
+        extra = self.capacity
+        for col, (values, mask) in self._numeric.items():
+            self._numeric[col] = (
+                np.concatenate([values, np.full(extra, np.nan)]),
+                np.concatenate([mask, np.ones(extra, dtype=bool)]),
+            )
+        for col, values in self._objects.items():
+            self._objects[col] = np.concatenate([values, np.full(extra, np.nan, dtype=object)])
+        self.capacity += extra
+
+    def add(self, company_data: dict) -> None:
+        """Grava uma empresa (dicionário de um parser, valores em texto ou já numéricos) na próxima linha."""
+        if self.rows == self.capacity:
+            self._grow()
+        row = self.rows
+        for key, value in company_data.items():
+            col, kind = self._slots.get(key) or self._resolve(key)
+            if kind is None:
+                continue
+            if kind == "numeric":
+                number = parse_number(value)
+                if number == number: # NaN continua nulo
+                    values, mask = self._numeric[col]
+                    values[row] = number
+                    mask[row] = False
+            elif kind == "object":
+                self._objects[col][row] = value
+            else:
+                self._overflow[col][row] = value
+        self.rows += 1
+
+    def _column(self, col: str):
+        """Coluna final (já com o tipo declarado) ou None se estiver totalmente vazia."""
+        n = self.rows
+        if col in self._numeric:
+            values, mask = self._numeric[col]
+            if mask[:n].all():
+                return None
+            return pd.arrays.FloatingArray(values[:n], mask[:n]) # Visões dos buffers, sem cópia
+        if col in self._objects:
+            values = pd.Series(self._objects[col][:n], copy=False)
+            kind = column_kind(col)
+            if kind == "date":
+                values = format_date_column(values)
+            elif kind == "category":
+                values = values.astype("category")
+        else:
+            sparse = self._overflow[col]
+            values = clean_numeric_column(pd.Series([sparse.get(row) for row in range(n)], dtype=object))
+        return None if values.isna().all() else values.array
+
+    def to_frame(self, execution_ts) -> pd.DataFrame:
+        """
+        DataFrame final da execução: colunas totalmente vazias removidas, data ('YYYY-MM-DD') e hora
+        ('HH:MM:SS') da execução em todas as linhas e colunas reordenadas. 'execution_ts' sem fuso.
+        """
+        if self._overflow:
+            logging.warning(f"  Rótulos fora do esquema declarado (gravados como numéricos): {sorted(self._overflow)}")
+        missing_dates = [col for col in DATE_COLUMNS if col not in self._order]
+        if missing_dates:
+            logging.warning(f"  Colunas de data {missing_dates} não encontradas no DataFrame para conversão.")
+
+        columns = {}
+        for col in self._order:
+            values = self._column(col)
+            if values is not None:
+                columns[col] = values
+        if len(columns) < len(self._order):
+            logging.info(f"  {len(self._order) - len(columns)} colunas totalmente vazias removidas.\n")
+
+        df = pd.DataFrame(columns, index=pd.RangeIndex(self.rows), copy=False)
+        df['data_execucao'] = execution_ts.strftime('%Y-%m-%d')
+        df['hora_execucao'] = execution_ts.strftime('%H:%M:%S')
+        logging.info(f"  DataFrame montado em colunas: {self.rows} empresas, {df.shape[1]} colunas.")
+        return df[order_columns(df.columns.tolist())]
+
+
+def transform_companies(companies, execution_ts) -> pd.DataFrame:
+    """
+    Monta o DataFrame final de uma execução a partir dos dicionários dos parsers (ver ColumnarBuilder):
+    renomeia as colunas, aplica o esquema declarado coluna a coluna, remove colunas
+    descartadas/vazias, adiciona data e hora da execução e reordena.
+    'execution_ts' é o datetime (sem fuso) da execução.
+    """
+    builder = ColumnarBuilder(len(companies) if hasattr(companies, "__len__") else DEFAULT_BUILDER_CAPACITY)
+    for company_data in companies:
+        builder.add(company_data)
+    return builder.to_frame(execution_ts)
+
+
+def concat_snapshots(frames: list) -> pd.DataFrame:
+    """
+    Junta DataFrames já transformados (ex: várias execuções reprocessadas) mantendo as colunas
+    categóricas como category: as categorias são unificadas antes do concat, que de outra forma
+    voltaria para object e multiplicaria o uso de memória.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    for col in CATEGORY_COLUMNS:
+        present = [frame[col] for frame in frames if col in frame.columns]
+        if not present:
+            continue
+        categories = union_categoricals(present, ignore_order=True).categories
+        for frame in frames:
+            if col in frame.columns:
+                frame[col] = frame[col].cat.set_categories(categories)
+    df = pd.concat(frames, ignore_index=True)
+    return df[order_columns(df.columns.tolist())]
+
+
+def transform_snapshots(snapshots) -> pd.DataFrame:
+    """
+    Transforma várias execuções, uma de cada vez, a partir de um iterável de (companies, execution_ts).
+    Só os dicionários de uma execução ficam em memória por vez.
+    """
+    return concat_snapshots([transform_companies(companies, execution_ts) for companies, execution_ts in snapshots])
@@ -0,0 +1,60 @@
+USE [FundamentosDB]
+GO
+
+/*
+	Ranking da Fórmula Mágica materializado.
+	A tabela é preenchida pelo ETL (fundamentus_ranking.py) a cada execução, na mesma transação da carga,
+	com os mesmos filtros e ranks da vw_ranking_magic_formula (view_sql.sql).
+	O ETL cria a tabela automaticamente se ela não existir; o CREATE abaixo é apenas referência.
+
+SELECT * FROM vw_ranking_magic_formula_materializado
+
+*/
+
+IF OBJECT_ID(N'dbo.ranking_magic_formula', N'U') IS NULL
+CREATE TABLE [dbo].[ranking_magic_formula] (
+	[ticker] NVARCHAR(32) NOT NULL,
+	[data_execucao] DATE NOT NULL,
+	[hora_execucao] NVARCHAR(8) NULL,
+	[tipo] NVARCHAR(50) NULL,
+	[empresa] NVARCHAR(255) NULL,
+	[setor] NVARCHAR(255) NULL,
+	[subsetor] NVARCHAR(255) NULL,
+	[data_ult_cot] DATE NULL,
+	[cotacao] FLOAT NULL,
+	[vol_med_2m] FLOAT NULL,
+	[ev_ebit] FLOAT NULL,
+	[earnings_yield_clean] FLOAT NULL,
+	[roic_clean] FLOAT NULL,
+	[rank_ey] INT NOT NULL,
+	[rank_roic] INT NOT NULL,
+	[magic_formula_rank] INT NOT NULL,
+	PRIMARY KEY ([data_execucao], [ticker])
+)
+GO
+
+-- Mesmas colunas da vw_ranking_magic_formula, lidas da última data da tabela pequena
+-- (busca pela chave primária, sem varrer o fundamentus_historico)
+CREATE OR ALTER VIEW [dbo].[vw_ranking_magic_formula_materializado] AS
+
+ SELECT TOP 1000
+		[ticker],
+		[data_execucao],
+		[tipo],
+		[empresa],
+		[setor],
+		[subsetor],
+		[data_ult_cot],
+		[cotacao],
+		[vol_med_2m],
+		[ev_ebit],
+		[earnings_yield_clean],
+		[roic_clean],
+		[rank_ey],
+		[rank_roic],
+		[magic_formula_rank]
+   FROM [dbo].[ranking_magic_formula]
+  WHERE [data_execucao] = (SELECT MAX([data_execucao]) FROM [dbo].[ranking_magic_formula])
+ORDER BY [magic_formula_rank] ASC --- MENOR SOMA = MELHOR
+
+GO
@@ -0,0 +1,331 @@
+"""
+Serviço de leitura do último snapshot do Fundamentus (HTTP + JSON, só biblioteca padrão).
+
+Carrega em memória o último snapshot Parquet gravado pelo ETL (data/snapshots) e o ranking da Fórmula
+Mágica calculado sobre ele (mesmas regras de vw_ranking_magic_formula), com índices por ticker, setor e
+subsetor. A versão é o arquivo do snapshot (partição, hora da execução e data de modificação): quando o
+ETL grava uma nova execução, a próxima verificação recarrega os dados e descarta as respostas em cache.
+
+    python service/read_service.py                          # http://127.0.0.1:8081, lendo data/snapshots
+    python service/read_service.py --snapshot-dir /opt/airflow/data/snapshots --host 0.0.0.0 --port 8081
+
+Rotas (GET, respostas JSON com ETag igual à versão; If-None-Match devolve 304):
+    /health                                   versão carregada, registros e estatísticas do cache
+    /tickers/PETR4                            um ticker
+    /tickers?symbols=PETR4,VALE3,ITUB4        vários tickers de uma vez (também POST /tickers com {"tickers": [...]})
+    /companies?setor=Bancos&subsetor=...      empresas de um setor e/ou subsetor
+    /ranking?top=20&setor=...                 N primeiros do ranking da Fórmula Mágica
+Todas aceitam 'fields=cotacao,pl,...' para devolver só algumas colunas (ticker sempre vem).
+"""
+import argparse
+import collections
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SERVICE_DIR), "dags"))
+
+import pandas as pd
+
+import fundamentus_ranking
+import fundamentus_snapshots
+from fundamentus_parsing import normalize_string_for_comparison
+
+# --- Configuração padrão ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8081
+VERSION_CHECK_SECONDS = 5.0  # Intervalo mínimo entre verificações de nova versão do snapshot
+RESPONSE_CACHE_SIZE = 512    # Respostas guardadas por versão (LRU)
+DEFAULT_RANKING_TOP = 20
+MAX_BATCH_TICKERS = 500      # Tickers por consulta em lote
+
+
+def _json_value(value):
+    """Valor de uma célula em JSON: nulos e NaN viram null, datas viram 'YYYY-MM-DD'."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()[:10]
+    if hasattr(value, "item"): # Escalares numpy
+        return _json_value(value.item())
+    return value
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Linhas do DataFrame como dicionários prontos para JSON (convertidos uma vez, na carga)."""
+    columns = list(df.columns)
+    return [
+        {col: _json_value(value) for col, value in zip(columns, row)}
+        for row in df.astype(object).itertuples(index=False, name=None)
+    ]
+
+
+def _group_key(value) -> str:
+    return normalize_string_for_comparison(str(value)).lower() if value is not None else ""
+
+
+class SnapshotIndex:
+    """Um snapshot carregado: linhas por ticker, posições por setor/subsetor e o ranking em ordem."""
+
+    def __init__(self, df: pd.DataFrame, version: str):
+        self.version = version
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.data_execucao = str(df["data_execucao"].iloc[0]) if len(df) else None
+        self.hora_execucao = str(df["hora_execucao"].iloc[0]) if len(df) and "hora_execucao" in df.columns else None
+        self.rows = _records(df)
+        self.by_ticker = {row["ticker"]: row for row in self.rows}
+        self.by_sector = collections.defaultdict(list)
+        self.by_subsector = collections.defaultdict(list)
+        for row in self.rows:
+            self.by_sector[_group_key(row.get("setor"))].append(row)
+            self.by_subsector[_group_key(row.get("subsetor"))].append(row)
+        ranking = fundamentus_ranking.compute_magic_formula_ranking(df) if len(df) else pd.DataFrame()
+        self.ranking = _records(ranking)
+
+
+class ReadService:
+    """
+    Dados em memória e cache de respostas. Seguro para várias threads: a troca de versão substitui o
+    índice inteiro de uma vez (as consultas em andamento terminam com o índice antigo).
+    """
+
+    def __init__(self, snapshot_dir: str = fundamentus_snapshots.SNAPSHOT_DIR, check_seconds: float = VERSION_CHECK_SECONDS):
+        self.snapshot_dir = snapshot_dir
+        self.check_seconds = check_seconds
+        self.index = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self.stats = {"reloads": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def _current_version(self):
+        path = fundamentus_snapshots.latest_snapshot_path(self.snapshot_dir)
+        if path is None:
+            return None, None
+        partition = os.path.basename(os.path.dirname(path)).split("=", 1)[-1]
+        run = os.path.splitext(os.path.basename(path))[0].replace("part-", "")
+        return path, f"{partition}_{run}_{os.stat(path).st_mtime_ns}"
+
+    def refresh(self, force: bool = False) -> SnapshotIndex:
+        """Recarrega o snapshot se houver versão nova (verificada no máximo a cada 'check_seconds')."""
+        now = time.monotonic()
+        if not force and self.index is not None and now - self._checked_at < self.check_seconds:
+            return self.index
+        with self._lock:
+            if not force and self.index is not None and now - self._checked_at < self.check_seconds:
+                return self.index # Outra thread acabou de verificar
+            self._checked_at = now
+            path, version = self._current_version()
+            if version is None or (self.index is not None and version == self.index.version):
+                return self.index
+            start = time.perf_counter()
+            index = SnapshotIndex(fundamentus_snapshots.read_snapshot_file(path), version)
+            self.index = index
+            self._cache.clear()
+            self.stats["reloads"] += 1
+            logging.info(
+                f"Snapshot '{path}' carregado (versão {version}, {len(index.rows)} tickers, "
+                f"{len(index.ranking)} no ranking) em {time.perf_counter() - start:.2f}s."
+            )
+            return index
+
+    # --- Consultas ---
+    @staticmethod
+    def _project(rows: list, fields: list) -> list:
+        if not fields:
+            return rows
+        keep = ["ticker"] + [field for field in fields if field != "ticker"]
+        return [{field: row.get(field) for field in keep} for row in rows]
+
+    def _envelope(self, index: SnapshotIndex, items: list, **extra) -> dict:
+        return dict(
+            version=index.version, data_execucao=index.data_execucao, hora_execucao=index.hora_execucao,
+            count=len(items), **extra, items=items,
+        )
+
+    def tickers(self, symbols: list, fields: list = None) -> dict:
+        index = self.refresh()
+        symbols = [symbol.strip().upper() for symbol in symbols if symbol.strip()][:MAX_BATCH_TICKERS]
+        rows = [index.by_ticker[symbol] for symbol in symbols if symbol in index.by_ticker]
+        missing = [symbol for symbol in symbols if symbol not in index.by_ticker]
+        return self._envelope(index, self._project(rows, fields), missing=missing)
+
+    def companies(self, setor: str = None, subsetor: str = None, fields: list = None) -> dict:
+        index = self.refresh()
+        rows = index.rows
+        if subsetor:
+            rows = index.by_subsector.get(_group_key(subsetor), [])
+            if setor:
+                rows = [row for row in rows if _group_key(row.get("setor")) == _group_key(setor)]
+        elif setor:
+            rows = index.by_sector.get(_group_key(setor), [])
+        return self._envelope(index, self._project(rows, fields))
+
+    def ranking(self, top: int = DEFAULT_RANKING_TOP, setor: str = None, fields: list = None) -> dict:
+        index = self.refresh()
+        rows = index.ranking
+        if setor:
+            rows = [row for row in rows if _group_key(row.get("setor")) == _group_key(setor)]
+        return self._envelope(index, self._project(rows[:max(top, 0)], fields))
+
+    def health(self) -> dict:
+        index = self.refresh()
+        return {
+            "status": "ok" if index is not None else "no_snapshot",
+            "version": index.version if index else None,
+            "data_execucao": index.data_execucao if index else None,
+            "loaded_at": index.loaded_at if index else None,
+            "tickers": len(index.rows) if index else 0,
+            "ranking": len(index.ranking) if index else 0,
+            "cache_entries": len(self._cache),
+            **self.stats,
+        }
+
+    def cached(self, key: tuple, build) -> tuple:
+        """
+        Resposta (versão, corpo JSON em bytes) do cache LRU da versão atual ou construída por 'build'.
+        Uma nova versão esvazia o cache em refresh(); a chave inclui a versão por segurança.
+        """
+        index = self.refresh()
+        version = index.version if index else None
+        key = (version,) + key
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return version, body
+        body = json.dumps(build(), ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self.stats["cache_misses"] += 1
+            self._cache[key] = body
+            while len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return version, body
+
+
+# --- HTTP ---
+def _fields(query: dict) -> tuple:
+    return tuple(field.strip() for field in ",".join(query.get("fields", [])).split(",") if field.strip())
+
+
+class ReadRequestHandler(BaseHTTPRequestHandler):
+    service: ReadService = None # Definido em make_server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: bytes = b"", version: str = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if version:
+            self.send_header("ETag", f'"{version}"')
+            self.send_header("X-Snapshot-Version", version)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+    def _respond(self, key: tuple, build) -> None:
+        if self.service.refresh() is None:
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, "Nenhum snapshot encontrado; rode o ETL primeiro.")
+            return
+        version, body = self.service.cached(key, build)
+        if self.headers.get("If-None-Match") == f'"{version}"':
+            self._send(HTTPStatus.NOT_MODIFIED, version=version)
+            return
+        self._send(HTTPStatus.OK, body, version)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        fields = _fields(query)
+        try:
+            if parts == ["health"]:
+                self._send(HTTPStatus.OK, json.dumps(self.service.health()).encode("utf-8"))
+            elif parts[:1] == ["tickers"] and len(parts) == 2:
+                symbol = parts[1].upper()
+                self._respond(("ticker", symbol, fields), lambda: self.service.tickers([symbol], list(fields)))
+            elif parts == ["tickers"]:
+                symbols = tuple(sorted({s.strip().upper() for s in ",".join(query.get("symbols", [])).split(",") if s.strip()}))
+                self._respond(("tickers", symbols, fields), lambda: self.service.tickers(list(symbols), list(fields)))
+            elif parts == ["companies"]:
+                setor, subsetor = query.get("setor", [None])[0], query.get("subsetor", [None])[0]
+                self._respond(
+                    ("companies", _group_key(setor), _group_key(subsetor), fields),
+                    lambda: self.service.companies(setor, subsetor, list(fields)),
+                )
+            elif parts == ["ranking"]:
+                top = int(query.get("top", [DEFAULT_RANKING_TOP])[0])
+                setor = query.get("setor", [None])[0]
+                self._respond(("ranking", top, _group_key(setor), fields), lambda: self.service.ranking(top, setor, list(fields)))
+            else:
+                self._error(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {url.path}")
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+    def do_POST(self) -> None:
+        """Consulta em lote: POST /tickers com {"tickers": [...], "fields": [...]} (sem cache de resposta)."""
+        if urlsplit(self.path).path.rstrip("/") != "/tickers":
+            self._error(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {self.path}")
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            symbols, fields = list(payload.get("tickers") or []), list(payload.get("fields") or [])
+        except (ValueError, AttributeError) as e:
+            self._error(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}")
+            return
+        if self.service.refresh() is None:
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, "Nenhum snapshot encontrado; rode o ETL primeiro.")
+            return
+        result = self.service.tickers(symbols, fields)
+        self._send(HTTPStatus.OK, json.dumps(result, ensure_ascii=False).encode("utf-8"), result["version"])
+
+
+def make_server(service: ReadService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Servidor HTTP (uma thread por conexão) ligado ao serviço; port=0 escolhe uma porta livre."""
+    handler = type("BoundReadRequestHandler", (ReadRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serviço de leitura do último snapshot do Fundamentus.")
+    parser.add_argument("--snapshot-dir", default=fundamentus_snapshots.SNAPSHOT_DIR, help="Pasta dos snapshots Parquet do ETL")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--check-seconds", type=float, default=VERSION_CHECK_SECONDS,
+                        help="Intervalo mínimo entre verificações de nova versão do snapshot")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = ReadService(args.snapshot_dir, args.check_seconds)
+    if service.refresh(force=True) is None:
+        logging.warning(f"Nenhum snapshot em '{args.snapshot_dir}' ainda; o serviço carrega quando o ETL gravar um.")
+    server = make_server(service, args.host, args.port)
+    logging.info(f"Serviço de leitura em http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
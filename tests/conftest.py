@@ -0,0 +1,24 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+# Os módulos do ETL ficam em dags/ (importados pelas tarefas do Airflow pelo nome, sem pacote)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAGS_DIR = os.path.join(ROOT_DIR, "dags")
+BENCHMARKS_DIR = os.path.join(ROOT_DIR, "benchmarks")
+for path in (DAGS_DIR, BENCHMARKS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def etl(monkeypatch):
+    """Script principal do ETL; sem o driver ODBC instalado, um pyodbc vazio basta (nenhum teste abre conexão)."""
+    try:
+        import pyodbc # noqa: F401
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "pyodbc", types.SimpleNamespace(Error=Exception, pooling=False))
+    return importlib.import_module("Fundamentus_WebScraping_Tratamento_CargaSQL")
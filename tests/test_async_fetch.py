@@ -0,0 +1,76 @@
+import asyncio
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fundamentus_async_fetch
+from fixtures import generate_synthetic_fixtures
+from standin_server import StandInServer
+
+
+@pytest.fixture(scope="module")
+def fixtures_dir(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("fixtures"))
+    generate_synthetic_fixtures(path, count=12, seed=3, year=2026)
+    return path
+
+
+def _detail_requests(base_url: str, tickers: list) -> list:
+    return [(ticker, f"{base_url}detalhes.php?papel={ticker}") for ticker in tickers]
+
+
+def test_fetch_all_records_raw_body_size(fixtures_dir):
+    tickers = sorted(os.path.splitext(name)[0] for name in os.listdir(os.path.join(fixtures_dir, "detalhes")))
+    with StandInServer(fixtures_dir) as server:
+        results = asyncio.run(fundamentus_async_fetch.fetch_all(
+            _detail_requests(server.base_url, tickers + ["NOPE3"]), headers={}, rate=1000, burst=100,
+        ))
+
+    by_key = {result.key: result for result in results}
+    assert set(by_key) == set(tickers) | {"NOPE3"}
+    for ticker in tickers:
+        result = by_key[ticker]
+        assert result.ok and result.status == 200 and ticker in result.text
+        assert result.size == os.path.getsize(os.path.join(fixtures_dir, "detalhes", f"{ticker}.html"))
+    assert by_key["NOPE3"].error == "HTTP 404" and not by_key["NOPE3"].ok
+    assert sum(result.size for result in results if result.ok) == server.stats["bytes"]
+
+
+def test_conditional_request_returns_empty_304(fixtures_dir):
+    ticker = sorted(os.listdir(os.path.join(fixtures_dir, "detalhes")))[0][:-len(".html")]
+    with StandInServer(fixtures_dir) as server:
+        url = f"{server.base_url}detalhes.php?papel={ticker}"
+        first, = asyncio.run(fundamentus_async_fetch.fetch_all([(ticker, url)], headers={}))
+        etag = {key.lower(): value for key, value in first.headers.items()}["etag"]
+        second, = asyncio.run(fundamentus_async_fetch.fetch_all([(ticker, url, {"If-None-Match": etag})], headers={}))
+
+    assert second.status == 304 and second.ok
+    assert second.text == "" and second.size == 0
+
+
+class _UnknownCharsetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = "Cotação".encode("ISO-8859-1")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=x-nao-existe")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_unknown_charset_falls_back_to_latin1():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _UnknownCharsetHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{httpd.server_address[1]}/detalhes.php?papel=AAAA3"
+        result, = asyncio.run(fundamentus_async_fetch.fetch_all([("AAAA3", url)], headers={}))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert result.ok and result.text == "Cotação" and result.size == 7
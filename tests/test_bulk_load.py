@@ -0,0 +1,223 @@
+import re
+import sqlite3
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fundamentus_bulk_load
+
+
+def _snapshot(date: str, time: str, cotacao: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        "ticker": ["AAAA3", "BBBB4", "CCCC3"][:len(cotacao)],
+        "data_execucao": date,
+        "hora_execucao": time,
+        "cotacao": cotacao,
+    })
+
+
+def test_bulk_insert_batches_rows_and_writes_nulls():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE carga (ticker TEXT, [30_dias] REAL, setor TEXT)")
+    df = pd.DataFrame({
+        "ticker": [f"T{i:03d}3" for i in range(7)],
+        "30_dias": [1.5, np.nan, 3.0, None, 5.0, 6.0, 7.0],
+        "setor": pd.Series(["Bancos", None, "Energia", "Bancos", pd.NA, "Energia", "Bancos"], dtype="category"),
+    })
+
+    stats = fundamentus_bulk_load.bulk_insert(conn.cursor(), "carga", df, strategy="executemany", batch_size=3)
+
+    assert stats["rows"] == 7 and stats["batches"] == 3
+    rows = conn.execute("SELECT ticker, [30_dias], setor FROM carga ORDER BY ticker").fetchall()
+    assert rows[0] == ("T0003", 1.5, "Bancos")
+    assert rows[1] == ("T0013", None, None)
+    assert rows[3][1] is None and rows[4][2] is None
+
+
+def test_bulk_insert_rejects_unknown_strategy_and_tvp_without_type():
+    conn = sqlite3.connect(":memory:")
+    df = pd.DataFrame({"ticker": ["AAAA3"]})
+    with pytest.raises(ValueError):
+        fundamentus_bulk_load.bulk_insert(conn.cursor(), "carga", df, strategy="bcp")
+    with pytest.raises(ValueError):
+        fundamentus_bulk_load.bulk_insert(conn.cursor(), "carga", df, strategy="tvp")
+
+
+def test_row_hash_ignores_execution_columns():
+    first = fundamentus_bulk_load.compute_row_hashes(_snapshot("2026-10-10", "18:00:00", [10.0, 20.0]))
+    same = fundamentus_bulk_load.compute_row_hashes(_snapshot("2026-10-11", "19:30:00", [10.0, 20.0]))
+    moved = fundamentus_bulk_load.compute_row_hashes(_snapshot("2026-10-11", "19:30:00", [10.5, 20.0]))
+    assert first.to_dict() == same.to_dict()
+    assert moved["AAAA3"] != first["AAAA3"] and moved["BBBB4"] == first["BBBB4"]
+
+
+def test_stamp_execution_updates_unchanged_rows():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE carga (ticker TEXT, data_execucao TEXT, hora_execucao TEXT, cotacao REAL)")
+    old = _snapshot("2026-10-10", "18:00:00", [10.0, 20.0, 30.0])
+    fundamentus_bulk_load.bulk_insert(conn.cursor(), "carga", old, strategy="executemany")
+
+    # Só AAAA3 mudou: o delta grava uma linha, mas todas passam a ser da nova execução
+    new = _snapshot("2026-10-11", "19:30:00", [10.5, 20.0, 30.0])
+    conn.execute("UPDATE carga SET cotacao = 10.5, data_execucao = '2026-10-11', hora_execucao = '19:30:00' WHERE ticker = 'AAAA3'")
+    fundamentus_bulk_load.stamp_execution(conn.cursor(), "carga", new)
+
+    latest = conn.execute("SELECT COUNT(*) FROM carga WHERE data_execucao = (SELECT MAX(data_execucao) FROM carga)").fetchone()[0]
+    assert latest == 3
+    assert conn.execute("SELECT DISTINCT hora_execucao FROM carga").fetchall() == [("19:30:00",)]
+
+
+# --- Caminho SQL da carga incremental, no SQLite ---
+class TSqlCursor:
+    """
+    Cursor sqlite3 que traduz as poucas construções T-SQL da carga incremental (criação condicional,
+    SELECT TOP 0 INTO, ALTER TABLE ADD e UPDATE com JOIN) e registra os comandos executados.
+    """
+
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+        self.statements = []
+        self.fast_executemany = False
+
+    @staticmethod
+    def _translate(sql: str) -> str:
+        sql = re.sub(r"IF OBJECT_ID\(N'\w+', N'U'\) IS NULL CREATE TABLE", "CREATE TABLE IF NOT EXISTS", sql)
+        sql = re.sub(r"SELECT TOP 0 (.+) INTO (\w+) FROM (\w+)", r"CREATE TABLE \2 AS SELECT \1 FROM \3 WHERE 0", sql)
+        sql = re.sub(r"ALTER TABLE (\w+) ADD \[", r"ALTER TABLE \1 ADD COLUMN [", sql)
+        update = re.fullmatch(r"UPDATE (\w+) SET (.+) FROM (\w+) AS \1 INNER JOIN (\w+) AS (\w+) ON \1\.(\[\w+\]) = \5\.\6", sql)
+        if update:
+            alias, set_clause, table, stage, stage_alias, key = update.groups()
+            set_clause = set_clause.replace(f"{alias}.[", "[")
+            sql = f"UPDATE {table} SET {set_clause} FROM {stage} AS {stage_alias} WHERE {table}.{key} = {stage_alias}.{key}"
+        return sql
+
+    def execute(self, sql, params=()):
+        self.statements.append(sql)
+        self._cursor.execute(self._translate(sql), params)
+        return self
+
+    def executemany(self, sql, rows):
+        self.statements.append(sql)
+        self._cursor.executemany(self._translate(sql), rows)
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+
+CARGA_DDL = (
+    "CREATE TABLE carga (ticker TEXT PRIMARY KEY, setor TEXT, cotacao REAL, pl REAL, "
+    "data_execucao TEXT, hora_execucao TEXT)"
+)
+
+
+def _frame(date: str, rows: dict, columns=("setor", "cotacao", "pl")) -> pd.DataFrame:
+    df = pd.DataFrame(
+        [[ticker, *values] for ticker, values in rows.items()], columns=["ticker", "setor", "cotacao", "pl"],
+    )
+    df = df[["ticker", *columns]].copy()
+    df["data_execucao"] = date
+    df["hora_execucao"] = "18:00:00"
+    return df
+
+
+def _table(conn) -> dict:
+    return {row[0]: row[1:] for row in conn.execute("SELECT * FROM carga ORDER BY ticker")}
+
+
+def _full_load(cursor, df) -> None:
+    """O que save_to_sql_sqlserver_pyodbc faz no modo 'full', na mesma transação."""
+    cursor.execute("DELETE FROM carga")
+    fundamentus_bulk_load.bulk_insert(cursor, "carga", df, strategy="executemany")
+    fundamentus_bulk_load.write_row_hashes(cursor, "carga", df)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(CARGA_DDL)
+    return conn
+
+
+def test_incremental_upsert_inserts_updates_removes_and_keeps_hashes(conn):
+    cursor = TSqlCursor(conn)
+    first = _frame("2026-10-10", {"AAAA3": ("Bancos", 10.0, 5.0), "BBBB4": ("Energia", 20.0, 6.0), "CCCC3": ("Varejo", 30.0, 7.0)})
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", first, strategy="executemany")
+    assert summary == {"inserted": 3, "updated": 0, "unchanged": 0, "removed": 0}
+
+    # BBBB4 muda, CCCC3 sai, DDDD3 entra, AAAA3 fica igual
+    second = _frame("2026-10-11", {"AAAA3": ("Bancos", 10.0, 5.0), "BBBB4": ("Energia", 21.0, 6.0), "DDDD3": ("Saúde", 40.0, None)})
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", second, strategy="executemany")
+    assert summary == {"inserted": 1, "updated": 1, "unchanged": 1, "removed": 1}
+    assert _table(conn) == {
+        "AAAA3": ("Bancos", 10.0, 5.0, "2026-10-11", "18:00:00"),
+        "BBBB4": ("Energia", 21.0, 6.0, "2026-10-11", "18:00:00"),
+        "DDDD3": ("Saúde", 40.0, None, "2026-10-11", "18:00:00"),
+    }
+    hashes = dict(conn.execute("SELECT ticker, row_hash FROM carga_hash").fetchall())
+    expected = fundamentus_bulk_load.compute_row_hashes(second)
+    assert hashes == expected.to_dict()
+
+    # Mesmos dados de novo: nada gravado além da data/hora
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", second, strategy="executemany")
+    assert summary == {"inserted": 0, "updated": 0, "unchanged": 3, "removed": 0}
+
+
+def test_full_load_rewrites_hashes_for_a_later_incremental_run(conn):
+    cursor = TSqlCursor(conn)
+    day_one = _frame("2026-10-10", {"AAAA3": ("Bancos", 10.0, 5.0), "BBBB4": ("Energia", 20.0, 6.0)})
+    fundamentus_bulk_load.incremental_upsert(cursor, "carga", day_one, strategy="executemany")
+
+    # Carga completa com outros valores e outro conjunto de tickers
+    day_two = _frame("2026-10-11", {"AAAA3": ("Bancos", 99.0, 9.0), "CCCC3": ("Varejo", 30.0, 7.0)})
+    _full_load(cursor, day_two)
+    assert dict(conn.execute("SELECT ticker, row_hash FROM carga_hash").fetchall()) == fundamentus_bulk_load.compute_row_hashes(day_two).to_dict()
+
+    # Incremental com os valores do primeiro dia: nada pode ser pulado pelos hashes antigos
+    day_three = _frame("2026-10-12", {"AAAA3": ("Bancos", 10.0, 5.0), "BBBB4": ("Energia", 20.0, 6.0)})
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", day_three, strategy="executemany")
+    assert summary == {"inserted": 1, "updated": 1, "unchanged": 0, "removed": 1}
+    assert _table(conn) == {
+        "AAAA3": ("Bancos", 10.0, 5.0, "2026-10-12", "18:00:00"),
+        "BBBB4": ("Energia", 20.0, 6.0, "2026-10-12", "18:00:00"),
+    }
+
+
+def test_dropped_empty_column_is_hashed_and_updated_as_null(conn):
+    cursor = TSqlCursor(conn)
+    with_pl = _frame("2026-10-10", {"AAAA3": ("Bancos", 10.0, 5.0), "BBBB4": ("Energia", 20.0, None)})
+    fundamentus_bulk_load.incremental_upsert(cursor, "carga", with_pl, strategy="executemany")
+
+    # 'pl' veio totalmente vazia e foi removida pelo ColumnarBuilder: BBBB4 não mudou, AAAA3 perdeu o P/L
+    without_pl = _frame("2026-10-11", {"AAAA3": ("Bancos", 10.0, None), "BBBB4": ("Energia", 20.0, None)}, columns=("setor", "cotacao"))
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", without_pl, strategy="executemany")
+    assert summary["updated"] == 1 and summary["unchanged"] == 1
+    assert _table(conn)["AAAA3"] == ("Bancos", 10.0, None, "2026-10-11", "18:00:00")
+
+
+def test_stage_never_uses_the_tvp_strategy(conn, monkeypatch):
+    if "pyodbc" not in sys.modules:
+        try:
+            import pyodbc # noqa: F401
+        except ImportError: # Só as constantes de tipo usadas por setinputsizes
+            monkeypatch.setitem(sys.modules, "pyodbc", types.SimpleNamespace(
+                SQL_WVARCHAR=-9, SQL_DOUBLE=8, SQL_TYPE_TIMESTAMP=93,
+            ))
+    cursor = TSqlCursor(conn)
+    df = _frame("2026-10-10", {"AAAA3": ("Bancos", 10.0, 5.0)})
+    summary = fundamentus_bulk_load.incremental_upsert(cursor, "carga", df, strategy="tvp")
+    assert summary["inserted"] == 1 and cursor.fast_executemany
+    assert not any("FROM ?" in sql for sql in cursor.statements)
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+import fundamentus_metrics
+from fundamentus_checkpoint import ScrapeCheckpoint
+
+
+def test_checkpoint_round_trip_and_remove(tmp_path):
+    checkpoint = ScrapeCheckpoint("20261016_180000", str(tmp_path))
+    checkpoint.add({"Ticker": "BBBB4", "Cotação": "10,50", "Setor": pd.NA})
+    checkpoint.add({"Ticker": "AAAA3", "Cotação": "1,00"})
+    checkpoint.add({"Ticker": "AAAA3", "Cotação": "2,00"}) # Nova tentativa do mesmo ticker substitui
+    checkpoint.close()
+
+    # Outro processo (nova tentativa da tarefa) reabre o mesmo checkpoint
+    reopened = ScrapeCheckpoint("20261016_180000", str(tmp_path))
+    companies = list(reopened.companies())
+    assert len(reopened) == 2
+    assert [company["Ticker"] for company in companies] == ["AAAA3", "BBBB4"]
+    assert companies[0]["Cotação"] == "2,00" and companies[1]["Setor"] is pd.NA
+    reopened.remove()
+    assert list(tmp_path.iterdir()) == []
+
+
+class StubScraper:
+    """scrape_companies falso: os tickers de 'flaky' falham na primeira passada, os de 'broken' sempre."""
+
+    def __init__(self, flaky=(), broken=()):
+        self.flaky = set(flaky)
+        self.broken = set(broken)
+        self.passes = []
+
+    def __call__(self, tickers, archive, run_id, on_company, rate=None):
+        self.passes.append((list(tickers), rate))
+        first_pass = len(self.passes) == 1
+        for ticker in tickers:
+            if ticker in self.broken or (first_pass and ticker in self.flaky):
+                on_company({"Ticker": ticker}) # Página não obtida: só o ticker
+            else:
+                on_company({"Ticker": ticker, "Cotação": f"{len(self.passes)},00"})
+
+
+@pytest.fixture
+def retries(etl, monkeypatch, tmp_path):
+    sleeps = []
+    monkeypatch.setattr(etl.time, "sleep", sleeps.append)
+    monkeypatch.setattr(etl, "RETRY_PASSES", 2)
+    monkeypatch.setattr(etl, "RETRY_BACKOFF_SECONDS", 5.0)
+    metrics = fundamentus_metrics.start_run("teste")
+    checkpoint = ScrapeCheckpoint("execucao", str(tmp_path))
+    yield etl, sleeps, metrics, checkpoint
+    checkpoint.close()
+
+
+def test_retry_passes_with_backoff_and_missing_report(retries, monkeypatch):
+    etl, sleeps, metrics, checkpoint = retries
+    scraper = StubScraper(flaky=["BBBB4"], broken=["CCCC3"])
+    monkeypatch.setattr(etl, "scrape_companies", scraper)
+    delivered = []
+
+    missing = etl.scrape_with_retries(["AAAA3", "BBBB4", "CCCC3"], None, "execucao", delivered.append, checkpoint, rate=10.0)
+
+    # BBBB4 volta na primeira nova tentativa; CCCC3 falha nas duas, com espera crescente e metade da taxa
+    assert scraper.passes == [(["AAAA3", "BBBB4", "CCCC3"], 10.0), (["BBBB4", "CCCC3"], 5.0), (["CCCC3"], 5.0)]
+    assert sleeps == [5.0, 10.0]
+    assert missing == ["CCCC3"]
+    assert delivered == [
+        {"Ticker": "AAAA3", "Cotação": "1,00"}, {"Ticker": "BBBB4", "Cotação": "2,00"}, {"Ticker": "CCCC3"},
+    ]
+    assert [company["Ticker"] for company in checkpoint.companies()] == ["AAAA3", "BBBB4"]
+    assert metrics.counters["retried_tickers"] == 3 and metrics.counters["missing_tickers"] == 1
+    assert metrics.details["missing_tickers"] == ["CCCC3"]
+
+
+def test_resume_from_checkpoint(retries, monkeypatch):
+    etl, sleeps, metrics, checkpoint = retries
+    checkpoint.add({"Ticker": "AAAA3", "Cotação": "9,00"}) # Coletado pela tentativa anterior da tarefa
+    checkpoint.add({"Ticker": "ZZZZ3", "Cotação": "9,00"}) # Fora do universo desta execução: ignorado
+    scraper = StubScraper()
+    monkeypatch.setattr(etl, "scrape_companies", scraper)
+    delivered = []
+
+    assert etl.scrape_with_retries(["AAAA3", "BBBB4"], None, "execucao", delivered.append, checkpoint) == []
+    assert scraper.passes == [(["BBBB4"], None)] and sleeps == []
+    assert delivered == [{"Ticker": "AAAA3", "Cotação": "9,00"}, {"Ticker": "BBBB4", "Cotação": "1,00"}]
+    assert metrics.counters["resumed_tickers"] == 1 and metrics.counters["missing_tickers"] == 0
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+import fundamentus_snapshots
+from fundamentus_history import HistoryStore, rebuild_from_snapshots
+
+
+def _snapshot(data_execucao: str, rows: list, hora_execucao: str = "18:00:00") -> pd.DataFrame:
+    """rows: (ticker, subsetor, cotacao)"""
+    df = pd.DataFrame(rows, columns=["ticker", "subsetor", "cotacao"])
+    df["data_execucao"] = data_execucao
+    df["hora_execucao"] = hora_execucao
+    return df
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_snapshot_as_of_returns_the_universe_in_force(store):
+    store.append_snapshot(_snapshot("2026-10-13", [("AAAA3", "Máquinas", 9.0), ("BBBB4", "Bancos", 20.0)]))
+    store.append_snapshot(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0), ("CCCC3", None, None)]))
+
+    latest = store.snapshot()
+    assert list(latest["ticker"]) == ["AAAA3", "CCCC3"] and set(latest["data_execucao"]) == {"2026-10-15"}
+    assert latest["cotacao"].dtype == "Float64" and pd.isna(latest["cotacao"].iloc[1])
+    assert isinstance(latest["subsetor"].dtype, pd.CategoricalDtype)
+
+    # Sem snapshot na data: vale o mais recente anterior a ela
+    in_force = store.snapshot("2026-10-14")
+    assert list(in_force["ticker"]) == ["AAAA3", "BBBB4"] and list(in_force["cotacao"]) == [9.0, 20.0]
+    assert store.snapshot("2026-10-12").empty
+
+    # Nova execução no mesmo dia substitui a anterior (e continua sendo a mais recente)
+    store.append_snapshot(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 11.0)], hora_execucao="20:00:00"))
+    assert list(store.snapshot()["cotacao"]) == [11.0] and list(store.snapshot()["hora_execucao"]) == ["20:00:00"]
+    assert list(store.list_snapshots()["data_execucao"]) == ["2026-10-13", "2026-10-15"]
+
+
+def test_ticker_history_and_redate(store):
+    store.append_snapshot(pd.concat([
+        _snapshot("2026-10-13", [("AAAA3", "Máquinas", 9.0)]),
+        _snapshot("2026-10-14", [("BBBB4", "Bancos", 20.0)]),
+        _snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0)]),
+    ], ignore_index=True))
+    # Coluna nova em uma execução posterior aparece no histórico, nula nas datas antigas
+    later = _snapshot("2026-10-16", [("AAAA3", "Máquinas", 12.0)])
+    later["div_yield"] = 5.5
+    store.append_snapshot(later)
+
+    history = store.ticker_history("AAAA3")
+    assert list(history["data_execucao"]) == ["2026-10-13", "2026-10-15", "2026-10-16"]
+    assert list(history["cotacao"]) == [9.0, 10.0, 12.0]
+    assert history["div_yield"].isna().tolist() == [True, True, False]
+    assert list(store.ticker_history("AAAA3", start="2026-10-14", end="2026-10-15")["cotacao"]) == [10.0]
+    assert store.ticker_history("ZZZZ3").empty
+
+    # Corrigir a data de um snapshot altera só o catálogo
+    store.redate_snapshot("2026-10-16", "2026-10-17", "00:30:00")
+    history = store.ticker_history("AAAA3")
+    assert list(history["data_execucao"]) == ["2026-10-13", "2026-10-15", "2026-10-17"]
+    assert history["hora_execucao"].iloc[-1] == "00:30:00" and store.snapshot()["data_execucao"].iloc[0] == "2026-10-17"
+    with pytest.raises(ValueError):
+        store.redate_snapshot("2026-10-15", "2026-10-14") # Já existe um snapshot nessa data
+    with pytest.raises(ValueError):
+        store.redate_snapshot("2026-10-01")
+
+
+def test_rebuild_from_snapshots(tmp_path, store):
+    base_dir = str(tmp_path / "snapshots")
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-14", [("AAAA3", "Máquinas", 9.0)], "10:00:00"), base_dir)
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-14", [("AAAA3", "Máquinas", 9.5)], "18:00:00"), base_dir)
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0), ("BBBB4", "Bancos", 20.0)]), base_dir)
+
+    assert rebuild_from_snapshots(store, base_dir) == 2
+    catalog = store.list_snapshots()
+    assert list(catalog["data_execucao"]) == ["2026-10-14", "2026-10-15"] and list(catalog["row_count"]) == [1, 2]
+    # Só a última execução de cada dia
+    history = store.ticker_history("AAAA3")
+    assert list(history["hora_execucao"]) == ["18:00:00", "18:00:00"] and list(history["cotacao"]) == [9.5, 10.0]
+
+    # Reconstruir de novo não duplica nada
+    assert rebuild_from_snapshots(store, base_dir) == 2
+    assert len(store.list_snapshots()) == 2 and len(store.ticker_history("AAAA3")) == 2
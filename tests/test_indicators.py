@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fundamentus_indicators
+from fundamentus_indicators import IndicatorState
+
+
+def _snapshot(data_execucao: str, rows: list, hora_execucao: str = "18:00:00") -> pd.DataFrame:
+    """rows: (ticker, subsetor, cotacao, roic, ev_ebit)"""
+    df = pd.DataFrame(rows, columns=["ticker", "subsetor", "cotacao", "roic", "ev_ebit"])
+    df["data_execucao"] = data_execucao
+    df["hora_execucao"] = hora_execucao
+    df["setor"] = "Energia"
+    df["min_52_sem"] = 8.0
+    df["max_52_sem"] = 20.0
+    return df
+
+
+def _by_ticker(indicators: pd.DataFrame) -> dict:
+    return indicators.set_index("ticker").to_dict("index")
+
+
+def test_changes_against_previous_snapshot(tmp_path):
+    state = IndicatorState(str(tmp_path))
+    first = state.update(_snapshot("2026-10-14", [("AAAA3", "Elétrica", 10.0, 0.10, 5.0), ("BBBB4", "Elétrica", 0.0, 0.20, 6.0)]))
+    assert first["data_execucao_anterior"].isna().all() and first["var_cotacao"].isna().all()
+
+    second = _by_ticker(state.update(_snapshot("2026-10-15", [
+        ("AAAA3", "Elétrica", 12.0, 0.15, 4.0), ("BBBB4", "Elétrica", 5.0, 0.20, 6.0), ("CCCC3", "Elétrica", 7.0, 0.30, 8.0),
+    ])))
+    assert second["AAAA3"]["data_execucao_anterior"] == "2026-10-14"
+    assert second["AAAA3"]["var_cotacao"] == pytest.approx(0.2)
+    assert second["AAAA3"]["var_ev_ebit"] == pytest.approx(-0.2)
+    assert second["AAAA3"]["dif_roic"] == pytest.approx(0.05)   # Em pontos, não relativa
+    assert np.isnan(second["BBBB4"]["var_cotacao"])            # Anterior zero: sem variação relativa
+    assert np.isnan(second["CCCC3"]["var_cotacao"]) and np.isnan(second["CCCC3"]["dif_roic"]) # Ticker novo
+    assert second["AAAA3"]["dist_min_52_sem"] == pytest.approx(0.5) and second["AAAA3"]["dist_max_52_sem"] == pytest.approx(-0.4)
+
+    # Estado gravado e relido: a próxima execução continua de onde esta parou
+    state.save()
+    assert IndicatorState(str(tmp_path)).latest_date() == "2026-10-15"
+    assert IndicatorState(str(tmp_path), reset=True).latest_date() is None
+
+
+def test_same_day_rerun_replaces_same_day_state(tmp_path):
+    state = IndicatorState(str(tmp_path))
+    state.update(_snapshot("2026-10-14", [("AAAA3", "Elétrica", 10.0, 0.10, 5.0)]))
+    state.update(_snapshot("2026-10-15", [("AAAA3", "Elétrica", 12.0, 0.10, 5.0)], "10:00:00"))
+    rerun = _by_ticker(state.update(_snapshot("2026-10-15", [("AAAA3", "Elétrica", 15.0, 0.10, 5.0)], "18:00:00")))
+
+    # A nova execução do dia compara com o dia anterior, não com a execução da manhã
+    assert rerun["AAAA3"]["data_execucao_anterior"] == "2026-10-14"
+    assert rerun["AAAA3"]["var_cotacao"] == pytest.approx(0.5)
+    assert sorted(state.values["data_execucao"]) == ["2026-10-14", "2026-10-15"]
+    assert state.values.loc[state.values["data_execucao"] == "2026-10-15", "cotacao"].tolist() == [15.0]
+    assert (state.window["data_execucao"] == "2026-10-15").sum() == len(fundamentus_indicators.ZSCORE_COLUMNS)
+
+    # Snapshot anterior ao estado: ignorado, sem indicadores
+    assert state.update(_snapshot("2026-10-13", [("AAAA3", "Elétrica", 1.0, 0.10, 5.0)])).empty
+    assert state.latest_date() == "2026-10-15"
+
+
+def test_zscore_window_is_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(fundamentus_indicators, "ZSCORE_WINDOW", 3)
+    monkeypatch.setattr(fundamentus_indicators, "ZSCORE_MIN_OBSERVATIONS", 1)
+    state = IndicatorState(str(tmp_path))
+    for day, ev_ebit in zip(range(10, 15), (100.0, 100.0, 1.0, 2.0, 3.0)):
+        indicators = state.update(_snapshot(f"2026-10-{day}", [("AAAA3", "Elétrica", 10.0, 0.10, ev_ebit)]))
+
+    assert sorted(state.window["data_execucao"].unique()) == ["2026-10-12", "2026-10-13", "2026-10-14"]
+    # Só os 3 últimos snapshots (1, 2, 3) entram: média 2, desvio padrão sqrt(2/3)
+    assert indicators["zscore_ev_ebit_subsetor"].iloc[0] == pytest.approx(1 / np.sqrt(2 / 3))
+
+
+def test_zscore_needs_minimum_observations(tmp_path, monkeypatch):
+    monkeypatch.setattr(fundamentus_indicators, "ZSCORE_MIN_OBSERVATIONS", 5)
+    state = IndicatorState(str(tmp_path))
+    rows = [(f"E{i:03d}3", "Elétrica", 10.0, 0.10, float(i)) for i in range(5)]
+    rows += [(f"M{i:03d}3", "Mineração", 10.0, 0.10, float(i)) for i in range(4)]
+    rows += [("SEMS3", None, 10.0, 0.10, 3.0)] # Sem subsetor: fora da janela
+    indicators = _by_ticker(state.update(_snapshot("2026-10-14", rows)))
+
+    values = np.arange(5.0)
+    assert indicators["E0043"]["zscore_ev_ebit_subsetor"] == pytest.approx((4 - values.mean()) / values.std())
+    assert np.isnan(indicators["E0043"]["zscore_roic_subsetor"]) # Desvio padrão zero
+    assert all(np.isnan(indicators[f"M{i:03d}3"]["zscore_ev_ebit_subsetor"]) for i in range(4)) # Só 4 observações
+    assert np.isnan(indicators["SEMS3"]["zscore_ev_ebit_subsetor"])
+
+    # O snapshot seguinte soma as observações da janela: o subsetor com 4 passa a ter 8
+    indicators = _by_ticker(state.update(_snapshot("2026-10-15", rows)))
+    assert not np.isnan(indicators["M0003"]["zscore_ev_ebit_subsetor"])
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+
+import pytest
+
+import fundamentus_metrics
+
+
+def test_latency_histogram():
+    histogram = fundamentus_metrics.LatencyHistogram(buckets=(0.1, 1.0))
+    assert histogram.quantile(0.5) is None
+    for i, seconds in enumerate([0.05, 0.1, 0.5, 0.7, 3.0]):
+        histogram.observe(seconds, f"T{i}")
+
+    assert histogram.counts == [2, 2, 1] # <= 0.1, <= 1.0 e acima do maior limite
+    assert histogram.quantile(0.4) == 0.1 and histogram.quantile(0.8) == 1.0
+    assert histogram.quantile(1.0) == 3.0 # Última faixa: o máximo observado
+
+    data = histogram.to_dict()
+    assert data["count"] == 5 and data["max_seconds"] == 3.0 and data["mean_seconds"] == pytest.approx(0.87)
+    assert data["buckets"] == {"le_0.1": 2, "le_1": 2, "le_inf": 1}
+    assert [item["ticker"] for item in data["slowest"]][:2] == ["T4", "T3"]
+
+
+def test_histogram_keeps_only_slowest_tickers():
+    histogram = fundamentus_metrics.LatencyHistogram()
+    for i in range(fundamentus_metrics.SLOWEST_TICKERS * 3):
+        histogram.observe(i / 100, f"T{i:03d}")
+    slowest = histogram.to_dict()["slowest"]
+    assert len(slowest) == fundamentus_metrics.SLOWEST_TICKERS
+    assert slowest[0]["ticker"] == f"T{fundamentus_metrics.SLOWEST_TICKERS * 3 - 1:03d}"
+
+
+def test_stages_accumulate_and_counters_are_thread_safe():
+    metrics = fundamentus_metrics.RunMetrics("teste")
+    for _ in range(3):
+        with metrics.stage("load"):
+            pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage("transform"): # Estágio que falha também é medido
+            raise RuntimeError("falhou")
+
+    threads = [threading.Thread(target=lambda: [metrics.increment("rows") for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.record_fetch("AAAA3", 200, 0.2, 100)
+    metrics.record_fetch("BBBB4", None, 5.0, 0)
+    metrics.record_load({"inserted": 2, "updated": 3})
+
+    data = metrics.to_dict()
+    assert data["stages"]["load"]["calls"] == 3 and data["stages"]["transform"]["calls"] == 1
+    assert data["counters"] == {"rows": 4000, "bytes_downloaded": 100, "rows_written": 5}
+    assert data["http_status"] == {"200": 1, "error": 1}
+    assert data["histograms"]["fetch_seconds"]["count"] == 2
+
+
+class FakeTaskInstance:
+    def __init__(self):
+        self.xcom = {}
+
+    def xcom_push(self, key, value):
+        self.xcom[key] = value
+
+
+def test_export_writes_file_history_and_xcom(tmp_path):
+    metrics = fundamentus_metrics.RunMetrics("etl_fundamentus")
+    metrics.observe("parse_seconds", 0.01, "AAAA3")
+    metrics.note("missing_tickers", ["BBBB4"])
+    ti = FakeTaskInstance()
+
+    path = metrics.export("20261016_180000", metrics_dir=str(tmp_path), ti=ti)
+    metrics.export("20261017_180000", metrics_dir=str(tmp_path))
+
+    assert path == os.path.join(str(tmp_path), "etl_fundamentus_20261016_180000.json")
+    with open(path, encoding="utf-8") as f:
+        full = json.load(f)
+    assert full["run_id"] == "20261016_180000" and "buckets" in full["histograms"]["parse_seconds"]
+    with open(os.path.join(str(tmp_path), fundamentus_metrics.METRICS_HISTORY_FILE), encoding="utf-8") as f:
+        history = [json.loads(line) for line in f]
+    assert [run["run_id"] for run in history] == ["20261016_180000", "20261017_180000"]
+    # Resumo (XCom e histórico) sem as faixas dos histogramas
+    assert ti.xcom["metrics"]["details"] == {"missing_tickers": ["BBBB4"]}
+    assert "buckets" not in ti.xcom["metrics"]["histograms"]["parse_seconds"]
+
+
+def test_export_failure_does_not_raise(tmp_path):
+    blocked = tmp_path / "arquivo"
+    blocked.write_text("não é uma pasta")
+    assert fundamentus_metrics.RunMetrics().export("20261016_180000", metrics_dir=str(blocked)) is None
+
+
+@pytest.fixture
+def etl_run(etl, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path) # Métricas em data/metrics da pasta temporária
+    monkeypatch.setattr(etl, "HTML_ARCHIVE_ENABLED", False)
+    monkeypatch.setattr(etl, "CHECKPOINT_ENABLED", False)
+    metrics_dir = tmp_path / fundamentus_metrics.METRICS_DIR
+
+    def exported():
+        with open(metrics_dir / fundamentus_metrics.METRICS_HISTORY_FILE, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    return etl, exported
+
+
+def test_etl_exports_metrics_on_early_return(etl_run, monkeypatch):
+    etl, exported = etl_run
+    monkeypatch.setattr(etl, "get_all_tickers", lambda archive, run_id: [])
+    ti = FakeTaskInstance()
+    assert etl.etl_fundamentus_data(ti=ti).empty
+    assert [run["name"] for run in exported()] == ["etl_fundamentus"] and "metrics" in ti.xcom
+
+
+def test_etl_exports_metrics_on_failure(etl_run, monkeypatch):
+    etl, exported = etl_run
+
+    def get_all_tickers(archive, run_id):
+        fundamentus_metrics.current().increment("tickers", 3)
+        raise RuntimeError("resultado.php fora do ar")
+
+    monkeypatch.setattr(etl, "get_all_tickers", get_all_tickers)
+    with pytest.raises(RuntimeError):
+        etl.etl_fundamentus_data()
+    assert exported()[-1]["counters"] == {"tickers": 3}
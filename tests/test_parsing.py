@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import fundamentus_parsing
+from fixtures import ENCODING, generate_synthetic_fixtures, load_manifest
+
+# Página que o site devolve para um ticker inexistente ou fora do ar: sem nenhum rótulo
+FAILED_PAGE = "<html><body><h1>Nenhum papel encontrado</h1><table><tr><td>Erro</td></tr></table></body></html>"
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    fixtures_dir = str(tmp_path_factory.mktemp("fixtures"))
+    manifest = generate_synthetic_fixtures(fixtures_dir, count=80, seed=7, year=2026)
+    assert load_manifest(fixtures_dir)["tickers"] == manifest["tickers"]
+    pages = []
+    for ticker in manifest["tickers"]:
+        with open(os.path.join(fixtures_dir, "detalhes", f"{ticker}.html"), "rb") as f:
+            pages.append((ticker, f.read().decode(ENCODING)))
+    return pages
+
+
+@pytest.mark.parametrize("convert_values", [False, True])
+def test_fast_parser_matches_bs4_on_fixture_corpus(corpus, convert_values):
+    mismatches = [
+        ticker for ticker, html in corpus
+        if fundamentus_parsing.parse_company_page_fast(ticker, html, convert_values)
+        != fundamentus_parsing.parse_company_page_bs4(ticker, html, convert_values)
+    ]
+    assert not mismatches
+
+
+def test_corpus_pages_are_not_empty(corpus):
+    ticker, html = corpus[0]
+    company = fundamentus_parsing.parse_company_page(ticker, html, "fast", False)
+    assert company["Ticker"] == ticker
+    assert len(company) > 20
+
+
+def test_failed_page_gives_same_ticker_only_stub():
+    expected = {"Ticker": "ZZZZ3"}
+    assert fundamentus_parsing.parse_company_page_bs4("ZZZZ3", FAILED_PAGE, False) == expected
+    assert fundamentus_parsing.parse_company_page_fast("ZZZZ3", FAILED_PAGE, False) == expected
+    for parser in ("fast", "bs4"):
+        assert fundamentus_parsing.parse_company_page("ZZZZ3", FAILED_PAGE, parser, False) == expected
@@ -0,0 +1,102 @@
+import json
+import os
+import pstats
+import tracemalloc
+
+import pytest
+
+import fundamentus_profiling
+from fundamentus_metrics import RunMetrics
+from fundamentus_profiling import StageProfiler
+
+
+def _allocate(count: int) -> list:
+    return [str(i) * 10 for i in range(count)]
+
+
+def _parse(ticker: str, html: str) -> dict:
+    return {"ticker": ticker, "size": len(html)}
+
+
+@pytest.fixture(autouse=True)
+def _no_tracing():
+    # O profiler só desliga o tracemalloc se foi ele quem ligou
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    yield
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_stage_profiles_and_summary_are_written(tmp_path):
+    profiler = StageProfiler("scrape task", "manual__2026-10-15", profile_dir=str(tmp_path))
+    assert tracemalloc.is_tracing()
+    assert profiler.path == os.path.join(str(tmp_path), "scrape_task_manual__2026-10-15")
+
+    metrics = RunMetrics(profiler=profiler)
+    kept = []
+    for _ in range(2):
+        with metrics.stage("transform"):
+            kept.append(_allocate(20_000))
+            with metrics.stage("parse"): # Aninhado: a CPU fica no perfil do estágio de fora
+                _allocate(100)
+    assert metrics.stages["transform"]["calls"] == 2 and metrics.details["profile_dir"] == profiler.path
+
+    assert profiler.close() == profiler.path
+    assert not tracemalloc.is_tracing()
+
+    with open(os.path.join(profiler.path, "summary.json"), encoding="utf-8") as f:
+        summary = json.load(f)
+    transform = summary["stages"]["transform"]
+    assert transform["calls"] == 2 and transform["cpu_profiled_calls"] == 2
+    assert transform["peak_bytes"] > 0 and transform["net_bytes"] > 0
+    assert any(item["origin"].endswith(f"test_profiling.py:{_allocate.__code__.co_firstlineno + 1}")
+               for item in transform["top_allocations"])
+    assert summary["stages"]["parse"]["calls"] == 2 and summary["stages"]["parse"]["cpu_profiled_calls"] == 0
+
+    stats = pstats.Stats(os.path.join(profiler.path, "transform.prof"))
+    assert any(func[2] == "_allocate" for func in stats.stats)
+    assert os.path.exists(os.path.join(profiler.path, "transform.cpu.txt"))
+    assert os.path.exists(os.path.join(profiler.path, "transform.memory.txt"))
+    assert not os.path.exists(os.path.join(profiler.path, "parse.prof")) # Sem chamadas com CPU própria
+
+    # Fechar de novo não regrava nada nem mexe no tracemalloc
+    tracemalloc.start()
+    profiler.close()
+    assert tracemalloc.is_tracing()
+
+
+def test_parse_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(fundamentus_profiling, "PARSE_SAMPLE_EVERY", 3)
+    monkeypatch.setattr(fundamentus_profiling, "MAX_PARSE_SAMPLES", 2)
+    profiler = StageProfiler("etl", "run1", profile_dir=str(tmp_path))
+
+    sampled = []
+    with profiler.stage("scrape"):
+        for i in range(10):
+            ticker = f"T{i:03d}3"
+            if profiler.sample_parse():
+                result, seconds = profiler.profile_call(ticker, _parse, ticker, "<html>")
+                assert result == {"ticker": ticker, "size": 6} and seconds >= 0
+                sampled.append(ticker)
+    # 1 a cada 3 páginas (0, 3, 6, 9), até o máximo de 2 perfis
+    assert sampled == ["T0003", "T0033"]
+    profiler.close()
+
+    assert sorted(os.listdir(os.path.join(profiler.path, "parse"))) == ["T0003.prof", "T0033.prof"]
+    stats = pstats.Stats(os.path.join(profiler.path, "parse_samples.prof"))
+    assert any(func[2] == "_parse" for func in stats.stats)
+    # O parse amostrado não entra no perfil do estágio em andamento
+    assert not any(func[2] == "_parse" for func in pstats.Stats(os.path.join(profiler.path, "scrape.prof")).stats)
+    with open(os.path.join(profiler.path, "summary.json"), encoding="utf-8") as f:
+        summary = json.load(f)
+    assert summary["parse_calls"] == 10 and summary["parse_samples"] == 2
+
+
+def test_tracemalloc_started_elsewhere_is_left_running(tmp_path):
+    tracemalloc.start()
+    profiler = StageProfiler("etl", "run1", profile_dir=str(tmp_path))
+    with profiler.stage("load"):
+        _allocate(10)
+    profiler.close()
+    assert tracemalloc.is_tracing()
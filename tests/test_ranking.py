@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from fundamentus_ranking import RANKING_COLUMNS, compute_magic_formula_ranking
+
+
+def _snapshot(rows: list) -> pd.DataFrame:
+    """rows: (ticker, subsetor, roic, ev_ebit, vol_med_2m)"""
+    df = pd.DataFrame(rows, columns=["ticker", "subsetor", "roic", "ev_ebit", "vol_med_2m"])
+    df["data_execucao"] = "2026-10-15"
+    df["hora_execucao"] = "18:00:00"
+    df["setor"] = "Diversos"
+    return df
+
+
+def _by_ticker(ranking: pd.DataFrame) -> dict:
+    return ranking.set_index("ticker").to_dict("index")
+
+
+def test_ties_share_the_same_rank():
+    ranking = compute_magic_formula_ranking(_snapshot([
+        ("AAAA3", "Máquinas", 0.30, 4.0, 30e6),
+        ("BBBB3", "Máquinas", 0.30, 5.0, 30e6),   # Empata com AAAA3 no ROIC
+        ("CCCC3", "Máquinas", 0.20, 4.0, 30e6),   # Empata com AAAA3 no EV/EBIT
+        ("DDDD3", "Máquinas", 0.10, 8.0, 30e6),
+    ]))
+    rows = _by_ticker(ranking)
+
+    # RANK(): empates recebem o mesmo rank e o seguinte pula posições
+    assert [rows[t]["rank_roic"] for t in ("AAAA3", "BBBB3", "CCCC3", "DDDD3")] == [1, 1, 3, 4]
+    assert [rows[t]["rank_ey"] for t in ("AAAA3", "BBBB3", "CCCC3", "DDDD3")] == [1, 3, 1, 4]
+    assert rows["AAAA3"]["magic_formula_rank"] == 2
+    assert rows["AAAA3"]["earnings_yield_clean"] == 0.25
+    # Mesma soma (4): desempate pelo ticker, como no ORDER BY da view
+    assert list(ranking["ticker"]) == ["AAAA3", "BBBB3", "CCCC3", "DDDD3"]
+    assert list(ranking["magic_formula_rank"]) == [2, 4, 4, 8]
+    assert list(ranking.columns) == RANKING_COLUMNS
+
+
+def test_nulls_and_limits_are_excluded():
+    ranking = compute_magic_formula_ranking(_snapshot([
+        ("AAAA3", "Máquinas", 0.30, 4.0, 30e6),
+        ("NULO3", "Máquinas", None, 4.0, 30e6),     # ROIC nulo
+        ("NEVE3", "Máquinas", 0.30, np.nan, 30e6),  # EV/EBIT nulo
+        ("NVOL3", "Máquinas", 0.30, 4.0, None),     # Volume nulo
+        ("ZERO3", "Máquinas", 0.0, 4.0, 30e6),      # ROIC zero (limite exclusivo)
+        ("NEGA3", "Máquinas", 0.30, -2.0, 30e6),    # EV/EBIT negativo
+        ("LIMI3", "Máquinas", 0.10, 6.0, 20e6),     # Volume no limite (inclusivo)
+        ("BAIX3", "Máquinas", 0.10, 6.0, 19_999_999),
+        ("SUBN3", None, 0.30, 4.0, 30e6),           # Subsetor nulo: fora, como no NOT IN
+    ]))
+    assert sorted(ranking["ticker"]) == ["AAAA3", "LIMI3"]
+
+
+def test_excluded_subsectors_are_normalized():
+    ranking = compute_magic_formula_ranking(_snapshot([
+        ("AAAA3", "Máquinas", 0.30, 4.0, 30e6),
+        ("BANC4", "Bancos", 0.30, 4.0, 30e6),
+        ("ELET3", "energia eletrica", 0.30, 4.0, 30e6),        # Sem acentos e em minúsculas
+        ("SANE3", "  Água\xa0e  Saneamento ", 0.30, 4.0, 30e6),  # Espaços extras e não quebráveis
+    ]))
+    assert list(ranking["ticker"]) == ["AAAA3"]
+
+    # A lista de exclusão recebida também é normalizada
+    custom = compute_magic_formula_ranking(
+        _snapshot([("AAAA3", "Máquinas", 0.30, 4.0, 30e6), ("BANC4", "Bancos", 0.30, 4.0, 30e6)]),
+        excluded_subsectors=("MAQUINAS",),
+    )
+    assert list(custom["ticker"]) == ["BANC4"]
+
+
+def test_top_n_and_missing_subsector_column():
+    df = _snapshot([(f"T{i:03d}3", "Máquinas", 0.01 * (i + 1), 10.0 - 0.1 * i, 30e6) for i in range(20)])
+    assert len(compute_magic_formula_ranking(df, top_n=5)) == 5
+    assert compute_magic_formula_ranking(df, top_n=5)["ticker"].iloc[0] == "T0193"
+
+    # Sem a coluna subsetor nenhuma empresa é elegível (como o NOT IN sobre nulos)
+    empty = compute_magic_formula_ranking(df.drop(columns=["subsetor"]))
+    assert empty.empty and list(empty.columns) == RANKING_COLUMNS
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT_DIR
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "service"))
+
+import fundamentus_snapshots
+import read_service
+
+
+def _snapshot(data_execucao: str, hora_execucao: str, cotacao: float) -> pd.DataFrame:
+    return pd.DataFrame({
+        "ticker": ["AAAA3", "BBBB4", "CCCC3", "DDDD3"],
+        "setor": ["Comércio", "Energia Elétrica", "Energia Elétrica", "Mineração"],
+        "subsetor": ["Tecidos, Vestuário e Calçados", "Energia Elétrica", "Energia Elétrica", "Minerais Metálicos"],
+        "cotacao": [cotacao, 20.0, 30.0, 40.0],
+        "roic": [0.25, 0.15, -0.05, 0.30],
+        "ev_ebit": [4.0, 8.0, 5.0, 6.0],
+        "vol_med_2m": [50_000_000.0, 30_000_000.0, 90_000_000.0, 80_000_000.0],
+        "data_execucao": data_execucao,
+        "hora_execucao": hora_execucao,
+    })
+
+
+@pytest.fixture
+def server(tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-15", "18:00:00", 10.0), snapshot_dir)
+    service = read_service.ReadService(snapshot_dir, check_seconds=0.0)
+    httpd = read_service.make_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield service, snapshot_dir, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _get(url: str, headers: dict = None) -> tuple:
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.headers, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_routes(server):
+    _, _, base = server
+    status, headers, body = _get(f"{base}/tickers/aaaa3?fields=cotacao")
+    assert status == 200 and headers["ETag"] == f'"{body["version"]}"'
+    assert body["items"] == [{"ticker": "AAAA3", "cotacao": 10.0}] and body["data_execucao"] == "2026-10-15"
+
+    status, _, body = _get(f"{base}/tickers?symbols=BBBB4,NOPE3,AAAA3&fields=roic")
+    assert [item["ticker"] for item in body["items"]] == ["AAAA3", "BBBB4"] and body["missing"] == ["NOPE3"]
+
+    # Setor comparado sem acentos e sem caixa
+    status, _, body = _get(f"{base}/companies?setor=energia%20eletrica")
+    assert status == 200 and {item["ticker"] for item in body["items"]} == {"BBBB4", "CCCC3"}
+
+    # CCCC3 fica de fora (ROIC negativo); AAAA3 tem o melhor EY e o segundo melhor ROIC
+    status, _, body = _get(f"{base}/ranking?top=2&fields=magic_formula_rank")
+    assert [item["ticker"] for item in body["items"]] == ["AAAA3", "DDDD3"]
+
+    request = urllib.request.Request(
+        f"{base}/tickers", data=json.dumps({"tickers": ["DDDD3"], "fields": ["setor"]}).encode(), method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        assert json.loads(response.read())["items"] == [{"ticker": "DDDD3", "setor": "Mineração"}]
+
+    assert _get(f"{base}/nope")[0] == 404
+    assert _get(f"{base}/ranking?top=x")[0] == 400
+
+
+def test_etag_and_reload_on_new_snapshot(server):
+    service, snapshot_dir, base = server
+    status, headers, body = _get(f"{base}/tickers/AAAA3")
+    etag = headers["ETag"]
+    assert _get(f"{base}/tickers/AAAA3", {"If-None-Match": etag})[0] == 304
+    assert service.stats["cache_hits"] >= 1
+
+    # Nova execução do ETL: nova versão, cache descartado e ETag antiga deixa de valer
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-16", "18:00:00", 11.0), snapshot_dir)
+    status, headers, body = _get(f"{base}/tickers/AAAA3", {"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+    assert body["items"][0]["cotacao"] == 11.0 and body["data_execucao"] == "2026-10-16"
+    assert service.stats["reloads"] == 2
+
+
+def test_no_snapshot(tmp_path):
+    service = read_service.ReadService(str(tmp_path / "vazio"), check_seconds=0.0)
+    assert service.health()["status"] == "no_snapshot"
+    httpd = read_service.make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        assert _get(f"http://127.0.0.1:{httpd.server_address[1]}/ranking")[0] == 503
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
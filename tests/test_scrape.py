@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import fundamentus_result_table
+import fundamentus_transform
+from fixtures import ENCODING, generate_synthetic_fixtures
+from fundamentus_checkpoint import ScrapeCheckpoint
+from fundamentus_html_archive import HtmlArchive
+from standin_server import StandInServer
+
+
+@pytest.fixture(scope="module")
+def fixtures_dir(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("fixtures"))
+    generate_synthetic_fixtures(path, count=12, seed=5, year=2026)
+    return path
+
+
+@pytest.fixture
+def server(etl, fixtures_dir, monkeypatch):
+    with StandInServer(fixtures_dir) as server:
+        monkeypatch.setattr(etl, "BASE_URL", server.base_url)
+        monkeypatch.setattr(etl, "PARSE_WORKERS", 1) # Parsing em uma thread: sem pool de processos no teste
+        yield server
+
+
+def _tickers(fixtures_dir: str) -> list:
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(os.path.join(fixtures_dir, "detalhes")))
+
+
+def test_async_delivery_failure_aborts_scrape(etl, server, fixtures_dir):
+    delivered = []
+
+    def on_company(company_data):
+        delivered.append(company_data["Ticker"])
+        raise RuntimeError("carga em micro-lotes parou")
+
+    with pytest.raises(RuntimeError, match="micro-lotes"):
+        etl.scrape_companies_async(_tickers(fixtures_dir), on_company=on_company, rate=1000)
+    # A falha não vira "erro de parsing": só as entregas já em andamento (uma por despachante) chegam
+    assert len(delivered) <= etl.PARSE_WORKERS * 2 < len(_tickers(fixtures_dir))
+
+
+def test_async_blocked_delivery_does_not_stall_event_loop(etl, server, fixtures_dir):
+    tickers = _tickers(fixtures_dir)
+    fetched_while_blocked = threading.Event()
+    delivered = []
+
+    def on_company(company_data):
+        if not delivered:
+            # Primeira entrega presa (ex: fila de micro-lotes cheia): as requisições continuam
+            deadline = time.monotonic() + 10
+            while server.stats["requests"] < len(tickers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if server.stats["requests"] == len(tickers):
+                fetched_while_blocked.set()
+        delivered.append(company_data["Ticker"])
+
+    assert etl.scrape_companies_async(tickers, on_company=on_company, rate=1000) == []
+    assert fetched_while_blocked.is_set()
+    assert sorted(delivered) == tickers
+
+
+def test_threads_delivery_failure_propagates(etl, monkeypatch):
+    monkeypatch.setattr(etl, "scrape_company_data", lambda ticker: {"Ticker": ticker, "Cotação": 1.0})
+
+    def on_company(company_data):
+        raise RuntimeError("carga em micro-lotes parou")
+
+    with pytest.raises(RuntimeError, match="micro-lotes"):
+        etl.scrape_companies_threads(["AAAA3", "BBBB4"], on_company)
+
+
+def test_failed_delivery_is_not_checkpointed(etl, monkeypatch, tmp_path):
+    def scrape_companies(tickers, archive, run_id, on_company, rate=None):
+        for ticker in tickers:
+            on_company({"Ticker": ticker, "Cotação": 1.0})
+
+    def on_company(company_data):
+        if company_data["Ticker"] == "BBBB4":
+            raise RuntimeError("carga em micro-lotes parou")
+
+    monkeypatch.setattr(etl, "scrape_companies", scrape_companies)
+    checkpoint = ScrapeCheckpoint("execucao", str(tmp_path))
+    try:
+        with pytest.raises(RuntimeError):
+            etl.scrape_with_retries(["AAAA3", "BBBB4"], None, None, on_company, checkpoint=checkpoint)
+        assert [company["Ticker"] for company in checkpoint.companies()] == ["AAAA3"]
+    finally:
+        checkpoint.close()
+
+
+def test_fast_run_is_replayed_offline(etl, server, fixtures_dir, monkeypatch, tmp_path):
+    tickers = _tickers(fixtures_dir)
+    with open(os.path.join(fixtures_dir, "resultado.html"), "rb") as f:
+        rows = {row["Ticker"]: row for row in fundamentus_result_table.parse_result_table(f.read().decode(ENCODING))}
+    # Snapshot anterior com metade dos tickers e o mesmo balanço: esses repetem os campos, os demais são coletados
+    carried_tickers = tickers[::2]
+    previous = pd.DataFrame({
+        "ticker": carried_tickers,
+        "setor": ["Energia Elétrica"] * len(carried_tickers),
+        "ativo": [1000.0 + i for i in range(len(carried_tickers))],
+        "ult_balanco_processado": ["2026-06-30"] * len(carried_tickers),
+        "patrim_liq": [fundamentus_transform.parse_number(rows[ticker]["patrim_liq"]) for ticker in carried_tickers],
+    })
+
+    class HistoryStore:
+        def snapshot(self):
+            return previous
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(etl, "HistoryStore", HistoryStore)
+    monkeypatch.setattr(etl, "HISTORY_STORE_ENABLED", True)
+
+    archive = HtmlArchive(str(tmp_path / "archive"))
+    live = []
+    try:
+        assert etl.scrape_fast_snapshot(archive, "20261016_180000", live.append) == len(tickers)
+        archive.commit()
+        assert sorted(ticker for ticker, _ in archive.manifest("20261016_180000", "detalhes")) == tickers[1::2]
+        replayed = etl.load_companies_from_archive(archive, "20261016_180000")
+    finally:
+        archive.close()
+
+    assert replayed == live
+    carried = {company["Ticker"]: company for company in replayed}[carried_tickers[0]]
+    assert carried["setor"] == "Energia Elétrica" and carried["ult_balanco_processado"] == "30/06/2026"
@@ -0,0 +1,148 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fundamentus_screener
+from fundamentus_ranking import compute_magic_formula_ranking
+from fundamentus_screener import SCREEN_RESULT_COLUMNS, load_screens, run_screens
+
+
+def _snapshot(rows: list, data_execucao: str = "2026-10-15") -> pd.DataFrame:
+    """rows: (ticker, subsetor, roic, pl)"""
+    df = pd.DataFrame(rows, columns=["ticker", "subsetor", "roic", "pl"])
+    df["data_execucao"] = data_execucao
+    df["hora_execucao"] = "18:00:00"
+    df["setor"] = "Diversos"
+    return df
+
+
+ROWS = [
+    ("AAAA3", "Máquinas", 0.30, 5.0),
+    ("BBBB3", "Bancos", 0.20, 8.0),
+    ("CCCC3", None, 0.10, None),
+    ("DDDD3", "maquinas ", None, 12.0),
+]
+
+
+def _screen(name: str, filters: list, rank: list = None, top: int = None) -> dict:
+    screen = {"name": name, "filters": filters, "rank": rank or []}
+    if top:
+        screen["top"] = top
+    return screen
+
+
+def _tickers(results: pd.DataFrame, screen: str) -> list:
+    return list(results.loc[results["screen"] == screen, "ticker"])
+
+
+def _write_screens(tmp_path, screens: list) -> str:
+    path = tmp_path / "screens.json"
+    path.write_text(json.dumps({"screens": screens}), encoding="utf-8")
+    return str(path)
+
+
+def test_null_semantics_of_negated_operators():
+    results = run_screens(_snapshot(ROWS), [
+        _screen("roic_diferente", [{"column": "roic", "op": "!=", "value": 0.3}]),
+        _screen("fora_de_maquinas", [{"column": "subsetor", "op": "not_in", "value": ["Máquinas"]}]),
+        _screen("subsetor_diferente", [{"column": "subsetor", "op": "!=", "value": "Bancos"}]),
+        _screen("sem_subsetor", [{"column": "subsetor", "op": "is_null"}]),
+        _screen("com_roic", [{"column": "roic", "op": "not_null"}]),
+    ])
+    # Como no SQL: nulos não passam em != nem em NOT IN
+    assert _tickers(results, "roic_diferente") == ["BBBB3", "CCCC3"]
+    assert _tickers(results, "fora_de_maquinas") == ["BBBB3"]   # "maquinas " normalizado cai em Máquinas
+    assert _tickers(results, "subsetor_diferente") == ["AAAA3", "DDDD3"]
+    assert _tickers(results, "sem_subsetor") == ["CCCC3"]
+    assert _tickers(results, "com_roic") == ["AAAA3", "BBBB3", "CCCC3"]
+
+
+def test_numeric_filters_rank_and_top():
+    results = run_screens(_snapshot(ROWS), [
+        _screen("faixa", [{"column": "pl", "op": "between", "value": [5, 8]}]),
+        _screen("limites", [{"column": "roic", "op": ">", "value": 0.1}, {"column": "pl", "op": "<=", "value": 8}]),
+        _screen("ranking", [{"column": "subsetor", "op": "in", "value": ["MAQUINAS", "bancos"]}], rank=[
+            {"column": "roic", "ascending": False},
+            {"column": "pl", "ascending": True, "weight": 2},
+        ], top=2),
+    ])
+    assert _tickers(results, "faixa") == ["AAAA3", "BBBB3"]   # between inclusivo nas duas pontas
+    assert _tickers(results, "limites") == ["AAAA3", "BBBB3"]
+
+    ranked = results[results["screen"] == "ranking"]
+    # AAAA3: 1 + 2*1 = 3; BBBB3: 2 + 2*2 = 6; DDDD3 (roic nulo vai por último): 3 + 2*3 = 9, cortado pelo top
+    assert list(ranked["ticker"]) == ["AAAA3", "BBBB3"]
+    assert list(ranked["score"]) == [3.0, 6.0]
+    assert list(ranked["posicao"]) == [1, 2]
+    assert list(results.columns) == SCREEN_RESULT_COLUMNS
+
+
+def test_snapshots_are_screened_separately_and_missing_columns_skip_the_screen():
+    df = pd.concat([_snapshot(ROWS, "2026-10-14"), _snapshot(ROWS[:1], "2026-10-15")], ignore_index=True)
+    results = run_screens(df, [
+        _screen("top1", [{"column": "roic", "op": "not_null"}], rank=[{"column": "roic"}], top=1),
+        _screen("sem_coluna", [{"column": "div_yield", "op": ">=", "value": 6}]),
+    ])
+    assert list(zip(results["data_execucao"], results["ticker"])) == [("2026-10-14", "AAAA3"), ("2026-10-15", "AAAA3")]
+    assert set(results["screen"]) == {"top1"}
+
+    empty = run_screens(df, [_screen("nada", [{"column": "roic", "op": ">", "value": 10}])])
+    assert empty.empty and list(empty.columns) == SCREEN_RESULT_COLUMNS
+
+
+def test_filter_masks_are_shared_between_screens():
+    index = fundamentus_screener.ScreenIndex(_snapshot(ROWS))
+    rule = {"column": "subsetor", "op": "in", "value": ["Bancos"]}
+    assert index.mask(rule) is index.mask(dict(rule))
+    assert np.array_equal(index.mask(rule), [False, True, False, False])
+
+
+@pytest.mark.parametrize("rule, message", [
+    ({"op": ">", "value": 1}, "sem 'column'"),
+    ({"column": "subsetor", "op": ">", "value": 1}, "inválido para 'subsetor'"),
+    ({"column": "subsetor", "op": "not_in", "value": "Bancos"}, "exige uma lista"),
+    ({"column": "roic", "op": "in", "value": [1]}, "inválido para 'roic'"),
+    ({"column": "roic", "op": "between", "value": [1]}, r"exige \[mínimo, máximo\]"),
+    ({"column": "roic", "op": ">", "value": "0.1"}, "exige um número"),
+])
+def test_invalid_filters_are_rejected_on_load(tmp_path, rule, message):
+    path = _write_screens(tmp_path, [{"name": "tela", "filters": [rule]}])
+    with pytest.raises(ValueError, match=message):
+        load_screens(path)
+
+
+def test_load_screens_checks_names_and_rank_terms(tmp_path):
+    with pytest.raises(ValueError, match="nome repetido"):
+        load_screens(_write_screens(tmp_path, [{"name": "a"}, {"name": "a"}]))
+    with pytest.raises(ValueError, match="sem 'column'"):
+        load_screens(_write_screens(tmp_path, [{"name": "a", "rank": [{"ascending": True}]}]))
+
+    screens = load_screens(_write_screens(tmp_path, [{"name": "a", "filters": [{"column": "roic", "op": "not_null"}]}]))
+    assert screens[0]["rank"] == []
+
+    # O arquivo do repositório é válido
+    assert {screen["name"] for screen in load_screens()} >= {"magic_formula", "dividendos"}
+
+
+def test_magic_formula_screen_matches_the_materialized_ranking():
+    rng = np.random.default_rng(7)
+    subsectors = ["Máquinas", "Bancos", "energia eletrica", None, "Varejo"]
+    df = pd.DataFrame({
+        "ticker": [f"T{i:03d}3" for i in range(200)],
+        "subsetor": [subsectors[i % len(subsectors)] for i in range(200)],
+        "roic": np.round(rng.normal(0.1, 0.1, 200), 2),
+        "ev_ebit": np.round(rng.normal(6, 4, 200), 0),
+        "vol_med_2m": rng.choice([1e6, 2e7, 5e7, np.nan], 200),
+    })
+    df["data_execucao"] = "2026-10-15"
+    df["hora_execucao"] = "18:00:00"
+    df["setor"] = "Diversos"
+
+    screen = [s for s in load_screens() if s["name"] == "magic_formula"]
+    results = run_screens(df, screen)
+    ranking = compute_magic_formula_ranking(df)
+    assert len(ranking) > 10
+    assert list(results["ticker"]) == list(ranking["ticker"])
+    assert list(results["score"]) == list(ranking["magic_formula_rank"].astype(float))
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from fundamentus_sinks import HISTORY_TABLE, LOAD_TABLE, EmbeddedMirrorSink
+
+
+def _snapshot(data_execucao: str, rows: list, hora_execucao: str = "18:00:00") -> pd.DataFrame:
+    """rows: (ticker, subsetor, cotacao)"""
+    df = pd.DataFrame(rows, columns=["ticker", "subsetor", "cotacao"])
+    df["data_execucao"] = data_execucao
+    df["hora_execucao"] = hora_execucao
+    df["data_ult_cot"] = pd.to_datetime(data_execucao)
+    return df
+
+
+def _ranking(data_execucao: str, tickers: list) -> pd.DataFrame:
+    return pd.DataFrame({"ticker": tickers, "data_execucao": data_execucao, "magic_formula_rank": range(1, len(tickers) + 1)})
+
+
+@pytest.fixture
+def sink(tmp_path):
+    with EmbeddedMirrorSink(str(tmp_path)) as sink:
+        yield sink
+
+
+def _rows(sink: EmbeddedMirrorSink, table: str) -> list:
+    rows = sink.conn.execute(f"SELECT data_execucao, hora_execucao, ticker, cotacao FROM [{table}] ORDER BY data_execucao, ticker")
+    return [list(row) for row in rows]
+
+
+def test_write_replaces_load_table_and_execution_dates(sink):
+    sink.write(_snapshot("2026-10-14", [("AAAA3", "Máquinas", 9.0), ("BBBB4", "Bancos", 20.0)]),
+               {"ranking_magic_formula": _ranking("2026-10-14", ["AAAA3"])})
+    stats = sink.write(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0)], "10:00:00"),
+                       {"ranking_magic_formula": _ranking("2026-10-15", ["AAAA3"])})
+    assert stats["rows"] == 1
+
+    # Nova execução no mesmo dia: substitui a data no histórico e nas tabelas derivadas
+    sink.write(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 11.0), ("CCCC3", None, None)]),
+               {"ranking_magic_formula": _ranking("2026-10-15", ["CCCC3", "AAAA3"])})
+
+    # Tabela de carga: só a última execução
+    assert _rows(sink, LOAD_TABLE) == [["2026-10-15", "18:00:00", "AAAA3", 11.0], ["2026-10-15", "18:00:00", "CCCC3", None]]
+    assert _rows(sink, HISTORY_TABLE) == [
+        ["2026-10-14", "18:00:00", "AAAA3", 9.0], ["2026-10-14", "18:00:00", "BBBB4", 20.0],
+        ["2026-10-15", "18:00:00", "AAAA3", 11.0], ["2026-10-15", "18:00:00", "CCCC3", None],
+    ]
+    ranking = sink.query("SELECT data_execucao, ticker, magic_formula_rank FROM ranking_magic_formula ORDER BY data_execucao, magic_formula_rank")
+    assert ranking.values.tolist() == [["2026-10-14", "AAAA3", 1], ["2026-10-15", "CCCC3", 1], ["2026-10-15", "AAAA3", 2]]
+    # Datas (datetime64) gravadas como texto, no formato de data_execucao
+    assert sink.query(f"SELECT DISTINCT data_ult_cot FROM [{HISTORY_TABLE}] ORDER BY 1")["data_ult_cot"].tolist() == ["2026-10-14", "2026-10-15"]
+
+
+def test_write_adds_new_columns_with_alter_table(sink):
+    sink.write(_snapshot("2026-10-14", [("AAAA3", "Máquinas", 9.0)]), {})
+    later = _snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0)])
+    later["div_yield"] = 5.5
+    later["num_acoes"] = pd.array([1000], dtype="Int64")
+    sink.write(later, {})
+
+    columns = {row[1]: row[2] for row in sink.conn.execute(f"PRAGMA table_info([{HISTORY_TABLE}])")}
+    assert columns["div_yield"] == "REAL" and columns["num_acoes"] == "INTEGER" and columns["subsetor"] == "TEXT"
+    history = sink.query(f"SELECT data_execucao, div_yield, num_acoes FROM [{HISTORY_TABLE}] ORDER BY data_execucao")
+    assert history["div_yield"].isna().tolist() == [True, False] and history["num_acoes"].iloc[1] == 1000
+    indexes = {row[1] for row in sink.conn.execute(f"PRAGMA index_list([{HISTORY_TABLE}])")}
+    assert f"idx_{HISTORY_TABLE}_data_execucao_ticker" in indexes and f"idx_{HISTORY_TABLE}_subsetor" in indexes
+
+
+def test_failed_write_rolls_back(sink):
+    sink.write(_snapshot("2026-10-14", [("AAAA3", "Máquinas", 9.0)]), {"ranking_magic_formula": _ranking("2026-10-14", ["AAAA3"])})
+    with pytest.raises(AttributeError):
+        # A tabela derivada falha depois da carga e do histórico: nada da execução fica gravado
+        sink.write(_snapshot("2026-10-15", [("AAAA3", "Máquinas", 10.0)]), {"ranking_magic_formula": object()})
+    assert _rows(sink, LOAD_TABLE) == [["2026-10-14", "18:00:00", "AAAA3", 9.0]]
+    assert _rows(sink, HISTORY_TABLE) == [["2026-10-14", "18:00:00", "AAAA3", 9.0]]
@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+
+import fundamentus_snapshots
+
+
+def _snapshot(data_execucao: str, hora_execucao: str, cotacao: float, year_column: str = "2025") -> pd.DataFrame:
+    return pd.DataFrame({
+        "ticker": ["AAAA3", "BBBB4"],
+        "data_execucao": data_execucao,
+        "hora_execucao": hora_execucao,
+        "setor": pd.Categorical(["Energia Elétrica", "Mineração"]),
+        "cotacao": pd.array([cotacao, None], dtype="Float64"),
+        "data_ult_cot": [data_execucao, None],
+        year_column: pd.array([1.5, -2.0], dtype="Float64"),
+    })
+
+
+def test_read_prunes_partitions_and_unifies_schemas(tmp_path):
+    base_dir = str(tmp_path)
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-14", "18:00:00", 9.0, "2025"), base_dir)
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-15", "10:00:00", 10.0, "2025"), base_dir)
+    # Nova coluna de ano em uma execução posterior: os esquemas são unificados na leitura
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-15", "18:00:00", 11.0, "2026"), base_dir)
+    assert fundamentus_snapshots.list_snapshot_dates(base_dir) == ["2026-10-14", "2026-10-15"]
+
+    df = fundamentus_snapshots.read_snapshots(base_dir=base_dir)
+    assert list(zip(df["data_execucao"], df["hora_execucao"], df["ticker"])) == [
+        ("2026-10-14", "18:00:00", "AAAA3"), ("2026-10-14", "18:00:00", "BBBB4"),
+        ("2026-10-15", "18:00:00", "AAAA3"), ("2026-10-15", "18:00:00", "BBBB4"),
+    ]
+    assert df["cotacao"].tolist()[::2] == [9.0, 11.0] and pd.isna(df["cotacao"].iloc[1])
+    assert df["2025"].isna().tolist() == [False, False, True, True] and df["2026"].notna().tolist() == [False, False, True, True]
+    assert isinstance(df["setor"].dtype, pd.CategoricalDtype)
+    assert str(df["data_ult_cot"].iloc[0]) == "2026-10-14" and pd.isna(df["data_ult_cot"].iloc[1])
+
+    all_runs = fundamentus_snapshots.read_snapshots(latest_run_per_day=False, base_dir=base_dir)
+    assert sorted(set(all_runs["hora_execucao"])) == ["10:00:00", "18:00:00"] and len(all_runs) == 6
+
+    day = fundamentus_snapshots.read_snapshots(["cotacao"], start="2026-10-15", end="2026-10-15", tickers=["AAAA3"], base_dir=base_dir)
+    assert list(day.columns) == ["ticker", "data_execucao", "hora_execucao", "cotacao"]
+    assert day.to_dict("records") == [{"ticker": "AAAA3", "data_execucao": "2026-10-15", "hora_execucao": "18:00:00", "cotacao": 11.0}]
+    assert fundamentus_snapshots.read_snapshots(start="2026-10-16", base_dir=base_dir).empty
+
+
+def test_staged_snapshot_is_invisible_until_published(tmp_path):
+    base_dir = str(tmp_path)
+    fundamentus_snapshots.write_snapshot(_snapshot("2026-10-14", "18:00:00", 9.0), base_dir)
+    staged = fundamentus_snapshots.stage_snapshot(_snapshot("2026-10-15", "18:00:00", 10.0), base_dir)
+    assert [os.path.exists(tmp_path) for tmp_path, _ in staged] == [True]
+
+    # Antes da publicação (ex: a carga ainda não fez commit) os leitores só veem a execução anterior
+    assert fundamentus_snapshots.read_snapshots(base_dir=base_dir)["data_execucao"].unique().tolist() == ["2026-10-14"]
+    assert fundamentus_snapshots.latest_snapshot_path(base_dir).endswith(os.path.join("data_execucao=2026-10-14", "part-180000.parquet"))
+
+    paths = fundamentus_snapshots.publish_snapshot(staged)
+    assert fundamentus_snapshots.latest_snapshot_path(base_dir) == paths[0]
+    latest = fundamentus_snapshots.read_snapshot_file(paths[0])
+    assert list(latest.columns[:2]) == ["ticker", "data_execucao"] and latest["cotacao"].iloc[0] == 10.0
+
+
+def test_discarded_snapshot_leaves_no_files(tmp_path):
+    base_dir = str(tmp_path)
+    staged = fundamentus_snapshots.stage_snapshot(_snapshot("2026-10-15", "18:00:00", 10.0), base_dir)
+    fundamentus_snapshots.discard_snapshot(staged) # Ex: um destino falhou
+    assert fundamentus_snapshots.latest_snapshot_path(base_dir) is None
+    assert os.listdir(os.path.join(base_dir, "data_execucao=2026-10-15")) == []
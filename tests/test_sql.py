@@ -0,0 +1,179 @@
+import importlib
+import sys
+import threading
+import types
+
+import pytest
+
+
+@pytest.fixture
+def fundamentus_sql(monkeypatch):
+    # Sem o driver ODBC instalado, um pyodbc vazio basta: nenhum teste abre conexão
+    try:
+        import pyodbc # noqa: F401
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "pyodbc", types.SimpleNamespace(Error=Exception, pooling=False))
+
+    extra = {"driver": "{ODBC Driver 18 for SQL Server}", "encrypt": "no"}
+    connection = types.SimpleNamespace(
+        host="sqlserver", port=1433, schema="fundamentus", login="etl", password="segredo", extra_dejson=extra,
+    )
+    hooks = types.ModuleType("airflow.hooks.base")
+    hooks.BaseHook = types.SimpleNamespace(get_connection=lambda conn_id: connection)
+    monkeypatch.setitem(sys.modules, "airflow", types.ModuleType("airflow"))
+    monkeypatch.setitem(sys.modules, "airflow.hooks", types.ModuleType("airflow.hooks"))
+    monkeypatch.setitem(sys.modules, "airflow.hooks.base", hooks)
+
+    loaded = "fundamentus_sql" in sys.modules
+    module = importlib.import_module("fundamentus_sql")
+    monkeypatch.setattr(module, "_MANAGERS", {})
+    yield module
+    if not loaded: # Não deixa para os outros testes um módulo ligado aos stubs
+        sys.modules.pop("fundamentus_sql", None)
+
+
+def test_driver_override_gets_its_own_manager(fundamentus_sql):
+    shared = fundamentus_sql.get_connection_manager("sql_server_fundamentus_conn")
+    assert fundamentus_sql.get_connection_manager("sql_server_fundamentus_conn") is shared
+    assert shared.driver == "{ODBC Driver 18 for SQL Server}" and shared.server == "sqlserver,1433"
+
+    other = fundamentus_sql.get_connection_manager("sql_server_fundamentus_conn", driver="{ODBC Driver 17 for SQL Server}")
+    assert other is not shared
+    assert other.driver == "{ODBC Driver 17 for SQL Server}" and other.encrypt == "no"
+    # O gerenciador compartilhado (e o seu pool) continua com o driver da conexão
+    assert shared.driver == "{ODBC Driver 18 for SQL Server}"
+    assert fundamentus_sql.get_connection_manager("sql_server_fundamentus_conn", driver="{ODBC Driver 17 for SQL Server}") is other
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeConnection:
+    """Conexão pyodbc falsa: registra commits, rollbacks e SELECT 1 do health check."""
+
+    def __init__(self, log):
+        self.log = log
+        self.timeout = None
+        self.closed = False
+        self.healthy = True
+        self.rollback_fails = False
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, sql):
+                conn.log.append(("execute", conn, sql))
+                if not conn.healthy:
+                    raise FakeError("conexão caiu")
+                return self
+
+            def fetchone(self):
+                return (1,)
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def commit(self):
+        self.log.append(("commit", self))
+
+    def rollback(self):
+        self.log.append(("rollback", self))
+        if self.rollback_fails:
+            raise FakeError("rollback falhou")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def manager(fundamentus_sql, monkeypatch):
+    log = []
+    opened = []
+
+    def connect(connection_string, timeout, autocommit):
+        assert autocommit is False
+        conn = FakeConnection(log)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(fundamentus_sql, "pyodbc", types.SimpleNamespace(Error=FakeError, connect=connect))
+    manager = fundamentus_sql.SqlServerConnectionManager("sqlserver", "fundamentus", "etl", "segredo", query_timeout=30)
+    return manager, log, opened
+
+
+def test_transaction_commits_once_and_reuses_nested(manager):
+    manager, log, opened = manager
+    with manager.transaction() as conn:
+        assert manager.in_transaction() and conn.timeout == 30
+        with manager.transaction() as inner: # Ex: procedure chamada dentro da carga
+            assert inner is conn
+        assert log == [] # A transação aninhada não faz commit
+    assert log == [("commit", conn)] and not manager.in_transaction()
+
+    # A conexão voltou ao pool e é reaproveitada sem health check (não ficou parada)
+    with manager.transaction() as again:
+        assert again is conn
+    assert len(opened) == 1 and [entry[0] for entry in log] == ["commit", "commit"]
+
+
+def test_transaction_rolls_back_on_error(manager):
+    manager, log, opened = manager
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            with manager.transaction():
+                raise RuntimeError("carga falhou")
+    assert log == [("rollback", opened[0])] and not manager.in_transaction()
+    assert not opened[0].closed and manager.acquire() is opened[0]
+
+
+def test_connection_discarded_when_rollback_fails(manager):
+    manager, log, opened = manager
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as conn:
+            conn.rollback_fails = True
+            raise RuntimeError("carga falhou")
+    assert opened[0].closed
+    with manager.transaction() as conn:
+        assert conn is not opened[0]
+    assert len(opened) == 2
+
+
+def test_transactions_are_per_thread(manager):
+    manager, log, opened = manager
+    seen = {}
+    with manager.transaction() as conn:
+        thread = threading.Thread(target=lambda: seen.update(in_transaction=manager.in_transaction()))
+        thread.start()
+        thread.join()
+    assert seen == {"in_transaction": False}
+
+
+def test_idle_connection_is_health_checked(fundamentus_sql, manager, monkeypatch):
+    manager, log, opened = manager
+    clock = [1000.0]
+    monkeypatch.setattr(fundamentus_sql.time, "monotonic", lambda: clock[0])
+
+    with manager.transaction():
+        pass
+    clock[0] += fundamentus_sql.HEALTH_CHECK_AFTER_IDLE_SECONDS + 1
+    assert manager.acquire() is opened[0] # Parada, mas responde ao SELECT 1
+    assert ("execute", opened[0], "SELECT 1") in log
+
+    manager.release(opened[0])
+    opened[0].healthy = False
+    clock[0] += fundamentus_sql.HEALTH_CHECK_AFTER_IDLE_SECONDS + 1
+    conn = manager.acquire() # Falha no health check: descartada e substituída por uma nova
+    assert conn is opened[1] and opened[0].closed
+
+
+def test_explicit_params_manager_key_has_no_password(fundamentus_sql):
+    params = dict(server="sqlserver", database="fundamentus", username="etl", password="segredo")
+    manager = fundamentus_sql.get_connection_manager_for(**params)
+    assert fundamentus_sql.get_connection_manager_for(**params) is manager
+    assert all("segredo" not in str(key) for key in fundamentus_sql._MANAGERS)
+    # Outra senha (ex: rotação de credenciais) não reaproveita o pool da senha antiga
+    assert fundamentus_sql.get_connection_manager_for(**dict(params, password="nova")) is not manager
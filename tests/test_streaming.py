@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from fundamentus_streaming import MicroBatchPipeline, PipelineAborted
+
+
+def _close_with_timeout(pipeline, seconds=10):
+    """Chama close() em outra thread; um travamento vira falha do teste em vez de pendurar a suíte."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = pipeline.close()
+        except BaseException as exc:
+            outcome["error"] = exc
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "close() travou"
+    return outcome
+
+
+def test_batches_reach_consumer_in_order():
+    def consume(batches):
+        return [list(batch) for batch in batches]
+
+    pipeline = MicroBatchPipeline(consume, batch_size=2).start()
+    for item in range(5):
+        pipeline.add(item)
+    outcome = _close_with_timeout(pipeline)
+    assert outcome["result"] == [[0, 1], [2, 3], [4]]
+    assert pipeline.batches == 3
+
+
+def test_consumer_failure_after_last_batch_does_not_hang():
+    # Ex: a procedure ou o commit falham depois que todos os lotes foram lidos
+    def consume(batches):
+        for _ in batches:
+            pass
+        raise RuntimeError("commit falhou")
+
+    pipeline = MicroBatchPipeline(consume, batch_size=2).start()
+    for item in range(5):
+        pipeline.add(item)
+    outcome = _close_with_timeout(pipeline)
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert str(outcome["error"]) == "commit falhou"
+
+
+def test_consumer_failure_mid_stream_stops_producer():
+    def consume(batches):
+        next(iter(batches))
+        raise ValueError("carga falhou")
+
+    pipeline = MicroBatchPipeline(consume, batch_size=1, max_pending_batches=1).start()
+    with pytest.raises(RuntimeError, match="carga falhou"):
+        for item in range(1000):
+            pipeline.add(item)
+    outcome = _close_with_timeout(pipeline)
+    assert isinstance(outcome.get("error"), ValueError)
+
+
+def test_abort_raises_inside_consumer():
+    seen = {}
+
+    def consume(batches):
+        try:
+            for _ in batches:
+                pass
+        except PipelineAborted as exc:
+            seen["aborted"] = exc
+            raise
+
+    pipeline = MicroBatchPipeline(consume, batch_size=1).start()
+    pipeline.add(1)
+    pipeline.abort()
+    assert isinstance(seen.get("aborted"), PipelineAborted)
@@ -0,0 +1,117 @@
+import datetime
+import logging
+import os
+
+import pandas as pd
+
+import fundamentus_parsing
+import fundamentus_transform
+from fixtures import ENCODING, generate_synthetic_fixtures
+from fundamentus_schema import EXECUTION_COLUMNS, column_kind
+
+EXECUTION_TS = datetime.datetime(2026, 10, 16, 18, 0, 0)
+
+
+def _companies() -> list:
+    return [
+        {
+            "Ticker": "AAAA3", "Papel": "AAAA3", "Cotação": "1.234,56", "Div. Yield": "6,5%",
+            "Valor de mercado": "R\\$ 1.000.000", "Data últ cot": "15/10/2026", "Setor": "Energia",
+            "Vazia": "", "Novo rótulo": "3,5", "2024": "-12,3%",
+        },
+        {
+            "Ticker": "BBBB4", "Cotação": "-", "Div. Yield": "0,0%", "Data últ cot": "-", "Setor": "Mineração",
+            "Vazia": "-", "2024": 1.5, # Valor que já chegou numérico (parser com convert_values=True)
+        },
+    ]
+
+
+def test_transform_companies_cleans_each_column(caplog):
+    with caplog.at_level(logging.INFO):
+        df = fundamentus_transform.transform_companies(_companies(), EXECUTION_TS)
+
+    # Controle de execução primeiro, anos no fim; 'papel' e a coluna totalmente vazia são removidas
+    assert list(df.columns) == [
+        "ticker", "data_execucao", "hora_execucao", "cotacao", "div_yield", "valor_de_mercado",
+        "data_ult_cot", "setor", "novo_rotulo", "2024",
+    ]
+    assert df["cotacao"].tolist() == [1234.56, pd.NA]
+    assert df["div_yield"].tolist() == [6.5, 0.0]
+    assert df["valor_de_mercado"].tolist() == [1_000_000.0, pd.NA]
+    assert df["2024"].tolist() == [-12.3, 1.5]
+    assert df["data_ult_cot"].tolist() == ["2026-10-15", None]
+    assert df["data_execucao"].tolist() == ["2026-10-16"] * 2 and df["hora_execucao"].tolist() == ["18:00:00"] * 2
+    assert df["cotacao"].dtype == "Float64" and df["2024"].dtype == "Float64"
+    assert isinstance(df["setor"].dtype, pd.CategoricalDtype)
+
+    # Rótulo fora do esquema: coluna numérica, registrada no log
+    assert df["novo_rotulo"].dtype == "Float64" and df["novo_rotulo"].tolist() == [3.5, pd.NA]
+    assert "novo_rotulo" in caplog.text and "1 colunas totalmente vazias removidas" in caplog.text
+
+
+def test_builder_grows_past_capacity():
+    builder = fundamentus_transform.ColumnarBuilder(capacity=1)
+    companies = [{"Ticker": f"T{i:03d}3", "Cotação": f"{i},5", "Setor": "Energia"} for i in range(5)]
+    for company in companies:
+        builder.add(company)
+
+    df = builder.to_frame(EXECUTION_TS)
+    assert len(builder) == 5 and builder.capacity >= 5
+    assert df["ticker"].tolist() == [company["Ticker"] for company in companies]
+    assert df["cotacao"].tolist() == [0.5, 1.5, 2.5, 3.5, 4.5]
+
+
+def test_parse_number_matches_clean_numeric_column():
+    # O ColumnarBuilder converte célula a célula: o resultado tem que ser o da limpeza vetorizada
+    values = ["1.234,56", " 6,5% ", "R\\$ 1.000", "R$ 10,50", "-", "", "1_000", "abc", None, 7, 2.5, pd.NA]
+    expected = fundamentus_transform.clean_numeric_column(pd.Series(values, dtype=object))
+    parsed = [fundamentus_transform.parse_number(value) for value in values]
+    assert [None if pd.isna(value) else value for value in parsed] == [None if pd.isna(value) else value for value in expected]
+
+
+def _baseline_frame(companies: list) -> pd.DataFrame:
+    """Tratamento original do script (valores já convertidos por clean_and_convert_value no parser)."""
+    df = pd.DataFrame(companies)
+    df.columns = [fundamentus_parsing.clean_column_name(col) for col in df.columns]
+    for col in fundamentus_parsing.DATE_COLUMNS_TO_CONVERT:
+        if col in df.columns:
+            dates = pd.to_datetime(df[col].replace(['-', ''], pd.NA), format='%d/%m/%Y', errors='coerce')
+            df[col] = dates.apply(lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else None)
+    df = df.drop(columns=['papel']).dropna(axis=1, how='all')
+    return df.drop(columns=[col for col in ['1', '2', '3', '4'] if col in df.columns])
+
+
+def test_vectorized_transform_matches_baseline_on_fixture_corpus(tmp_path):
+    fixtures_dir = str(tmp_path)
+    manifest = generate_synthetic_fixtures(fixtures_dir, count=80, seed=11, year=2026)
+    raw, converted = [], []
+    for ticker in manifest["tickers"]:
+        with open(os.path.join(fixtures_dir, "detalhes", f"{ticker}.html"), "rb") as f:
+            html = f.read().decode(ENCODING)
+        raw.append(fundamentus_parsing.parse_company_page(ticker, html, "fast", False))
+        converted.append(fundamentus_parsing.parse_company_page(ticker, html, "fast", True))
+
+    df = fundamentus_transform.transform_companies(raw, EXECUTION_TS)
+    baseline = _baseline_frame(converted)
+    assert set(df.columns) - set(EXECUTION_COLUMNS) == set(baseline.columns)
+    assert {"cotacao", "div_yield", "setor", "subsetor", "data_ult_cot", "ult_balanco_processado"} <= set(baseline.columns)
+
+    for col in baseline.columns:
+        kind = column_kind(col)
+        if kind == "numeric":
+            assert df[col].dtype == "Float64", col
+            expected = pd.to_numeric(baseline[col], errors="coerce").astype("Float64")
+            pd.testing.assert_series_equal(df[col], expected, check_names=False)
+        elif kind == "category":
+            assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+            assert df[col].astype(object).tolist() == baseline[col].tolist(), col
+        else:
+            # Texto e datas ('YYYY-MM-DD' ou None) ficam como objetos, iguais aos do caminho original
+            assert df[col].dtype == object and df[col].tolist() == baseline[col].tolist(), col
+
+
+def test_clean_numeric_column_matches_clean_and_convert_value():
+    values = ["1.234,56", " 6,5% ", "R\\$ 1.000", "R$ 10,50", "-12,3%", "-", "", "abc", 7, 2.5]
+    expected = [fundamentus_parsing.clean_and_convert_value(value) for value in values]
+    cleaned = fundamentus_transform.clean_numeric_column(pd.Series(values, dtype=object))
+    assert [None if pd.isna(value) else value for value in cleaned] == [None if pd.isna(value) else value for value in expected]